@@ -1 +1,3 @@
-import src.ai_agents.triage
\ No newline at end of file
+import src.ai_agents.triage
+import src.ai_agents.summary
+import src.ai_agents.code_generate
\ No newline at end of file
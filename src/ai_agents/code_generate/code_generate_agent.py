@@ -0,0 +1,39 @@
+from typing import Any
+
+from agents import Agent, FunctionTool, Model, RunContextWrapper, function_tool
+
+from src.ai_agents.context import AgentContext
+from src.ai_agents.identity_manager import AgentIdentityManager
+from src.core.prompt_manager import get_prompt
+from src.core.sandbox import CodeSandbox, ExecutionResult, code_sandbox
+
+class CodeGenerateAgent(Agent[AgentContext]):
+
+    def __init__(self, model: Model, name: str = AgentIdentityManager.CodeGenerate.code_generate_agent, sandbox: CodeSandbox = code_sandbox):
+        super().__init__(name, model)
+        self.name = name
+        self.model = model
+        self.instructions = self._set_prompt
+        self.tools = [self._execute_python_tool(sandbox)]
+
+    @staticmethod
+    def _set_prompt(context: RunContextWrapper[AgentContext], agent: Any):
+        return get_prompt(f'{AgentIdentityManager.CodeGenerate.task_name}/{AgentIdentityManager.CodeGenerate.code_generate_agent}')
+
+    @staticmethod
+    def _execute_python_tool(sandbox: CodeSandbox) -> FunctionTool:
+        """生成したコードをサンドボックスで実行するツールを作成する"""
+        description = (
+            "Python のコードを実行し、標準出力と最後の式の値を JSON で返す。"
+            "numpy（np）と pandas（pd）は読み込み済み。実行ごとに新しい名前空間で実行されるため、必要な処理は1回のコードにまとめること。"
+            f"CPU時間は {sandbox.st.cpu_seconds:g} 秒、実行時間は {sandbox.st.timeout:g} 秒、メモリは {sandbox.st.memory_mb} MB まで。"
+        )
+
+        @function_tool(name_override="execute_python", description_override=description)
+        async def execute_python(context: RunContextWrapper[AgentContext], code: str) -> str:
+            try:
+                return (await sandbox.run(code)).to_json()
+            except RuntimeError as e:
+                return ExecutionResult(ok=False, error=str(e)).to_json()
+
+        return execute_python
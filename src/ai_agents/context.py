@@ -1,5 +1,19 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any
+
+from src.ai_agents.history import ConversationHistory
+from src.core.prompt_manager import prompt_manager
 
 @dataclass
 class AgentContext:
-    history: list| None = None
\ No newline at end of file
+    history : ConversationHistory = field(default_factory=ConversationHistory)
+    # 時刻など毎ターン変わる情報（プロンプトキャッシュが効くよう、システムプロンプトではなく入力の末尾に置く）
+    volatile: dict[str, Any] = field(default_factory=dict)
+
+    def derive(self) -> 'AgentContext':
+        """現在の会話履歴を引き継ぎ、以降の履歴は共有しないコンテキストを作成（並列実行する分岐用）"""
+        return AgentContext(history=self.history.fork(), volatile=dict(self.volatile))
+
+    def to_input(self) -> list[dict[str, str]]:
+        """Runnerに渡す入力（会話履歴の後ろに毎ターン変わる情報を置く）"""
+        return self.history.to_input(prompt_manager.format_volatile_context(self.volatile))
\ No newline at end of file
@@ -0,0 +1,107 @@
+import inspect
+from typing import Awaitable, Callable, Optional, Union
+
+from agents import Agent, Runner
+from openai.types.responses import ResponseTextDeltaEvent
+
+from src.ai_agents.context import AgentContext
+from src.ai_agents.hooks import MetricsRunHooks
+from src.ai_agents.triage.fast_router import FastPathRouter
+from src.ai_agents.registry import agent_registry
+from src.core.logger import apllog
+from src.core.metrics import metrics
+
+# ストリーミングで受け取ったテキストの断片を受け取るコールバック
+DeltaCallback = Callable[[str], Union[Awaitable[None], None]]
+
+
+def select_starting_agent(default_agent: Agent, user_input: str, router: Optional[FastPathRouter]) -> Agent:
+    """高速ルーターで転送先が明確に決まる場合は、トリアージを飛ばしてそのエージェントから開始する"""
+    if router is None:
+        return default_agent
+
+    decision = router.route(user_input)
+    if decision is None or not agent_registry.has_agent(decision.agent):
+        return default_agent
+
+    if decision.source == 'semantic':
+        apllog().debug(f"似た質問の転送先を再利用: {decision.agent}（類似度 {decision.similarity:.3f}）")
+    else:
+        apllog().debug(f"高速ルーティング: {decision.agent}（スコア {decision.score}）")
+    return agent_registry.get_agent(decision.agent)
+
+
+def remember_handoff(starting_agent: Agent, agent: Agent, last_agent: Agent, user_input: str, router: Optional[FastPathRouter]) -> None:
+    """トリアージから別のエージェントにハンドオフした場合、その転送先を似た質問で再利用できるよう記録する"""
+    if router is None or agent is not starting_agent or last_agent is starting_agent:
+        return
+    router.remember(user_input, last_agent.name)
+
+
+async def run_turn(
+    context       : AgentContext,
+    starting_agent: Agent,
+    user_input    : str,
+    router        : Optional[FastPathRouter] = None
+) -> str:
+    """
+    ユーザー入力を1ターン分処理し、アシスタントの応答を返す
+
+    ユーザー入力と応答はどちらも context.history に追加される。
+    """
+    agent = select_starting_agent(starting_agent, user_input, router)
+    with metrics.span('turn', agent=agent.name), MetricsRunHooks(agent).bind() as hooks:
+        with metrics.span('history_prepare'):
+            context.history.add_user(user_input)
+            history_input = context.to_input()   # ← トークン上限内の過去ログを渡す
+
+        result = await Runner.run(
+            starting_agent = agent,
+            input          = history_input,
+            context        = context,
+            hooks          = hooks,
+        )
+
+    remember_handoff(starting_agent, agent, result.last_agent, user_input, router)
+    ai_reply = str(result.final_output)
+    context.history.add_assistant(ai_reply)
+    return ai_reply
+
+
+async def stream_turn(
+    context       : AgentContext,
+    starting_agent: Agent,
+    user_input    : str,
+    on_delta      : Optional[DeltaCallback] = None,
+    router        : Optional[FastPathRouter] = None
+) -> str:
+    """
+    ユーザー入力を1ターン分処理し、生成されたテキストを届いた順に on_delta へ渡す
+
+    応答全体は生成完了後に組み立てて context.history に追加し、戻り値として返す。
+    """
+    agent = select_starting_agent(starting_agent, user_input, router)
+    with metrics.span('turn', agent=agent.name), MetricsRunHooks(agent).bind() as hooks:
+        with metrics.span('history_prepare'):
+            context.history.add_user(user_input)
+            history_input = context.to_input()
+
+        result = Runner.run_streamed(
+            starting_agent = agent,
+            input          = history_input,
+            context        = context,
+            hooks          = hooks,
+        )
+
+        async for event in result.stream_events():
+            if on_delta is None or event.type != "raw_response_event":
+                continue
+            if isinstance(event.data, ResponseTextDeltaEvent) and event.data.delta:
+                callback_result = on_delta(event.data.delta)
+                if inspect.isawaitable(callback_result):
+                    await callback_result
+
+    remember_handoff(starting_agent, agent, result.last_agent, user_input, router)
+    ai_reply = str(result.final_output)
+    context.history.add_assistant(ai_reply)
+    return ai_reply
@@ -0,0 +1,176 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from agents import FunctionTool, RunContextWrapper, Runner, function_tool
+# pydantic が Python 3.12 未満でツールの引数に使えるのは typing_extensions の TypedDict のみ
+from typing_extensions import TypedDict
+
+from src.ai_agents.context import AgentContext
+from src.ai_agents.hooks import MetricsRunHooks
+from src.ai_agents.registry import agent_registry
+from src.core.logger import apllog
+from src.core.metrics import metrics
+
+
+@dataclass
+class FanOutBranch:
+    """並列に実行する1つのサブ分析"""
+    agent_name: str
+    input     : str
+    # 省略時はオーケストレーターの既定のタイムアウト
+    timeout   : Optional[float] = None
+
+
+@dataclass
+class BranchResult:
+    """サブ分析の結果"""
+    agent_name: str
+    input     : str
+    output    : Optional[str] = None
+    error     : Optional[str] = None
+    timed_out : bool = False
+    elapsed   : float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# 分岐の結果を1つの応答にまとめる関数
+MergeFunction = Callable[[str, list[BranchResult]], str]
+
+
+def merge_as_sections(question: str, results: list[BranchResult]) -> str:
+    """分岐ごとの結果を見出し付きで並べる（失敗した分岐は理由を記載する）"""
+    sections = []
+    for index, result in enumerate(results, start=1):
+        body = result.output if result.ok else f"（取得できませんでした: {result.error}）"
+        sections.append(f"## {index}. {result.agent_name}: {result.input}\n{body}")
+    return "\n\n".join(sections)
+
+
+class _SubAnalysis(TypedDict):
+    agent_name: str
+    input     : str
+
+
+class FanOutOrchestrator:
+    """
+    複数のサブエージェントを並列に実行し、結果をまとめるオーケストレーター
+
+    各分岐は呼び出し元の会話履歴を引き継いだ独立したコンテキストで実行するため、分岐同士は干渉しない。
+    モデル呼び出しはデプロイメントのスケジューラーを経由するため、同時実行数とレート制限はその範囲に収まる。
+    全体の所要時間は最も遅い分岐（またはタイムアウト）で決まる。
+    """
+
+    def __init__(
+        self,
+        default_timeout : float = 120.0,
+        max_branches    : int = 8,
+        merge_agent_name: Optional[str] = None,
+        merge_function  : MergeFunction = merge_as_sections
+    ):
+        self.default_timeout = default_timeout
+        self.max_branches = max_branches
+        self.merge_agent_name = merge_agent_name
+        self.merge_function = merge_function
+
+    async def run_branches(self, context: AgentContext, branches: list[FanOutBranch]) -> list[BranchResult]:
+        """
+        分岐を並列に実行する
+
+        引数:
+            context: 呼び出し元のコンテキスト（各分岐はこれを派生したコンテキストで実行する）
+            branches: 実行する分岐
+
+        戻り値:
+            分岐と同じ順序の結果（失敗やタイムアウトも結果として返す）
+        """
+        if len(branches) > self.max_branches:
+            raise ValueError(f"分岐の数が上限を超えています: {len(branches)} > {self.max_branches}")
+
+        with metrics.span('fanout', branches=str(len(branches))):
+            return list(await asyncio.gather(*(self._run_branch(context.derive(), branch) for branch in branches)))
+
+    async def _run_branch(self, context: AgentContext, branch: FanOutBranch) -> BranchResult:
+        result = BranchResult(agent_name=branch.agent_name, input=branch.input)
+        if not agent_registry.has_agent(branch.agent_name):
+            result.error = f"エージェント {branch.agent_name} は登録されていません"
+            return result
+
+        agent = agent_registry.get_agent(branch.agent_name)
+        timeout = branch.timeout if branch.timeout is not None else self.default_timeout
+        context.history.add_user(branch.input)
+
+        started = time.perf_counter()
+        try:
+            with MetricsRunHooks(agent).bind() as hooks:
+                run_result = await asyncio.wait_for(
+                    Runner.run(starting_agent=agent, input=context.to_input(), context=context, hooks=hooks),
+                    timeout
+                )
+            result.output = str(run_result.final_output)
+            context.history.add_assistant(result.output)
+        except asyncio.TimeoutError:
+            result.timed_out = True
+            result.error = f"{timeout:g}秒以内に完了しませんでした"
+        except Exception as e:
+            # 1つの分岐の失敗で他の分岐の結果を失わないよう、エラーも結果として返す
+            result.error = str(e) or type(e).__name__
+        result.elapsed = time.perf_counter() - started
+
+        metrics.observe('fanout_branch', result.elapsed, agent=branch.agent_name, status='ok' if result.ok else 'error')
+        if not result.ok:
+            apllog().warning(f"分岐 {branch.agent_name} が失敗しました（{result.elapsed:.2f}秒）: {result.error}")
+        return result
+
+    async def merge(self, context: AgentContext, question: str, results: list[BranchResult]) -> str:
+        """分岐の結果をまとめる（まとめ役のエージェントが登録されていればそのエージェントに任せる）"""
+        merged = self.merge_function(question, results)
+        if self.merge_agent_name is None or not agent_registry.has_agent(self.merge_agent_name):
+            return merged
+
+        agent = agent_registry.get_agent(self.merge_agent_name)
+        request = f"# 質問\n{question}\n\n# サブ分析の結果\n{merged}"
+        with metrics.span('fanout_merge'), MetricsRunHooks(agent).bind() as hooks:
+            run_result = await Runner.run(starting_agent=agent, input=request, context=context.derive(), hooks=hooks)
+        return str(run_result.final_output)
+
+    async def run(self, context: AgentContext, question: str, branches: list[FanOutBranch]) -> str:
+        """分岐を並列に実行し、結果をまとめた応答を返す"""
+        results = await self.run_branches(context, branches)
+        return await self.merge(context, question, results)
+
+    def as_tool(self, agent_names: Optional[list[str]] = None) -> FunctionTool:
+        """
+        調整役のエージェントがサブ分析を並列に依頼するためのツールを作成する
+
+        引数:
+            agent_names: 依頼先に指定できるエージェント（省略時は登録されているすべてのエージェント）
+        """
+        orchestrator = self
+        allowed = agent_names if agent_names is not None else agent_registry.list_agents()
+        description = (
+            "独立した複数のサブ分析を、それぞれ担当のエージェントに並列で依頼し、結果をまとめて返す。"
+            f"一度に依頼できるのは {self.max_branches} 件まで。"
+            f"agent_name に指定できるエージェント: {', '.join(allowed)}"
+        )
+
+        @function_tool(name_override="run_parallel_analyses", description_override=description)
+        async def run_parallel_analyses(
+            context : RunContextWrapper[AgentContext],
+            question: str,
+            analyses: list[_SubAnalysis]
+        ) -> str:
+            unknown = [analysis['agent_name'] for analysis in analyses if analysis['agent_name'] not in allowed]
+            if unknown:
+                return f"指定できないエージェントです: {', '.join(unknown)}（指定できるエージェント: {', '.join(allowed)}）"
+            branches = [FanOutBranch(agent_name=analysis['agent_name'], input=analysis['input']) for analysis in analyses]
+            try:
+                return await orchestrator.run(context.context, question, branches)
+            except ValueError as e:
+                return str(e)
+
+        return run_parallel_analyses
@@ -0,0 +1,216 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from src.core.logger import apllog
+from src.core.model_factory import ModelConfiguration
+from src.core.utils import count_tokens
+
+if TYPE_CHECKING:
+    from src.ai_agents.session_store import SessionLog
+
+# チャット形式で1メッセージごとに加算されるおおよそのトークン数
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# ウィンドウ外の会話の要約をモデルに渡す際の見出し
+SUMMARY_HEADER = "これまでの会話の要約:\n"
+
+
+@dataclass(slots=True)
+class HistoryMessage:
+    """会話履歴の1メッセージ（トークン数は追加時に一度だけ計算する）"""
+    role   : str
+    content: str
+    tokens : int
+
+    def to_input(self) -> dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+
+class ConversationHistory:
+    """
+    トークン数の上限付き会話履歴
+
+    メッセージごとのトークン数と、モデルに渡す範囲（ウィンドウ）の合計トークン数を保持する。
+    上限を超えた場合は古いターンからウィンドウの外に出し、リクエストサイズを一定に保つ。
+    ウィンドウ外のターンの要約が設定されている場合は、要約メッセージを先頭に付けてモデルに渡す。
+
+    ウィンドウは上限を超えたときに trim_ratio の割合までまとめて縮めるため、次に上限を超えるまでの間は
+    モデルに渡す先頭部分（要約と古いターン）が変わらず、プロバイダー側のプロンプトキャッシュが効く。
+
+    セッションのログ（SessionLog）を指定すると、追加したメッセージと要約をログに書き込み、
+    ウィンドウ外に出たメッセージはメモリから外して、必要になったときにログから読み込む。
+    """
+
+    def __init__(
+        self,
+        token_budget: Optional[int] = None,
+        model_name  : Optional[str] = None,
+        trim_ratio  : Optional[float] = None,
+        log         : Optional['SessionLog'] = None
+    ):
+        config = ModelConfiguration.default()
+        self.token_budget = token_budget if token_budget is not None else config.history_token_budget
+        self.model_name = model_name or config.model_name
+        self.trim_ratio = trim_ratio if trim_ratio is not None else config.history_trim_ratio
+        self.log = log
+
+        # メモリ上のメッセージは先頭から _offset 件目以降（ログがない場合は常に全件）
+        self._messages: list[HistoryMessage] = []
+        self._offset = 0
+        self._window_start = 0
+        self._window_tokens = 0
+
+        # ウィンドウ外のターンの要約と、要約済みのメッセージ数
+        self.summary: Optional[HistoryMessage] = None
+        self._summarized_until = 0
+
+    @classmethod
+    def resume(cls, log: 'SessionLog', **kwargs) -> 'ConversationHistory':
+        """
+        セッションのログから会話履歴を再開する
+
+        ウィンドウはログのトークン数から新しい順に上限まで数えて決め、その範囲のメッセージだけをログから読み込む。
+        """
+        history = cls(log=log, **kwargs)
+        history.summary = log.summary
+        budget = history.token_budget - (log.summary.tokens if log.summary else 0)
+        start, tokens = len(log), 0
+        while start > 0 and (tokens + log.tokens[start - 1] <= budget or start == len(log)):
+            start -= 1
+            tokens += log.tokens[start]
+        # 要約済みのメッセージはウィンドウに含めない
+        while start < min(log.summarized_until, len(log) - 1):
+            tokens -= log.tokens[start]
+            start += 1
+
+        history._messages = log.read_messages(start, len(log))
+        history._offset = history._window_start = start
+        history._window_tokens = tokens
+        history._summarized_until = log.summarized_until
+        history._trim_window()
+        return history
+
+    def append(self, role: str, content: str) -> HistoryMessage:
+        """メッセージを追加し、上限を超えた古いターンをウィンドウから外す"""
+        message = HistoryMessage(
+            role    = role,
+            content = content,
+            tokens  = count_tokens(content, self.model_name) + MESSAGE_OVERHEAD_TOKENS
+        )
+        self._messages.append(message)
+        self._window_tokens += message.tokens
+        if self.log is not None:
+            self.log.append_message(message)
+        self._trim_window()
+        return message
+
+    def add_user(self, content: str) -> HistoryMessage:
+        return self.append("user", content)
+
+    def add_assistant(self, content: str) -> HistoryMessage:
+        return self.append("assistant", content)
+
+    def _trim_window(self) -> None:
+        """ウィンドウの合計トークン数が上限を超えたら、上限の trim_ratio の割合に収まるまで古いメッセージを外す"""
+        trimmed = 0
+        last_index = len(self) - 1
+        budget = self.token_budget - (self.summary.tokens if self.summary else 0)
+        target = budget * self.trim_ratio if self._window_tokens > budget else budget
+        while self._window_tokens > target and self._window_start < last_index:
+            self._window_tokens -= self._messages[self._window_start - self._offset].tokens
+            self._window_start += 1
+            trimmed += 1
+
+        # ウィンドウがアシスタントの発言から始まらないよう、次のユーザー発言まで進める
+        while self._window_start < last_index and self._messages[self._window_start - self._offset].role != "user":
+            self._window_tokens -= self._messages[self._window_start - self._offset].tokens
+            self._window_start += 1
+            trimmed += 1
+
+        if trimmed:
+            apllog().debug(
+                f"会話履歴から {trimmed} 件をウィンドウ外に移動しました"
+                f"（{self._window_tokens}/{self.token_budget} トークン）"
+            )
+            if self.log is not None:
+                # ウィンドウ外のメッセージはログにあるため、メモリから外す
+                del self._messages[:self._window_start - self._offset]
+                self._offset = self._window_start
+
+    def to_input(self, volatile_context: Optional[str] = None) -> list[dict[str, str]]:
+        """
+        ウィンドウ内のメッセージをRunnerに渡す入力形式で取得
+
+        先頭から「要約 → 古いターン → 新しいターン → ターンごとに変わる情報」の順に並べ、
+        前のターンと同じ内容を常に同じバイト列で先頭に置く。
+
+        引数:
+            volatile_context: 時刻など毎ターン変わる情報（末尾のシステムメッセージとして付加）
+        """
+        messages = [message.to_input() for message in self.window]
+        if self.summary is not None:
+            messages.insert(0, self.summary.to_input())
+        if volatile_context:
+            messages.append({"role": "system", "content": volatile_context})
+        return messages
+
+    def pending_summary_range(self) -> tuple[int, int]:
+        """ウィンドウ外に移動したがまだ要約されていないメッセージの範囲"""
+        return self._summarized_until, self._window_start
+
+    def apply_summary(self, summary_text: str, summarized_until: int) -> None:
+        """
+        ウィンドウ外のターンの要約を設定
+
+        引数:
+            summary_text: 先頭から summarized_until までのメッセージの要約
+            summarized_until: 要約に含まれるメッセージ数
+        """
+        content = SUMMARY_HEADER + summary_text
+        self.summary = HistoryMessage(
+            role    = "system",
+            content = content,
+            tokens  = count_tokens(content, self.model_name) + MESSAGE_OVERHEAD_TOKENS
+        )
+        self._summarized_until = max(self._summarized_until, summarized_until)
+        if self.log is not None:
+            self.log.append_summary(self.summary, self._summarized_until)
+        self._trim_window()
+        apllog().debug(f"会話履歴の要約を更新しました（{self._summarized_until} 件を要約、{self.summary.tokens} トークン）")
+
+    def fork(self) -> 'ConversationHistory':
+        """要約とウィンドウ内のメッセージを引き継いだ独立した履歴を作成（作成後の追加は元の履歴に影響しない）"""
+        forked = ConversationHistory(token_budget=self.token_budget, model_name=self.model_name, trim_ratio=self.trim_ratio)
+        forked.summary = self.summary
+        forked._messages = self.window
+        forked._window_tokens = self._window_tokens
+        return forked
+
+    @property
+    def window_tokens(self) -> int:
+        """ウィンドウ内のメッセージの合計トークン数"""
+        return self._window_tokens
+
+    @property
+    def window(self) -> list[HistoryMessage]:
+        """モデルに渡すメッセージ"""
+        return self._messages[self._window_start - self._offset:]
+
+    def messages(self, start: int, end: int) -> list[HistoryMessage]:
+        """先頭から start 件目から end 件目の手前までのメッセージ（メモリにないものはログから読み込む）"""
+        end = min(end, len(self))
+        if start >= end:
+            return []
+        paged = self.log.read_messages(start, min(end, self._offset)) if start < self._offset else []
+        return paged + self._messages[max(start, self._offset) - self._offset:end - self._offset]
+
+    @property
+    def evicted(self) -> list[HistoryMessage]:
+        """ウィンドウ外に移動したメッセージ"""
+        return self.messages(0, self._window_start)
+
+    def __len__(self) -> int:
+        return self._offset + len(self._messages)
+
+    def __iter__(self) -> Iterator[HistoryMessage]:
+        return iter(self.messages(0, len(self)))
@@ -0,0 +1,62 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from agents import Agent, RunContextWrapper, RunHooks, Tool
+
+from src.core.metrics import AgentLabel, current_agent, metrics
+
+
+class MetricsRunHooks(RunHooks):
+    """
+    Runner の実行中のエージェント、ハンドオフ、ツール呼び出しの所要時間を記録するフック
+
+    1回の実行（ターン）ごとにインスタンスを作成し、bind() の中で Runner.run の hooks に渡す。
+    実行中のエージェント名は current_agent に設定され、モデル呼び出しのスパンのラベルになる。
+    """
+
+    def __init__(self, starting_agent: Optional[Agent[Any]] = None):
+        self.label = AgentLabel(starting_agent.name if starting_agent is not None else '')
+        self._agent_started: dict[str, float] = {}
+        self._tool_started: dict[tuple[str, str], float] = {}
+        self._handoff_started: Optional[tuple[str, float]] = None
+
+    @contextmanager
+    def bind(self) -> Iterator['MetricsRunHooks']:
+        """ブロック内で開始した実行のモデル呼び出しに、このフックが追跡するエージェント名を付ける"""
+        token = current_agent.set(self.label)
+        try:
+            yield self
+        finally:
+            current_agent.reset(token)
+
+    async def on_agent_start(self, context: RunContextWrapper[Any], agent: Agent[Any]) -> None:
+        now = time.perf_counter()
+        self.label.name = agent.name
+        self._agent_started.setdefault(agent.name, now)
+        # ハンドオフを受けてから転送先のエージェントが動き出すまで
+        if self._handoff_started is not None:
+            from_agent, started = self._handoff_started
+            metrics.observe('handoff', now - started, source=from_agent, target=agent.name)
+            self._handoff_started = None
+
+    async def on_agent_end(self, context: RunContextWrapper[Any], agent: Agent[Any], output: Any) -> None:
+        started = self._agent_started.pop(agent.name, None)
+        if started is not None:
+            metrics.observe('agent', time.perf_counter() - started, agent=agent.name)
+
+    async def on_handoff(self, context: RunContextWrapper[Any], from_agent: Agent[Any], to_agent: Agent[Any]) -> None:
+        now = time.perf_counter()
+        # 転送元のエージェントはここで処理を終える
+        started = self._agent_started.pop(from_agent.name, None)
+        if started is not None:
+            metrics.observe('agent', now - started, agent=from_agent.name)
+        self._handoff_started = (from_agent.name, now)
+
+    async def on_tool_start(self, context: RunContextWrapper[Any], agent: Agent[Any], tool: Tool) -> None:
+        self._tool_started[(agent.name, tool.name)] = time.perf_counter()
+
+    async def on_tool_end(self, context: RunContextWrapper[Any], agent: Agent[Any], tool: Tool, result: str) -> None:
+        started = self._tool_started.pop((agent.name, tool.name), None)
+        if started is not None:
+            metrics.observe('tool_call', time.perf_counter() - started, agent=agent.name, tool=tool.name)
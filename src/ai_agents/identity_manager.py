@@ -5,6 +5,14 @@ class AgentIdentityManager:
         task_name   : str = 'triage'
         triage_agent: str = 'triage_agent'
 
+    class Summary:
+        task_name    : str = 'summary'
+        summary_agent: str = 'summary_agent'
+
+    class CodeGenerate:
+        task_name          : str = 'code_generate'
+        code_generate_agent: str = 'code_generate_agent'
+
 
     @classmethod
     def get_task_agents(cls, task: str) -> list[str]:
@@ -16,6 +24,12 @@ class AgentIdentityManager:
             cls.Triage.task_name: [
                 cls.Triage.triage_agent,
             ],
+            cls.Summary.task_name: [
+                cls.Summary.summary_agent,
+            ],
+            cls.CodeGenerate.task_name: [
+                cls.CodeGenerate.code_generate_agent,
+            ],
         }
 
         return task_map.get(task.lower(), [])
\ No newline at end of file
@@ -1,16 +1,27 @@
-from agents import Agent
+import threading
+from typing import TYPE_CHECKING, Callable, Optional
 
 from src.core.logger import apllog
 
+if TYPE_CHECKING:
+    from agents import Agent
+
 
 class AgentRegistry:
-    """エージェントインスタンスを管理するレジストリー"""
+    """エージェントインスタンスを管理するレジストリー
+
+    エージェントはインスタンスのほか、初回の get_agent でエージェントを生成するファクトリーとしても登録できる。
+    ファクトリーで登録すると、モデルやクライアントの生成と重いモジュールの読み込みを最初の利用時まで遅延できる。
+    """
 
     def __init__(self):
         self.agents = {}
+        self.factories: dict[str, Callable[[], 'Agent']] = {}
+        # ファクトリーの中で他のエージェントを取得できるよう（ハンドオフ先など）再入可能なロックにする
+        self._lock = threading.RLock()
         apllog().debug("エージェントレジストリーを初期化しました。")
 
-    def register_agent(self, agent: Agent):
+    def register_agent(self, agent: 'Agent'):
         """エージェントをレジストリーに登録する"""
         if agent.name in self.agents:
             apllog().warning(f"エージェント {agent.name} はすでに登録されています。")
@@ -18,25 +29,44 @@ class AgentRegistry:
             self.agents[agent.name] = agent
             apllog().debug(f"エージェント {agent.name} をレジストリーに登録しました。")
 
-    def get_agent(self, name: str) -> Agent:
-        """レジストリーからエージェントを取得する"""
+    def register_factory(self, name: str, factory: Callable[[], 'Agent']):
+        """初回の取得時にエージェントを生成するファクトリーをレジストリーに登録する"""
+        if name in self.agents or name in self.factories:
+            apllog().warning(f"エージェント {name} はすでに登録されています。")
+        else:
+            self.factories[name] = factory
+            apllog().debug(f"エージェント {name} のファクトリーをレジストリーに登録しました。")
+
+    def has_agent(self, name: str) -> bool:
+        """エージェントが（インスタンスまたはファクトリーとして）登録されているか"""
+        return name in self.agents or name in self.factories
+
+    def get_agent(self, name: str) -> Optional['Agent']:
+        """レジストリーからエージェントを取得する（ファクトリーのみ登録されている場合はここで生成する）"""
         if name in self.agents:
             apllog().debug(f"エージェント {name} をレジストリーから取得しました。")
             return self.agents[name]
-        else:
-            apllog().warning(f"エージェント {name} はレジストリーに登録されていません。")
-            return None
-        
+
+        if name in self.factories:
+            with self._lock:
+                if name not in self.agents:
+                    self.agents[name] = self.factories[name]()
+                    apllog().debug(f"エージェント {name} をファクトリーから生成しました。")
+            return self.agents[name]
+
+        apllog().warning(f"エージェント {name} はレジストリーに登録されていません。")
+        return None
+
     def list_agents(self) -> list[str]:
         """レジストリーに登録されているエージェントのリストを取得する"""
-        agent_names = list(self.agents.keys())
+        agent_names = list(dict.fromkeys([*self.agents.keys(), *self.factories.keys()]))
         apllog().debug(f"レジストリーに登録されているエージェント: {agent_names}")
         return agent_names
-    
-    def get_agent_list(self) -> list[Agent]:
-        """レジストリーに登録されているエージェントのリストを取得する"""
-        agents = list(self.agents.values())
+
+    def get_agent_list(self) -> list['Agent']:
+        """レジストリーに登録されているエージェントのリストを取得する（未生成のエージェントも生成する）"""
+        agents = [self.get_agent(name) for name in self.list_agents()]
         apllog().debug(f"レジストリーに登録されているエージェント: {agents}")
         return agents
-    
-agent_registry = AgentRegistry()
\ No newline at end of file
+
+agent_registry = AgentRegistry()
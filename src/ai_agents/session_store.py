@@ -0,0 +1,207 @@
+import asyncio
+import io
+import json
+import os
+import weakref
+from array import array
+from pathlib import Path
+from typing import Optional, Union
+from urllib.parse import quote
+
+from src.ai_agents.history import ConversationHistory, HistoryMessage
+from src.core.logger import apllog
+from src.core.settings import SessionStoreSettings, Settings
+
+# ログのレコードの種類（1行1レコードの JSON 配列）
+# メッセージ: ["m", role, tokens, content]、要約: ["s", 要約済みのメッセージ数, tokens, content]
+_MESSAGE = "m"
+_SUMMARY = "s"
+
+
+class SessionLog:
+    """
+    1つのセッションの追記専用ログ
+
+    メッセージの行の開始位置とトークン数だけをメモリに持ち、メッセージ本文は必要になったときにログから読み込む。
+    追記用のファイルは最初の書き込みで開いたまま使い、書き込みはバッファーを通さずにすぐにファイルに渡す。
+    fsync はストアがまとめて行う。
+    """
+
+    def __init__(self, store: 'SessionStore', path: Path):
+        self.store = store
+        self.path = path
+        # メッセージごとの行の開始位置とトークン数
+        self.offsets = array('q')
+        self.tokens = array('l')
+        self.summary: Optional[HistoryMessage] = None
+        self.summarized_until = 0
+        self._file: Optional[io.FileIO] = None
+        self._scan()
+
+    def _scan(self) -> None:
+        """ログを先頭から読み、各メッセージの位置と最新の要約を求める（書きかけの最終行は切り捨てる）"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb') as f:
+            position = 0
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    kind, value, tokens, content = json.loads(line)
+                except ValueError:
+                    apllog().warning(f"セッションのログの {position} バイト目以降を読み込めないため切り捨てます: {self.path}")
+                    break
+                if kind == _MESSAGE:
+                    self.offsets.append(position)
+                    self.tokens.append(tokens)
+                elif kind == _SUMMARY:
+                    self.summary = HistoryMessage(role="system", content=content, tokens=tokens)
+                    self.summarized_until = value
+                position += len(line)
+        if position < self.path.stat().st_size:
+            os.truncate(self.path, position)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def _write(self, record: list) -> int:
+        """レコードを1行追記し、その行の開始位置を返す"""
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b"\n"
+        if self._file is None or self._file.closed:
+            self._file = open(self.path, 'ab', buffering=0)
+        # 同じセッションを再開した別のログからの追記があっても正しい位置を記録するよう、ファイルの末尾を使う
+        position = os.fstat(self._file.fileno()).st_size
+        self._file.write(line)
+        self.store.mark_dirty(self.path)
+        return position
+
+    def close(self) -> None:
+        """追記用のファイルを閉じる（以降に書き込むと開き直す）"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def append_message(self, message: HistoryMessage) -> None:
+        self.offsets.append(self._write([_MESSAGE, message.role, message.tokens, message.content]))
+        self.tokens.append(message.tokens)
+
+    def append_summary(self, summary: HistoryMessage, summarized_until: int) -> None:
+        self._write([_SUMMARY, summarized_until, summary.tokens, summary.content])
+        self.summary = summary
+        self.summarized_until = summarized_until
+
+    def read_messages(self, start: int, end: int) -> list[HistoryMessage]:
+        """先頭から start 件目から end 件目の手前までのメッセージをログから読み込む"""
+        messages: list[HistoryMessage] = []
+        if start >= end:
+            return messages
+        with open(self.path, 'rb') as f:
+            f.seek(self.offsets[start])
+            for line in f:
+                kind, role, tokens, content = json.loads(line)
+                if kind != _MESSAGE:
+                    continue
+                messages.append(HistoryMessage(role=role, content=content, tokens=tokens))
+                if len(messages) >= end - start:
+                    break
+        return messages
+
+
+class SessionStore:
+    """
+    会話履歴をセッションごとの追記専用ログに保存するストア
+
+    <directory>/<セッションID>.jsonl に1メッセージ1行で追記し、fsync は fsync_interval 秒ごとにまとめて行う。
+    再開時はログの位置情報だけを読み込み、ウィンドウに入る直近のメッセージのみをメモリに載せる。
+    """
+
+    def __init__(self, directory: Union[str, Path], fsync_interval: float = 1.0):
+        self.directory = Path(directory)
+        self.fsync_interval = fsync_interval
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._dirty: set[Path] = set()
+        self._sync_task: Optional[asyncio.Task] = None
+        # 追記用のファイルを開いている可能性のあるログ（終了時に閉じる）
+        self._logs: weakref.WeakSet[SessionLog] = weakref.WeakSet()
+
+    @classmethod
+    def from_settings(cls, settings: Optional[SessionStoreSettings] = None) -> Optional['SessionStore']:
+        """設定からストアを作成する（保存先が設定されていない場合は None）"""
+        st = settings or Settings().session_store
+        if not st.directory:
+            return None
+        return cls(st.directory, fsync_interval=st.fsync_interval)
+
+    def path_for(self, session_id: str) -> Path:
+        return self.directory / f"{quote(session_id, safe='')}.jsonl"
+
+    def exists(self, session_id: str) -> bool:
+        return self.path_for(session_id).exists()
+
+    def load(self, session_id: str) -> ConversationHistory:
+        """
+        セッションの会話履歴を読み込む（ログがなければ空の履歴を作る）
+
+        引数:
+            session_id: セッションID
+
+        戻り値:
+            以降の追加がログに書き込まれる会話履歴
+        """
+        log = SessionLog(self, self.path_for(session_id))
+        self._logs.add(log)
+        history = ConversationHistory.resume(log)
+        if len(log):
+            apllog().info(
+                f"セッション {session_id} を再開しました（{len(log)} 件中 {len(history.window)} 件を読み込み、"
+                f"{history.window_tokens} トークン）"
+            )
+        return history
+
+    def mark_dirty(self, path: Path) -> None:
+        """fsync が必要なファイルとして記録する（設定した間隔がない場合はすぐに fsync する）"""
+        if self.fsync_interval <= 0:
+            self._fsync([path])
+            return
+        self._dirty.add(path)
+        if self._sync_task is None or self._sync_task.done():
+            try:
+                self._sync_task = asyncio.get_running_loop().create_task(self._sync_later(), name="session-store-fsync")
+            except RuntimeError:
+                # イベントループの外からの書き込みはすぐに fsync する
+                self.sync()
+
+    @staticmethod
+    def _fsync(paths: list[Path]) -> None:
+        for path in paths:
+            try:
+                fd = os.open(path, os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    async def _sync_later(self) -> None:
+        """間隔の間に書き込まれたファイルをまとめて fsync する（fsync 中に書き込まれたファイルは次の間隔で fsync する）"""
+        while self._dirty:
+            await asyncio.sleep(self.fsync_interval)
+            paths, self._dirty = list(self._dirty), set()
+            await asyncio.to_thread(self._fsync, paths)
+
+    def sync(self) -> None:
+        """未 fsync のファイルをすべて fsync する"""
+        paths, self._dirty = list(self._dirty), set()
+        self._fsync(paths)
+
+    async def close(self) -> None:
+        """待機中の fsync を取り消し、残りをすべて fsync してからログのファイルを閉じる"""
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+            self._sync_task = None
+        await asyncio.to_thread(self.sync)
+        for log in list(self._logs):
+            log.close()
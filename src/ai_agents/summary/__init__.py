@@ -0,0 +1,19 @@
+import os
+
+from src.ai_agents.identity_manager import AgentIdentityManager
+from src.ai_agents.registry import agent_registry
+from src.core.logger import apllog
+
+def _create_summary_agent():
+    """エージェントのインスタンスを作成（エージェントとモデルのモジュールはここで初めて読み込む）"""
+    from src.ai_agents.summary.summary_agent import SummaryAgent
+    from src.core.model_factory import ModelFactory
+    return SummaryAgent(ModelFactory.get_summary_model())
+
+# エージェントのファクトリーをレジストリに登録（インスタンスは初回の get_agent で作成される）
+agent_registry.register_factory(AgentIdentityManager.Summary.summary_agent, _create_summary_agent)
+apllog().info(f"エージェント {AgentIdentityManager.Summary.summary_agent} をレジストリに登録しました。")
+
+# タスクの全エージェントをレジストリに登録したことを確認するためのログ
+task_name: str = os.path.basename(os.path.dirname(__file__))
+apllog().info(f"タスク '{task_name}' の全エージェントをレジストリに登録しました。")
\ No newline at end of file
@@ -0,0 +1,75 @@
+import asyncio
+from typing import Optional
+
+from agents import Runner
+
+from src.ai_agents.history import ConversationHistory, SUMMARY_HEADER
+from src.ai_agents.identity_manager import AgentIdentityManager
+from src.ai_agents.registry import agent_registry
+from src.core.logger import apllog
+from src.core.scheduler import RequestPriority, request_priority
+from src.core.settings import Settings
+
+
+class HistorySummarizer:
+    """
+    ウィンドウ外に出た会話をバックグラウンドで要約するクラス
+
+    ターンの応答後に schedule() を呼ぶと、ユーザーの入力待ちの間に要約を実行し、
+    完了したら会話履歴の要約メッセージを差し替える。要約中のターンは要約を待たずに処理される。
+    未要約のメッセージが min_messages 件たまるまでは要約せず、要約の呼び出しの回数を抑える。
+    """
+
+    def __init__(self, agent_name: str = AgentIdentityManager.Summary.summary_agent, min_messages: Optional[int] = None):
+        self.agent_name = agent_name
+        self.min_messages = max(1, min_messages if min_messages is not None else Settings().history.summary_min_messages)
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def schedule(self, history: ConversationHistory) -> Optional[asyncio.Task]:
+        """未要約のメッセージが min_messages 件以上あり、同じ履歴の要約が実行中でなければ要約タスクを開始"""
+        start, end = history.pending_summary_range()
+        if end - start < self.min_messages:
+            return None
+
+        key = id(history)
+        running = self._tasks.get(key)
+        if running is not None and not running.done():
+            return None
+
+        task = asyncio.create_task(self._summarize(history, end), name=f"history-summary-{key}")
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return task
+
+    async def _summarize(self, history: ConversationHistory, summarized_until: int) -> None:
+        start, _ = history.pending_summary_range()
+        messages = history.messages(start, summarized_until)
+
+        previous_summary = history.summary.content[len(SUMMARY_HEADER):] if history.summary else "なし"
+        conversation = "\n".join(f"{message.role}: {message.content}" for message in messages)
+        request = f"# これまでの要約\n{previous_summary}\n\n# 新しい会話\n{conversation}"
+
+        agent = agent_registry.get_agent(self.agent_name)
+        if agent is None:
+            apllog().error(f"要約エージェント {self.agent_name} が見つからないため、要約をスキップします。")
+            return
+
+        try:
+            # 要約は対話中のターンより後回しにする
+            with request_priority(RequestPriority.BACKGROUND):
+                result = await Runner.run(starting_agent=agent, input=request)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 要約に失敗してもターンの処理には影響させず、次回の要約で再試行する
+            apllog().warning(f"会話履歴の要約に失敗しました: {e}")
+            return
+
+        history.apply_summary(str(result.final_output), summarized_until)
+
+    async def aclose(self) -> None:
+        """実行中の要約タスクをキャンセルして終了を待つ"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
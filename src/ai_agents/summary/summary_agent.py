@@ -0,0 +1,19 @@
+from typing import Any
+
+from agents import Agent, Model, RunContextWrapper
+
+from src.ai_agents.context import AgentContext
+from src.ai_agents.identity_manager import AgentIdentityManager
+from src.core.prompt_manager import get_prompt
+
+class SummaryAgent(Agent[AgentContext]):
+
+    def __init__(self, model: Model, name: str = AgentIdentityManager.Summary.summary_agent):
+        super().__init__(name, model)
+        self.name = name
+        self.model = model
+        self.instructions = self._set_prompt
+
+    @staticmethod
+    def _set_prompt(context: RunContextWrapper[AgentContext], agent: Any):
+        return get_prompt(f'{AgentIdentityManager.Summary.task_name}/{AgentIdentityManager.Summary.summary_agent}')
\ No newline at end of file
@@ -1,16 +1,25 @@
 import os
 
-from src.ai_agents.triage.triage_agent import TriageAgent
-from ai_agents.registry import agent_registry
-from src.core.model_factory import ModelFactory
+from src.ai_agents.identity_manager import AgentIdentityManager
+from src.ai_agents.registry import agent_registry
 from src.core.logger import apllog
 
-# エージェントのインスタンスを作成
-triage_agent = TriageAgent(ModelFactory.get_default_model())
+def _create_triage_agent():
+    """エージェントのインスタンスを作成（エージェントとモデルのモジュールはここで初めて読み込む）"""
+    from src.ai_agents.fanout import FanOutOrchestrator
+    from src.ai_agents.triage.triage_agent import TriageAgent
+    from src.core.model_factory import ModelFactory
+    # プロンプトの遷移先のうち、登録されているエージェントにハンドオフできるようにする
+    transfers = [AgentIdentityManager.CodeGenerate.code_generate_agent]
+    registered = [name for name in transfers if agent_registry.has_agent(name)]
+    handoffs = [agent_registry.get_agent(name) for name in registered]
+    # 独立した複数のサブ分析は、同じ遷移先のエージェントに並列で依頼できるようにする
+    tools = [FanOutOrchestrator().as_tool(registered)] if registered else []
+    return TriageAgent(ModelFactory.get_default_model(), handoffs=handoffs, tools=tools)
 
-# エージェントをレジストリに登録
-agent_registry.register_agent(triage_agent)
-apllog().info(f"エージェント {triage_agent.name} をレジストリに登録しました。")
+# エージェントのファクトリーをレジストリに登録（インスタンスは初回の get_agent で作成される）
+agent_registry.register_factory(AgentIdentityManager.Triage.triage_agent, _create_triage_agent)
+apllog().info(f"エージェント {AgentIdentityManager.Triage.triage_agent} をレジストリに登録しました。")
 
 # タスクの全エージェントをレジストリに登録したことを確認するためのログ
 task_name: str = os.path.basename(os.path.dirname(__file__))
@@ -0,0 +1,134 @@
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+import yaml
+
+from src.ai_agents.triage.semantic_cache import SemanticRouteCache
+from src.core.logger import apllog
+
+
+@dataclass
+class FastRoute:
+    """転送先エージェントと、その判定に使うキーワード・パターン"""
+    agent   : str
+    keywords: tuple[str, ...]
+    patterns: tuple[re.Pattern, ...]
+
+    def score(self, text: str, lowered: str) -> int:
+        """キーワード1件につき1点、パターン1件につき2点"""
+        score = sum(1 for keyword in self.keywords if keyword in lowered)
+        score += sum(2 for pattern in self.patterns if pattern.search(text))
+        return score
+
+
+@dataclass
+class RouteDecision:
+    """LLMを使わずに決定したルーティング結果"""
+    agent     : str
+    score     : int
+    # rules: ルールに一致、semantic: 以前にトリアージした似た質問の転送先を再利用
+    source    : str = 'rules'
+    similarity: float = 0.0
+
+
+class FastPathRouter:
+    """
+    TriageAgent の前段でLLMを使わずに転送先を決めるルーター
+
+    ルールに明確に一致する入力は転送先エージェントへ直接渡し、
+    曖昧な入力だけをLLMによるトリアージに回すことで、多くのターンでモデル呼び出しを1回減らす。
+    ルールで決まらない入力も、言い回しだけが違う質問を以前にトリアージしていれば、その転送先を再利用する。
+    """
+
+    def __init__(
+        self,
+        routes        : list[FastRoute],
+        min_score     : int = 2,
+        margin        : int = 2,
+        semantic_cache: Optional[SemanticRouteCache] = None
+    ):
+        self.routes = routes
+        self.min_score = min_score
+        self.margin = margin
+        self.semantic_cache = semantic_cache
+
+    @classmethod
+    def from_config(cls, config_path: Union[str, Path]) -> 'FastPathRouter':
+        """ルーティングルールのYAMLからルーターを生成"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = (yaml.safe_load(f) or {}).get('fast_routes', {})
+
+        routes = [
+            FastRoute(
+                agent    = route['agent'],
+                keywords = tuple(keyword.lower() for keyword in route.get('keywords', [])),
+                patterns = tuple(re.compile(pattern) for pattern in route.get('patterns', []))
+            )
+            for route in config.get('routes', [])
+        ]
+        apllog().info(f"高速ルーティングのルールを読み込みました: {len(routes)} 件（{config_path}）")
+        return cls(
+            routes,
+            min_score      = config.get('min_score', 2),
+            margin         = config.get('margin', 2),
+            semantic_cache = SemanticRouteCache.from_settings()
+        )
+
+    def route(self, user_input: str) -> Optional[RouteDecision]:
+        """
+        入力に明確に一致する転送先を返す
+
+        引数:
+            user_input: ユーザー入力
+
+        戻り値:
+            転送先が明確な場合はその決定、曖昧な場合はNone（LLMによるトリアージに回す）
+        """
+        return self._route_by_rules(user_input) or self._route_by_similarity(user_input)
+
+    def _route_by_rules(self, user_input: str) -> Optional[RouteDecision]:
+        lowered = user_input.lower()
+        scores: dict[str, int] = {}
+        for route in self.routes:
+            score = route.score(user_input, lowered)
+            if score:
+                scores[route.agent] = scores.get(route.agent, 0) + score
+
+        if not scores:
+            return None
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        agent, best = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0
+        if best < self.min_score or best - runner_up < self.margin:
+            apllog().debug(f"高速ルーティングの判定が曖昧なためLLMに回します: {scores}")
+            return None
+
+        return RouteDecision(agent=agent, score=best)
+
+    def _route_by_similarity(self, user_input: str) -> Optional[RouteDecision]:
+        if self.semantic_cache is None:
+            return None
+        hit = self.semantic_cache.lookup(user_input)
+        if hit is None:
+            return None
+        agent, similarity = hit
+        return RouteDecision(agent=agent, score=0, source='semantic', similarity=similarity)
+
+    def remember(self, user_input: str, agent: str) -> None:
+        """
+        LLMによるトリアージで決まった転送先を、似た質問で再利用できるよう記録する
+
+        引数:
+            user_input: トリアージした入力
+            agent: 転送先のエージェント名
+        """
+        if self.semantic_cache is not None:
+            self.semantic_cache.put(user_input, agent)
+
+    async def close(self) -> None:
+        """似た質問のキャッシュの未保存の転送先を書き出す"""
+        if self.semantic_cache is not None:
+            await self.semantic_cache.close()
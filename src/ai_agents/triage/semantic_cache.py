@@ -0,0 +1,297 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+from src.core.cache import CacheStats
+from src.core.logger import apllog
+from src.core.settings import SemanticCacheSettings, Settings
+
+
+class HashedNgramEmbedder:
+    """
+    文字 n-gram を特徴量ハッシングでベクトルにする埋め込み（外部のモデルやネットワークを使わない）
+
+    日本語は単語の区切りがないため、単語ではなく文字の n-gram を使う。
+    ハッシュには実行ごとに値が変わらない crc32 を使い、保存したベクトルを再起動後もそのまま比較できるようにする。
+    """
+
+    def __init__(self, dim: int = 1024, ngram_range: tuple[int, int] = (2, 3)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """全角・半角と大文字・小文字、空白の違いを吸収する"""
+        return re.sub(r"\s+", " ", unicodedata.normalize('NFKC', text).lower()).strip()
+
+    def embed(self, text: str) -> np.ndarray:
+        """テキストを L2 正規化したベクトルにする（n-gram がない場合はゼロベクトル）"""
+        text = self.normalize(text)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        low, high = self.ngram_range
+        hashes = [
+            zlib.crc32(text[i:i + n].encode('utf-8'))
+            for n in range(low, high + 1)
+            for i in range(len(text) - n + 1)
+        ] or ([zlib.crc32(text.encode('utf-8'))] if text else [])
+        if not hashes:
+            return vector
+
+        hashes = np.asarray(hashes, dtype=np.uint32)
+        # 最上位ビットを符号に使い、ハッシュの衝突による偏りを打ち消す
+        signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, hashes % self.dim, signs)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def embed_batch(self, texts: list[str]) -> np.ndarray:
+        """複数のテキストを (件数, 次元) の行列にする"""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self.embed(text) for text in texts])
+
+
+class SemanticRouteCache:
+    """
+    言い回しだけが違う質問に、以前のトリアージの転送先を再利用するキャッシュ
+
+    質問のベクトルを (容量, 次元) の NumPy 行列に保持し、行列積でまとめてコサイン類似度を求める。
+    類似度がしきい値以上の質問があれば、その質問をトリアージしたときの転送先を返す。
+    容量を超えた場合は最も長く参照されていない行を上書きする。
+
+    directory を指定すると、行列は <directory>/vectors.npy にメモリマップで、
+    転送先と最終参照の順序は <directory>/entries.json に保存し、再起動後も引き継ぐ（1プロセスからの利用を前提とする）。
+    ファイルへの書き出しは save_interval 秒ごとにまとめて別スレッドで行い、close() で残りを書き出す。
+    行列は書き出す前にも OS によってファイルに反映されうるため、entries.json には行ごとのベクトルの crc32 も保存し、
+    読み込むときに一致しない行（entries.json を書き出した後に上書きされた行）は捨てる。
+    """
+
+    _VECTORS_FILE = "vectors.npy"
+    _ENTRIES_FILE = "entries.json"
+
+    def __init__(
+        self,
+        directory    : Union[str, Path, None] = None,
+        capacity     : int = 4096,
+        threshold    : float = 0.8,
+        embedder     : Optional[HashedNgramEmbedder] = None,
+        save_interval: float = 5.0
+    ):
+        self.directory = Path(directory) if directory else None
+        self.capacity = max(1, capacity)
+        self.threshold = threshold
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.save_interval = save_interval
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        # 取り消した書き出しのスレッドと close() の書き出しが重ならないようにする
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._save_task: Optional[asyncio.Task] = None
+
+        # 行ごとの転送先（None は空き）とベクトルの crc32、最終参照の時刻（参照のたびに増える通し番号）
+        self._agents: list[Optional[str]] = [None] * self.capacity
+        self._checksums: list[int] = [0] * self.capacity
+        self._last_used = np.zeros(self.capacity, dtype=np.int64)
+        self._clock = 0
+        self._size = 0
+        self._vectors = self._open()
+
+    @classmethod
+    def from_settings(cls, settings: Optional[SemanticCacheSettings] = None) -> Optional['SemanticRouteCache']:
+        """設定からキャッシュを作成する（無効な場合は None）"""
+        st = settings or Settings().semantic_cache
+        if not st.enabled:
+            return None
+        return cls(
+            st.directory,
+            capacity      = st.capacity,
+            threshold     = st.threshold,
+            embedder      = HashedNgramEmbedder(st.dim),
+            save_interval = st.save_interval
+        )
+
+    def _open(self) -> np.ndarray:
+        """保存した行列と転送先を読み込む（ないか形が合わない場合は空の行列を作る）"""
+        shape = (self.capacity, self.embedder.dim)
+        if self.directory is None:
+            return np.zeros(shape, dtype=np.float32)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        vectors_path = self.directory / self._VECTORS_FILE
+        entries_path = self.directory / self._ENTRIES_FILE
+        if vectors_path.exists() and entries_path.exists():
+            try:
+                vectors = np.lib.format.open_memmap(vectors_path, mode='r+')
+                with open(entries_path, encoding='utf-8') as f:
+                    entries = json.load(f)
+                if vectors.shape == shape and vectors.dtype == np.float32 and len(entries['agents']) == self.capacity:
+                    self._agents = entries['agents']
+                    self._checksums = [int(checksum) for checksum in entries['checksums']]
+                    self._last_used = np.asarray(entries['last_used'], dtype=np.int64)
+                    self._clock = int(entries['clock'])
+                    self._drop_mismatched_rows(vectors)
+                    self._size = max((i + 1 for i, agent in enumerate(self._agents) if agent is not None), default=0)
+                    apllog().info(f"意味キャッシュを読み込みました: {self.entries} 件（{self.directory}）")
+                    return vectors
+                apllog().warning(f"意味キャッシュの形が設定と異なるため作り直します: {vectors.shape} → {shape}")
+                del vectors
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                apllog().warning(f"意味キャッシュを読み込めないため作り直します: {e}")
+
+        vectors = np.lib.format.open_memmap(vectors_path, mode='w+', dtype=np.float32, shape=shape)
+        self._save_entries()
+        return vectors
+
+    def _drop_mismatched_rows(self, vectors: np.ndarray) -> None:
+        """ベクトルが entries.json を書き出したときと異なる行を空きにする"""
+        dropped = 0
+        for index, agent in enumerate(self._agents):
+            if agent is not None and zlib.crc32(vectors[index].tobytes()) != self._checksums[index]:
+                vectors[index] = 0
+                self._agents[index] = None
+                self._checksums[index] = 0
+                self._last_used[index] = 0
+                dropped += 1
+        if dropped:
+            apllog().warning(f"意味キャッシュの転送先と一致しない {dropped} 件の行を捨てました")
+
+    @property
+    def entries(self) -> int:
+        return sum(1 for agent in self._agents if agent is not None)
+
+    def _similarities(self, queries: np.ndarray) -> np.ndarray:
+        """(件数, 次元) の質問と使用中の行とのコサイン類似度（行は先頭から順に使うため、使用中の行は先頭の _size 行）"""
+        return queries @ self._vectors[:self._size].T
+
+    def lookup_many(self, texts: list[str]) -> list[Optional[tuple[str, float]]]:
+        """
+        複数の質問に近い質問をまとめて探す
+
+        引数:
+            texts: 質問
+
+        戻り値:
+            質問ごとに、しきい値以上の質問があれば (転送先, 類似度)、なければ None
+        """
+        queries = self.embedder.embed_batch(texts)
+        with self._lock:
+            if self._size == 0:
+                self.stats.misses += len(texts)
+                return [None] * len(texts)
+
+            similarities = self._similarities(queries)
+            best = similarities.argmax(axis=1)
+            results: list[Optional[tuple[str, float]]] = []
+            for row, index in enumerate(best):
+                similarity = float(similarities[row, index])
+                if similarity < self.threshold:
+                    self.stats.misses += 1
+                    results.append(None)
+                    continue
+                self._clock += 1
+                self._last_used[index] = self._clock
+                self.stats.hits += 1
+                results.append((self._agents[index], similarity))
+            return results
+
+    def lookup(self, text: str) -> Optional[tuple[str, float]]:
+        """質問に近い質問があれば (転送先, 類似度) を返す"""
+        return self.lookup_many([text])[0]
+
+    def put(self, text: str, agent: str) -> None:
+        """
+        質問と、トリアージで決まった転送先を登録する
+
+        ほぼ同じ質問が登録済みならその行の転送先を更新し、そうでなければ空きの行か最も長く参照されていない行に書き込む。
+        """
+        query = self.embedder.embed(text)
+        if not query.any():
+            return
+
+        with self._lock:
+            index = None
+            if self._size:
+                similarities = self._similarities(query[np.newaxis, :])[0]
+                nearest = int(similarities.argmax())
+                if similarities[nearest] >= self.threshold:
+                    index = nearest
+            if index is None:
+                if self._size < self.capacity:
+                    index = self._size
+                    self._size += 1
+                else:
+                    index = int(self._last_used.argmin())
+
+            self._vectors[index] = query
+            self._agents[index] = agent
+            self._checksums[index] = zlib.crc32(query.tobytes())
+            self._clock += 1
+            self._last_used[index] = self._clock
+            self._dirty = True
+        self._mark_dirty()
+
+    def _mark_dirty(self) -> None:
+        """書き出しを予約する（設定した間隔がないか、イベントループの外からの登録はすぐに書き出す）"""
+        if self.directory is None:
+            return
+        if self.save_interval <= 0:
+            self.save()
+            return
+        if self._save_task is None or self._save_task.done():
+            try:
+                self._save_task = asyncio.get_running_loop().create_task(self._save_later(), name="semantic-cache-save")
+            except RuntimeError:
+                self.save()
+
+    async def _save_later(self) -> None:
+        """間隔の間に登録された転送先をまとめて書き出す（書き出し中に登録されたものは次の間隔で書き出す）"""
+        while self._dirty:
+            await asyncio.sleep(self.save_interval)
+            await asyncio.to_thread(self.save)
+
+    def _snapshot(self) -> dict:
+        return {
+            'agents'   : list(self._agents),
+            'checksums': list(self._checksums),
+            'last_used': self._last_used.tolist(),
+            'clock'    : self._clock,
+        }
+
+    def _save_entries(self, entries: Optional[dict] = None) -> None:
+        # 書きかけのファイルを読み込まないよう、一時ファイルに書いてから置き換える
+        if entries is None:
+            entries = self._snapshot()
+        entries_path = self.directory / self._ENTRIES_FILE
+        tmp_path = entries_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, entries_path)
+
+    def save(self) -> None:
+        """行列をファイルに書き出してから、最終参照の順序を含めて転送先を保存する"""
+        if self.directory is None:
+            return
+        # ロックは転送先の写しを取る間だけ持ち、書き出し中も検索と登録を止めない
+        with self._lock:
+            self._dirty = False
+            entries = self._snapshot()
+        with self._save_lock:
+            self._vectors.flush()
+            self._save_entries(entries)
+
+    async def close(self) -> None:
+        """待機中の書き出しを取り消し、残りをすべて書き出す"""
+        if self._save_task is not None:
+            self._save_task.cancel()
+            await asyncio.gather(self._save_task, return_exceptions=True)
+            self._save_task = None
+        await asyncio.to_thread(self.save)
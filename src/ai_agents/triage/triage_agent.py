@@ -1,6 +1,6 @@
-from typing import Any
+from typing import Any, Optional
 
-from agents import Agent, OpenAIChatCompletionsModel, RunContextWrapper
+from agents import Agent, Model, ModelSettings, RunContextWrapper, Tool
 
 from src.ai_agents.context import AgentContext
 from src.ai_agents.identity_manager import AgentIdentityManager
@@ -8,10 +8,20 @@ from src.core.prompt_manager import get_prompt
 
 class TriageAgent(Agent[AgentContext]):
 
-    def __init__(self, model: OpenAIChatCompletionsModel, name: str = AgentIdentityManager.Triage.triage_agent):
+    def __init__(
+        self,
+        model   : Model,
+        name    : str = AgentIdentityManager.Triage.triage_agent,
+        handoffs: Optional[list[Agent]] = None,
+        tools   : Optional[list[Tool]] = None
+    ):
         super().__init__(name, model)
         self.name = name
         self.model = model
+        self.handoffs = handoffs or []
+        self.tools = tools or []
+        # 振り分けは決定的に行い、同じ入力の応答を応答キャッシュから返せるようにする
+        self.model_settings = ModelSettings(temperature=0)
         self.instructions = self._set_prompt
 
     @staticmethod
@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar('V')
+
+
+@dataclass
+class CacheStats:
+    """キャッシュのヒット/ミス回数"""
+    hits  : int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': round(self.hit_rate, 4)}
+
+
+class LRUCache(Generic[V]):
+    """
+    スレッドセーフな容量制限付きLRUキャッシュ
+
+    容量を超えた場合は最も長く参照されていないエントリから削除する。
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.stats = CacheStats()
+        self._data: OrderedDict[Hashable, V] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """キーに対応する値を取得（存在しなければNone）"""
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.stats.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: V) -> None:
+        """値を登録し、容量を超えた分を古い順に削除"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        """キーに対応する値を削除して返す"""
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def remove_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """条件に一致するキーのエントリを削除し、削除件数を返す"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,382 @@
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, TypeVar, Union
+
+import openai
+import yaml
+from agents import ModelResponse, ModelSettings, ModelTracing, Tool, TResponseInputItem
+from agents.agent_output import AgentOutputSchemaBase
+from agents.handoffs import Handoff
+from agents.items import TResponseStreamEvent
+from agents.models.interface import Model
+
+from src.core.logger import apllog
+from src.core.metrics import LatencyHistogram, metrics
+from src.core.scheduler import retry_after
+from src.core.settings import DeploymentPoolSettings, Settings
+
+T = TypeVar('T')
+
+# デプロイメント側の問題とみなし、別のデプロイメントで再試行するエラー
+# （それ以外のエラーは入力の誤りなどで、どのデプロイメントでも同じ結果になるためそのまま返す）
+FAILOVER_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+# すべてのデプロイメントが確認のための呼び出しを処理中の場合に、空くまで待つ間隔（秒）
+_PROBE_POLL_SECONDS = 0.05
+
+
+@dataclass
+class Deployment:
+    """論理モデルを提供する1つのデプロイメント"""
+    name       : str
+    endpoint   : str
+    api_key    : str
+    api_version: str
+    # エンドポイント上のデプロイメント名
+    model_name : str
+
+
+def load_deployments(config_path: Union[str, Path]) -> dict[str, list[Deployment]]:
+    """
+    論理モデル名ごとのデプロイメントの一覧をYAMLから読み込む
+
+    api_key は設定ファイルに書かず、api_key_env で環境変数名を指定する。
+    api_key_env / api_version / deployment を省略した場合は AZURE_OPENAI_* と論理モデル名を使う。
+    """
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = (yaml.safe_load(f) or {}).get('deployments', {})
+
+    defaults = Settings().azure_openai
+    pools = {}
+    for model_name, entries in config.items():
+        pools[model_name] = [
+            Deployment(
+                name        = str(entry.get('name', f"{model_name}-{index}")),
+                endpoint    = entry['endpoint'],
+                api_key     = os.getenv(entry['api_key_env'], '') if 'api_key_env' in entry else defaults.api_key,
+                api_version = str(entry.get('api_version', defaults.api_version)),
+                model_name  = entry.get('deployment', model_name)
+            )
+            for index, entry in enumerate(entries)
+        ]
+    apllog().info(
+        f"デプロイメントの一覧を読み込みました: "
+        f"{', '.join(f'{name}（{len(deployments)} 件）' for name, deployments in pools.items())}（{config_path}）"
+    )
+    return pools
+
+
+@lru_cache(maxsize=1)
+def configured_deployments() -> dict[str, list[Deployment]]:
+    """DEPLOYMENT_POOL_FILE に設定されたデプロイメントの一覧（未設定なら空）"""
+    config_file = Settings().deployment_pool.config_file
+    return load_deployments(config_file) if config_file else {}
+
+
+class PoolMember:
+    """プール内の1つのデプロイメントのモデルと、ルーティングに使う状態"""
+
+    def __init__(self, deployment: Deployment, model: Model):
+        self.deployment = deployment
+        self.model = model
+        self.outstanding = 0
+        # 応答までの所要時間の指数移動平均（秒、未計測なら None）
+        self.ewma: Optional[float] = None
+        # ストリーミングで最初のイベントまでの所要時間の指数移動平均（秒、未計測なら None）
+        self.stream_ewma: Optional[float] = None
+        self.consecutive_failures = 0
+        # 連続して外された回数（外す時間を倍にしていく）
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.deployment.name
+
+    def available(self, now: float) -> bool:
+        """外されていないか（再び受け入れた直後は、確認のための呼び出しを1件ずつしか受けない）"""
+        if now < self.ejected_until:
+            return False
+        return not self.ejections or self.outstanding == 0
+
+
+class PooledModel(Model):
+    """
+    1つの論理モデルを複数のデプロイメントに振り分けるモデル
+
+    呼び出しごとに、処理中の呼び出しが最も少ない（または所要時間の指数移動平均が最も小さい）デプロイメントを選ぶ。
+    429 を受けたデプロイメントは Retry-After の間、接続エラーや 5xx が続いたデプロイメントは一定時間外し、別のデプロイメントで再試行する。
+    外したデプロイメントは時間が経てば1件ずつ呼び出しを受け、成功すれば元に戻り、失敗すれば前回の倍の時間外す。
+    ヘッジを有効にすると、所要時間がパーセンタイルを超えた呼び出しを別のデプロイメントにも送り、先に返った応答を使う。
+    """
+
+    def __init__(self, model_name: str, members: list[PoolMember], settings: DeploymentPoolSettings, max_attempts: int):
+        self.model_name = model_name
+        self.members = members
+        self.st = settings
+        self.max_attempts = max(1, max_attempts)
+        # ストリーミングしない呼び出しの所要時間（ヘッジの待ち時間に使う）
+        self.latency = LatencyHistogram()
+        # ストリーミングで最初のイベントまでの所要時間
+        self.stream_latency = LatencyHistogram()
+
+    @classmethod
+    def from_deployments(cls, model_name: str, deployments: list[Deployment]) -> 'PooledModel':
+        """デプロイメントごとにクライアントとスケジューラーを持つモデルを生成する"""
+        from src.core.prompt_cache import UsageRecordingChatCompletionsModel
+        from src.core.scheduler import RequestScheduler, ScheduledModel
+        from src.integration.azure.client import AzureClient
+
+        st = Settings()
+        members = []
+        for deployment in deployments:
+            client = AzureClient.async_openai_client(
+                deployment.endpoint, deployment.api_key, deployment.api_version
+            ).with_options(max_retries=0)
+            # 429 は同じデプロイメントで待たずに別のデプロイメントへ回すため、スケジューラーでは再試行しない
+            scheduler = RequestScheduler.for_deployment(f"{model_name}@{deployment.name}", max_retries=0)
+            model = ScheduledModel(
+                model      = UsageRecordingChatCompletionsModel(model=deployment.model_name, openai_client=client),
+                scheduler  = scheduler,
+                model_name = model_name
+            )
+            members.append(PoolMember(deployment, model))
+
+        apllog().debug(f"{model_name} のデプロイメントのプールを生成しました: {', '.join(d.name for d in deployments)}")
+        return cls(model_name, members, st.deployment_pool, max_attempts=st.scheduler.max_retries + 1)
+
+    def _score(self, member: PoolMember, streamed: bool) -> tuple[float, float]:
+        # 未計測のデプロイメントは 0 として扱い、再び受け入れたデプロイメントにも呼び出しを回す
+        ewma = (member.stream_ewma if streamed else member.ewma) or 0.0
+        if self.st.routing == 'ewma':
+            return (ewma * (member.outstanding + 1), member.outstanding)
+        return (member.outstanding, ewma)
+
+    def _select(
+        self, exclude: frozenset[PoolMember] | set[PoolMember] = frozenset(), streamed: bool = False
+    ) -> Optional[PoolMember]:
+        """外れていないデプロイメントのうち、最もスコアの小さいものを選ぶ（同点なら無作為）"""
+        now = time.monotonic()
+        candidates = [member for member in self.members if member not in exclude and member.available(now)]
+        if not candidates:
+            return None
+        best = min(self._score(member, streamed) for member in candidates)
+        return random.choice([member for member in candidates if self._score(member, streamed) == best])
+
+    async def _choose(self, tried: set[PoolMember], streamed: bool = False) -> PoolMember:
+        """
+        まだ試していないデプロイメントを優先して選ぶ
+
+        すべて外れている場合は、最も早く戻るデプロイメントの時刻まで待つ。
+        戻ったデプロイメントが確認のための呼び出しを処理中の場合は、その呼び出しが終わるまで待って選び直す。
+        """
+        warned = False
+        while True:
+            member = self._select(tried, streamed) or self._select(streamed=streamed)
+            if member is not None:
+                return member
+
+            now = time.monotonic()
+            probing = any(m.ejected_until <= now for m in self.members)
+            wait = _PROBE_POLL_SECONDS if probing else min(m.ejected_until for m in self.members) - now
+            if not warned:
+                apllog().warning(f"{self.model_name} のデプロイメントがすべて外れているため、{wait:.2f}秒待ちます")
+                warned = True
+            await asyncio.sleep(wait)
+
+    def _record_success(self, member: PoolMember, seconds: float, streamed: bool = False) -> None:
+        """
+        成功した呼び出しの所要時間を記録する
+
+        ストリーミングでは最初のイベントまでの所要時間を受け取るため、応答全体の所要時間とは別に記録する
+        （混ぜるとヘッジの待ち時間が短くなり、ストリーミングしない呼び出しのほとんどをヘッジしてしまう）。
+        """
+        alpha = self.st.ewma_alpha
+        if streamed:
+            member.stream_ewma = seconds if member.stream_ewma is None else alpha * seconds + (1 - alpha) * member.stream_ewma
+            self.stream_latency.observe(seconds)
+            metrics.observe('deployment_first_event', seconds, model=self.model_name, deployment=member.name)
+        else:
+            member.ewma = seconds if member.ewma is None else alpha * seconds + (1 - alpha) * member.ewma
+            self.latency.observe(seconds)
+            metrics.observe('deployment_call', seconds, model=self.model_name, deployment=member.name)
+        if member.ejections:
+            apllog().info(f"デプロイメント {member.name} を再び受け入れました")
+        member.consecutive_failures = 0
+        member.ejections = 0
+
+    def _record_failure(self, member: PoolMember, error: Exception) -> None:
+        now = time.monotonic()
+        labels = {'model': self.model_name, 'deployment': member.name}
+        if isinstance(error, openai.RateLimitError):
+            # スロットリングは障害ではないため、Retry-After の間だけ外す
+            delay = retry_after(error)
+            member.ejected_until = max(member.ejected_until, now + (delay if delay is not None else self.st.eject_seconds))
+            metrics.increment('deployment_throttled', 1, **labels)
+            return
+
+        if now < member.ejected_until:
+            # 外す前に送っていた呼び出しの失敗は数えない
+            return
+        member.consecutive_failures += 1
+        # 再び受け入れた直後のデプロイメントは1回の失敗で外す
+        if member.consecutive_failures < self.st.eject_failures and not member.ejections:
+            return
+        duration = min(self.st.max_eject_seconds, self.st.eject_seconds * (2 ** member.ejections))
+        member.ejections += 1
+        member.consecutive_failures = 0
+        member.ejected_until = now + duration
+        metrics.increment('deployment_ejections', 1, **labels)
+        apllog().warning(
+            f"デプロイメント {member.name} を {duration:.0f}秒間外します（{type(error).__name__}: {error}）"
+        )
+
+    async def _call(self, member: PoolMember, call: Callable[[Model], Awaitable[T]]) -> T:
+        member.outstanding += 1
+        started = time.perf_counter()
+        try:
+            result = await call(member.model)
+        except FAILOVER_ERRORS as e:
+            self._record_failure(member, e)
+            raise
+        finally:
+            member.outstanding -= 1
+        self._record_success(member, time.perf_counter() - started)
+        return result
+
+    def _hedge_delay(self) -> Optional[float]:
+        """ヘッジを送るまでの待ち時間（ヘッジしない場合は None）"""
+        if self.st.hedge_percentile <= 0 or len(self.members) < 2 or self.latency.count < self.st.hedge_min_samples:
+            return None
+        return max(self.st.hedge_min_delay, self.latency.percentile(self.st.hedge_percentile))
+
+    async def _call_hedged(self, primary: PoolMember, call: Callable[[Model], Awaitable[T]]) -> T:
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._call(primary, call)
+
+        tasks = [asyncio.ensure_future(self._call(primary, call))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            backup = None if done else self._select({primary})
+            if backup is not None:
+                metrics.increment('hedged_requests', 1, model=self.model_name)
+                tasks.append(asyncio.ensure_future(self._call(backup, call)))
+
+            # 先に成功した応答を使い、両方失敗した場合は後に失敗したほうのエラーを返す
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            metrics.increment('hedge_wins', 1, model=self.model_name)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _run(self, call: Callable[[Model], Awaitable[T]]) -> T:
+        """デプロイメントを選んで呼び出し、デプロイメント側のエラーは別のデプロイメントで再試行する"""
+        tried: set[PoolMember] = set()
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_attempts):
+            member = await self._choose(tried)
+            tried.add(member)
+            try:
+                return await self._call_hedged(member, call)
+            except FAILOVER_ERRORS as e:
+                last_error = e
+                apllog().warning(
+                    f"{self.model_name} のデプロイメント {member.name} の呼び出しに失敗しました（{type(e).__name__}）。"
+                    f"別のデプロイメントで再試行します（{attempt + 1}/{self.max_attempts}）"
+                )
+        raise last_error
+
+    async def get_response(
+        self,
+        system_instructions: Optional[str],
+        input              : str | list[TResponseInputItem],
+        model_settings     : ModelSettings,
+        tools              : list[Tool],
+        output_schema      : Optional[AgentOutputSchemaBase],
+        handoffs           : list[Handoff],
+        tracing            : ModelTracing,
+        *,
+        previous_response_id: Optional[str] = None
+    ) -> ModelResponse:
+        return await self._run(
+            lambda model: model.get_response(
+                system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+                previous_response_id = previous_response_id
+            )
+        )
+
+    async def stream_response(
+        self,
+        system_instructions: Optional[str],
+        input              : str | list[TResponseInputItem],
+        model_settings     : ModelSettings,
+        tools              : list[Tool],
+        output_schema      : Optional[AgentOutputSchemaBase],
+        handoffs           : list[Handoff],
+        tracing            : ModelTracing,
+        *,
+        previous_response_id: Optional[str] = None
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        # イベントを返し始めた後は別のデプロイメントに切り替えられないため、最初のイベントまでのエラーのみ再試行する
+        # （ヘッジも行わず、最初のイベントまでの所要時間をストリーミングのルーティングに使う）
+        tried: set[PoolMember] = set()
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_attempts):
+            member = await self._choose(tried, streamed=True)
+            tried.add(member)
+            member.outstanding += 1
+            started = time.perf_counter()
+            first_event = True
+            try:
+                async for event in member.model.stream_response(
+                    system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+                    previous_response_id = previous_response_id
+                ):
+                    if first_event:
+                        self._record_success(member, time.perf_counter() - started, streamed=True)
+                        first_event = False
+                    yield event
+                return
+            except FAILOVER_ERRORS as e:
+                self._record_failure(member, e)
+                if not first_event:
+                    raise
+                last_error = e
+                apllog().warning(
+                    f"{self.model_name} のデプロイメント {member.name} の呼び出しに失敗しました（{type(e).__name__}）。"
+                    f"別のデプロイメントで再試行します（{attempt + 1}/{self.max_attempts}）"
+                )
+            finally:
+                member.outstanding -= 1
+        raise last_error
+
+    def stats(self) -> list[dict[str, Any]]:
+        """デプロイメントごとのルーティングの状態"""
+        now = time.monotonic()
+        return [
+            {
+                'deployment' : member.name,
+                'outstanding': member.outstanding,
+                'ewma'       : member.ewma,
+                'stream_ewma': member.stream_ewma,
+                'available'  : member.available(now),
+                'ejections'  : member.ejections,
+            }
+            for member in self.members
+        ]
@@ -1,12 +1,55 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
+from typing import Optional
+
+from src.core.settings import Settings
 
 class LoggerPreparationError(Exception):
     """ロガーが未初期化時のエラー"""
 
+class JsonFormatter(logging.Formatter):
+    """1行1JSONの構造化ログのフォーマッター"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time'   : datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level'  : record.levelname,
+            'file'   : record.filename,
+            'line'   : record.lineno,
+            'thread' : record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """
+    呼び出し元のスレッドではメッセージの組み立てのみ行い、書式化と書き込みは書き込みスレッドに任せるハンドラー
+
+    標準の QueueHandler はプロセス間のキューを想定して呼び出し元で書式化まで行うが、
+    ここでは同一プロセス内のキューのため、レコードをそのまま渡す。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 引数は後から変更される可能性があるため、メッセージだけはここで確定させる
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
 class LoggerHolder:
 
     _apl = logging.getLogger('applogger')
     _apl_inited: bool = False
+    _apl_filename: Optional[str] = None
+    _listener: Optional[logging.handlers.QueueListener] = None
 
     def __new__(cls, *args, **kwargs):
         if not hasattr(cls, '_instance'):
@@ -14,21 +57,63 @@ class LoggerHolder:
         return cls._instance
 
     def init_app_logger(self, filename: str):
+        """
+        ロガーを初期化する（2回目以降の呼び出しは何もしない）
 
-        self._apl.setLevel(logging.DEBUG)
-        _apl_format = logging.Formatter(fmt='%(asctime)s, %(filename)s:%(lineno)d, %(levelname)s, %(message)s')
+        ログはキューに積むだけで返り、コンソールとローテーションするファイルへの書き込みは
+        バックグラウンドの書き込みスレッドで行う。
+
+        引数:
+            filename: ログファイルのパス
+        """
+        if LoggerHolder._apl_inited:
+            if filename != LoggerHolder._apl_filename:
+                self._apl.warning(f"ロガーは初期化済みのため、{filename} は使用しません（出力先: {LoggerHolder._apl_filename}）")
+            return
+
+        st = Settings().logging
+        self._apl.setLevel(st.level.upper())
+        # 親ロガーに伝播させず、このロガーのハンドラーのみで出力する
+        self._apl.propagate = False
+
+        if st.format == 'json':
+            _apl_format = JsonFormatter()
+        else:
+            _apl_format = logging.Formatter(fmt='%(asctime)s, %(filename)s:%(lineno)d, %(levelname)s, %(message)s')
 
         _stream_handler = logging.StreamHandler()
         _stream_handler.setFormatter(_apl_format)
-        self._apl.addHandler(_stream_handler)
 
-        _file_handler = logging.FileHandler(filename)
+        log_dir = os.path.dirname(filename)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        _file_handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=st.max_bytes, backupCount=st.backup_count, encoding='utf-8'
+        )
         _file_handler.setFormatter(_apl_format)
-        self._apl.addHandler(_file_handler)
 
-        self._apl_inited = True
+        # 呼び出し元をブロックしないよう上限のないキューを使う
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        LoggerHolder._listener = logging.handlers.QueueListener(
+            log_queue, _stream_handler, _file_handler, respect_handler_level=True
+        )
+        LoggerHolder._listener.start()
+        self._apl.addHandler(_EnqueueHandler(log_queue))
+        atexit.register(self.shutdown_app_logger)
+
+        LoggerHolder._apl_inited = True
+        LoggerHolder._apl_filename = filename
         self.get_apl_logger().info('apl logger inited.')
 
+    def shutdown_app_logger(self):
+        """キューに残ったログを書き出し、書き込みスレッドを停止する"""
+        listener, LoggerHolder._listener = LoggerHolder._listener, None
+        if listener is None:
+            return
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
     def get_apl_logger(self):
         return self._apl
 
@@ -37,4 +122,7 @@ def apllog():
     return LoggerHolder().get_apl_logger()
 
 def init_apl_logger(filename: str):
-    LoggerHolder().init_app_logger(filename)
\ No newline at end of file
+    LoggerHolder().init_app_logger(filename)
+
+def shutdown_apl_logger():
+    LoggerHolder().shutdown_app_logger()
\ No newline at end of file
@@ -0,0 +1,211 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterator, Optional, Union
+
+from src.core.settings import Settings
+
+# 秒単位のバケット境界（プロンプトのレンダリングのようなµs単位の処理からモデル呼び出しまでを1-2.5-5刻みで分割）
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005,
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0
+)
+
+class AgentLabel:
+    """
+    実行中のエージェント名（モデル呼び出しのスパンにラベルとして付ける）
+
+    Runner はフックを子タスクで実行するため、コンテキスト変数自体ではなく共有するこのオブジェクトを書き換える。
+    """
+    __slots__ = ('name',)
+
+    def __init__(self, name: str = ''):
+        self.name = name
+
+current_agent: ContextVar[Optional[AgentLabel]] = ContextVar('current_agent', default=None)
+
+def current_agent_name() -> str:
+    label = current_agent.get()
+    return label.name if label is not None else ''
+
+class LatencyHistogram:
+    """
+    固定バケットのレイテンシーのヒストグラム
+
+    観測値はバケットの件数として保持するため、観測数によらずメモリと記録のコストは一定。
+    パーセンタイルはバケット内の線形補間で推定する。
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """q（0〜1）パーセンタイルの推定値（秒）"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - cumulative) / bucket_count, self.max)
+            cumulative += bucket_count
+        return self.max
+
+    def summary(self) -> dict[str, float]:
+        return {
+            'count': self.count,
+            'mean' : self.sum / self.count if self.count else 0.0,
+            'p50'  : self.percentile(0.50),
+            'p95'  : self.percentile(0.95),
+            'p99'  : self.percentile(0.99),
+            'max'  : self.max,
+        }
+
+class MetricsRegistry:
+    """
+    スパン名とラベルごとのレイテンシーのヒストグラムと、トークン数などの累積カウンターを保持するレジストリー
+
+    外部のトレースサービスは使わず、集計結果をJSONファイルまたはPrometheus形式のテキストで出力する。
+    """
+
+    def __init__(self, namespace: str = 'agent', enabled: bool = True):
+        self.namespace = namespace
+        self.enabled = enabled
+        self._histograms: dict[tuple[str, tuple[tuple[str, str], ...]], LatencyHistogram] = {}
+        self._counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        """
+        スパンの所要時間を記録する
+
+        引数:
+            name: スパン名（例: model_call）
+            seconds: 所要時間（秒）
+            **labels: エージェント名やモデル名などのラベル
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())) if len(labels) > 1 else tuple(labels.items()))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, name: str, **labels: str) -> Iterator[None]:
+        """ブロックの所要時間を記録する（例外で抜けた場合も記録する）"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        """カウンターに加算する"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def counter(self, name: str, **labels: str) -> float:
+        """カウンターの値（ラベルを省略した場合は、指定したラベルに一致するすべての値の合計）"""
+        with self._lock:
+            return sum(
+                value for (counter_name, counter_labels), value in self._counters.items()
+                if counter_name == name and labels.items() <= dict(counter_labels).items()
+            )
+
+    def get(self, name: str, **labels: str) -> Optional[LatencyHistogram]:
+        return self._histograms.get((name, tuple(sorted(labels.items()))))
+
+    def summary(self) -> list[dict[str, Any]]:
+        """スパンとラベルごとの件数と p50/p95/p99（秒）"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            return [{'name': name, 'labels': dict(labels), **histogram.summary()} for (name, labels), histogram in items]
+
+    def counters(self) -> list[dict[str, Any]]:
+        """カウンターとラベルごとの値"""
+        with self._lock:
+            return [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in sorted(self._counters.items())]
+
+    def to_prometheus(self) -> str:
+        """Prometheus のテキスト形式で出力する"""
+        lines: list[str] = []
+        with self._lock:
+            items = sorted(self._histograms.items())
+            described: set[str] = set()
+            for (name, labels), histogram in items:
+                metric = f"{self.namespace}_{name}_seconds"
+                if metric not in described:
+                    lines.append(f"# TYPE {metric} histogram")
+                    described.add(metric)
+                label_text = ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels)
+                prefix = f"{label_text}," if label_text else ''
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+                suffix = f"{{{label_text}}}" if label_text else ''
+                lines.append(f"{metric}_sum{suffix} {histogram.sum:.6f}")
+                lines.append(f"{metric}_count{suffix} {histogram.count}")
+
+            described.clear()
+            for (name, labels), total in sorted(self._counters.items()):
+                metric = f"{self.namespace}_{name}_total"
+                if metric not in described:
+                    lines.append(f"# TYPE {metric} counter")
+                    described.add(metric)
+                label_text = ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels)
+                lines.append(f"{metric}{{{label_text}}} {total:g}" if label_text else f"{metric} {total:g}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: Union[str, Path]) -> Path:
+        """集計結果をファイルに書き出す（拡張子が .prom の場合はPrometheus形式、それ以外はJSON）"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix == '.prom':
+            content = self.to_prometheus()
+        else:
+            content = json.dumps({'spans': self.summary(), 'counters': self.counters()}, ensure_ascii=False, indent=2)
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        tmp_path.write_text(content, encoding='utf-8')
+        os.replace(tmp_path, path)
+        return path
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# シングルトンインスタンス
+metrics = MetricsRegistry(enabled=Settings().metrics.enabled)
@@ -1,57 +1,100 @@
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-from dataclasses import dataclass
-from agents import OpenAIChatCompletionsModel
+from dataclasses import dataclass, field
 
-from src.integration.azure.client import AzureClient
+from src.core.settings import Settings
+
+# agents / openai / httpx は読み込みが重いため、モデルを生成するときに初めて読み込む
+if TYPE_CHECKING:
+    from agents.models.interface import Model
 
 @dataclass
 class ModelConfiguration:
-    model_name: str
-    # TODO: max_tokenとかはここにいれる？
+    model_name           : str
+    # 会話履歴としてモデルに渡す最大トークン数
+    history_token_budget : int = 16000
+    # 上限を超えたときにウィンドウをこの割合まで縮める（一度にまとめて外し、以降のターンの先頭部分を固定してプロンプトキャッシュを効かせる）
+    history_trim_ratio   : float = 0.75
+    # ウィンドウ外に出た会話をバックグラウンドで要約するか（HISTORY_SUMMARIZATION）
+    history_summarization: bool = field(default_factory=lambda: Settings().history.summarization)
+    # temperature=0 の呼び出しの応答をキャッシュするか（RESPONSE_CACHE_ENABLED）
+    response_cache       : bool = field(default_factory=lambda: Settings().response_cache.enabled)
 
     @classmethod
     def default(cls) -> 'ModelConfiguration':
         return cls(model_name='gpt-4o-mini')
+
+    @classmethod
+    def summary(cls) -> 'ModelConfiguration':
+        """会話履歴の要約に使う安価なモデルの設定"""
+        return cls(model_name='gpt-4o-mini')
     
 
 class ModelFactory:
 
-    _model_cache: dict[str, OpenAIChatCompletionsModel] = {}
+    _model_cache: dict[tuple[str, bool], 'Model'] = {}
 
 
     @classmethod
     def create_openai_model(
         cls,
-        model_name: str,
-        use_cache : bool = True
-    ) -> OpenAIChatCompletionsModel:
-        """OpenAIモデルを生成する"""
+        model_name    : str,
+        use_cache     : bool = True,
+        response_cache: bool = False
+    ) -> 'Model':
+        """OpenAIモデルを生成する（呼び出しはデプロイメントごとのスケジューラーを経由する）"""
 
         # キャッシュを使用し、キャッシュに存在する場合はそれを返す
-        if model_name in cls._model_cache:
-            return cls._model_cache[model_name]
-        
-        azure_client = AzureClient.async_openai_client()
-        model = OpenAIChatCompletionsModel(
-            model         = model_name,
-            openai_client = azure_client
-        )
+        cache_key = (model_name, response_cache)
+        if cache_key in cls._model_cache:
+            return cls._model_cache[cache_key]
+
+        from src.core.deployment_pool import PooledModel, configured_deployments
+        from src.core.prompt_cache import UsageRecordingChatCompletionsModel
+        from src.core.response_cache import CachedModel
+        from src.core.scheduler import RequestScheduler, ScheduledModel
+        from src.integration.azure.client import AzureClient
+
+        deployments = configured_deployments().get(model_name)
+        if deployments:
+            # 複数のデプロイメントが設定されたモデルは、呼び出しごとにデプロイメントを選ぶ
+            model = PooledModel.from_deployments(model_name, deployments)
+        else:
+            # 再試行はスケジューラーが429のRetry-Afterを見て行うため、クライアント側の再試行は無効にする
+            azure_client = AzureClient.async_openai_client().with_options(max_retries=0)
+            model = ScheduledModel(
+                model      = UsageRecordingChatCompletionsModel(
+                    model         = model_name,
+                    openai_client = azure_client
+                ),
+                scheduler  = RequestScheduler.for_deployment(model_name),
+                model_name = model_name
+            )
+
+        # 応答キャッシュはスケジューラーの外側に置き、ヒット時はレート制限の枠も消費しない
+        if response_cache:
+            model = CachedModel(model, model_name)
 
         if use_cache:
-            cls._model_cache[model_name] = model
+            cls._model_cache[cache_key] = model
 
         return model
     
     @classmethod
-    def create_from_config(cls, config: ModelConfiguration, use_cache: bool = True) -> OpenAIChatCompletionsModel:
+    def create_from_config(cls, config: ModelConfiguration, use_cache: bool = True) -> 'Model':
         """モデルを生成する"""
         return cls.create_openai_model(
-            model_name = config.model_name,
-            use_cache  = use_cache
+            model_name     = config.model_name,
+            use_cache      = use_cache,
+            response_cache = config.response_cache
         )
     
     @classmethod
-    def get_default_model(cls) -> OpenAIChatCompletionsModel:
+    def get_default_model(cls) -> 'Model':
         """デフォルトのモデルを取得する"""
-        return cls.create_from_config(config = ModelConfiguration.default())
\ No newline at end of file
+        return cls.create_from_config(config = ModelConfiguration.default())
+
+    @classmethod
+    def get_summary_model(cls) -> 'Model':
+        """会話履歴の要約用のモデルを取得する"""
+        return cls.create_from_config(config = ModelConfiguration.summary())
\ No newline at end of file
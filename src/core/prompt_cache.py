@@ -0,0 +1,69 @@
+import dataclasses
+from typing import Any, AsyncIterator, Optional
+
+from agents import ModelSettings, ModelTracing, OpenAIChatCompletionsModel, Tool, TResponseInputItem
+from agents.agent_output import AgentOutputSchemaBase
+from agents.handoffs import Handoff
+from agents.items import TResponseStreamEvent
+from openai.types.chat import ChatCompletion
+
+from src.core.metrics import metrics
+
+
+def record_prompt_usage(model_name: str, input_tokens: int, cached_tokens: int) -> None:
+    """応答の入力トークン数と、そのうちプロバイダーのプロンプトキャッシュから読まれたトークン数を記録する"""
+    metrics.increment('model_requests', 1, model=model_name)
+    metrics.increment('input_tokens', input_tokens, model=model_name)
+    metrics.increment('cached_input_tokens', cached_tokens, model=model_name)
+
+
+def cached_token_ratio(model_name: Optional[str] = None) -> float:
+    """入力トークンのうちプロンプトキャッシュから読まれた割合（モデル名を省略した場合は全モデルの合計）"""
+    labels = {'model': model_name} if model_name else {}
+    input_tokens = metrics.counter('input_tokens', **labels)
+    if not input_tokens:
+        return 0.0
+    return metrics.counter('cached_input_tokens', **labels) / input_tokens
+
+
+class UsageRecordingChatCompletionsModel(OpenAIChatCompletionsModel):
+    """
+    応答の usage からキャッシュされた入力トークン数を記録する chat completions モデル
+
+    agents の Usage には cached_tokens が含まれないため、変換前の応答から読み取る。
+    ストリーミングでは usage を含めるよう要求し、最後のイベントから読み取る。
+    """
+
+    async def _fetch_response(self, *args: Any, **kwargs: Any):
+        response = await super()._fetch_response(*args, **kwargs)
+        if isinstance(response, ChatCompletion) and response.usage is not None:
+            details = response.usage.prompt_tokens_details
+            record_prompt_usage(
+                str(self.model), response.usage.prompt_tokens, (details.cached_tokens or 0) if details else 0
+            )
+        return response
+
+    async def stream_response(
+        self,
+        system_instructions: Optional[str],
+        input              : str | list[TResponseInputItem],
+        model_settings     : ModelSettings,
+        tools              : list[Tool],
+        output_schema      : Optional[AgentOutputSchemaBase],
+        handoffs           : list[Handoff],
+        tracing            : ModelTracing,
+        *,
+        previous_response_id: Optional[str] = None
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        # Azure OpenAI では既定でストリームに usage が含まれないため明示的に要求する
+        if model_settings.include_usage is None:
+            model_settings = dataclasses.replace(model_settings, include_usage=True)
+
+        async for event in super().stream_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+            previous_response_id = previous_response_id
+        ):
+            if event.type == "response.completed" and event.response.usage is not None:
+                usage = event.response.usage
+                record_prompt_usage(str(self.model), usage.input_tokens, usage.input_tokens_details.cached_tokens or 0)
+            yield event
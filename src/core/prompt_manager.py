@@ -1,12 +1,70 @@
+import hashlib
+import json
+import marshal
 import os
 import re
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 import yaml
-from jinja2 import Template
+from jinja2 import BaseLoader, Environment, FileSystemBytecodeCache, Template, TemplateNotFound, meta
 
+from src.core.cache import CacheStats, LRUCache
 from src.core.logger import apllog
+from src.core.metrics import metrics
+
+# プリコンパイル済みプロンプトバンドルの既定ファイル名と形式バージョン
+DEFAULT_BUNDLE_NAME = ".prompt_bundle.marshal"
+BUNDLE_FORMAT_VERSION = 1
+
+# 利用可能であればlibyamlによる高速なローダーを使用
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# 入力の末尾に置く、毎ターン変わる情報の見出し
+VOLATILE_CONTEXT_HEADER = "# 現在の状況"
+
+# 単純スタイル {var} を Jinja2 スタイル {{ var }} に変換するための正規表現
+_SIMPLE_VAR_PATTERN = re.compile(r'(?<!\{)\{([^{}]+)\}(?!\})')
+
+def _is_json_value(value: Any) -> bool:
+    """JSONに変換しても他の値と区別できる値か（タプルやstr以外のキー、日付などはFalse）"""
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return True
+    if isinstance(value, list):
+        return all(_is_json_value(item) for item in value)
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and _is_json_value(item) for key, item in value.items())
+    return False
+
+class TemplateAmbiguityError(Exception):
+    """テンプレート名が複数のテンプレートファイルに一致する場合のエラー"""
+
+@dataclass
+class _CompiledPrompt:
+    """コンパイル済みテンプレートとレンダリング用の固定コンテキスト"""
+    # レンダリングキャッシュのキー（YAMLのフィールドをハッシュにできない場合は None でキャッシュしない）
+    fingerprint         : Optional[str]
+    template            : Template
+    static_context      : Dict[str, Any]
+    referenced_variables: frozenset
+    is_static           : bool
+    rendered            : Optional[str] = None
+
+
+class _ConvertedSourceLoader(BaseLoader):
+    """ブレース変換済みのテンプレートソースをJinja2環境に渡すローダー"""
+
+    def __init__(self):
+        self.sources: Dict[str, str] = {}
+
+    def get_source(self, environment: Environment, template: str) -> Tuple[str, Optional[str], Any]:
+        if template not in self.sources:
+            raise TemplateNotFound(template)
+        return self.sources[template], None, lambda: True
+
 
 class PromptManager:
     """
@@ -19,12 +77,27 @@ class PromptManager:
     # 初期化フラグ
     _is_initialized = False
     
-    def initialize(self, prompt_dir: Union[str, Path]) -> None:
+    def initialize(
+        self,
+        prompt_dir        : Union[str, Path],
+        bytecode_cache_dir: Optional[Union[str, Path]] = None,
+        render_cache_size : int = 0,
+        auto_reload       : bool = False,
+        reload_interval   : float = 1.0,
+        bundle_path       : Optional[Union[str, Path]] = None,
+        use_bundle        : bool = True
+    ) -> None:
         """
         プロンプトマネージャーを初期化
         
         引数:
             prompt_dir: プロンプトテンプレートのディレクトリパス
+            bytecode_cache_dir: Jinja2バイトコードキャッシュの保存先（省略時はシステムの一時ディレクトリ）
+            render_cache_size: 変数付きレンダリング結果を保持するLRUの最大件数（0で無効）
+            auto_reload: Trueの場合、YAMLファイルの変更を監視して該当キャッシュを破棄する
+            reload_interval: 変更監視のポーリング間隔（秒）
+            bundle_path: プリコンパイル済みバンドルのパス（省略時はプロンプトディレクトリ直下の既定ファイル）
+            use_bundle: Falseの場合、バンドルがあっても使用せずYAMLから読み込む
         """
         if self._is_initialized:
             apllog().warning("プロンプトマネージャーは既に初期化されています")
@@ -32,8 +105,48 @@ class PromptManager:
             
         self.prompt_dir = Path(prompt_dir)
         self.templates_cache: Dict[str, Dict[str, Any]] = {}
+
+        # キャッシュの構築と破棄を直列化するロック（レンダリング自体はロック外で行う）
+        self._lock = threading.RLock()
+
+        # _extends による継承関係（子 -> 親、親 -> 子）
+        self._template_parent: Dict[str, str] = {}
+        self._template_children: Dict[str, Set[str]] = {}
+
+        # ホットリロード用のファイル更新時刻と監視スレッド
+        self._file_mtimes: Dict[str, int] = {}
+        self._reload_thread: Optional[threading.Thread] = None
+        self._reload_stop = threading.Event()
+
+        # コンパイル済みテンプレートのキャッシュ
+        # テンプレート名とソースのフィンガープリントをキーにし、内容が同じなら再コンパイルしない
+        self._compiled_cache: Dict[Tuple[str, str], Template] = {}
+        self._compiled_by_name: Dict[str, _CompiledPrompt] = {}
+
+        # レンダリング結果のキャッシュ
+        # 呼び出し側の変数に依存しないレンダリングはテンプレートごとに1件、変数付きはLRUで保持
+        self._static_render_stats = CacheStats()
+        self._render_cache: LRUCache[str] = LRUCache(render_cache_size)
+        self._source_loader = _ConvertedSourceLoader()
+        self._jinja_env = Environment(
+            loader         = self._source_loader,
+            bytecode_cache = FileSystemBytecodeCache(str(bytecode_cache_dir) if bytecode_cache_dir else None),
+            cache_size     = 0,
+            auto_reload    = False
+        )
+
+        self._build_template_index()
         self._is_initialized = True
+
+        # バンドルが最新であれば解決済みテンプレートを読み込み、YAMLの解析を省略する
+        bundle_path = Path(bundle_path) if bundle_path else self.prompt_dir / DEFAULT_BUNDLE_NAME
+        if use_bundle and bundle_path.exists():
+            self._load_bundle(bundle_path)
+
         apllog().info(f"プロンプトマネージャーを初期化しました: {self.prompt_dir}")
+
+        if auto_reload:
+            self.start_auto_reload(reload_interval)
         
     def _check_initialized(self) -> None:
         """初期化されているか確認し、されていなければ例外を発生"""
@@ -41,9 +154,87 @@ class PromptManager:
             apllog().error("プロンプトマネージャーが初期化されていません。initialize()を先に呼び出してください")
             raise RuntimeError("PromptManager not initialized. Call initialize() first")
         
+    def _build_template_index(self) -> None:
+        """
+        プロンプトディレクトリを一度だけ走査し、テンプレート名からファイルパスへのインデックスを構築
+
+        "triage/triage_agent" のような相対パス形式と "triage_agent" のような
+        ファイル名のみの形式の両方を登録する。ファイル名のみの形式が複数のファイルに
+        一致する場合は曖昧な名前として記録し、参照時にエラーとする。
+        """
+        path_index: Dict[str, Path] = {}
+        file_mtimes: Dict[str, int] = {}
+
+        for root, _, files in os.walk(self.prompt_dir):
+            for file in sorted(files):
+                if not file.endswith('.yaml'):
+                    continue
+                path = Path(root) / file
+                canonical_name = path.relative_to(self.prompt_dir).with_suffix('').as_posix()
+                path_index[canonical_name] = path
+                file_mtimes[canonical_name] = path.stat().st_mtime_ns
+
+        self._set_template_index(path_index)
+        self._file_mtimes = file_mtimes
+
+    def _set_template_index(self, path_index: Dict[str, Path]) -> None:
+        """正規名とファイルパスの対応からテンプレート名のインデックスを設定"""
+        bare_candidates: Dict[str, List[str]] = {}
+        for canonical_name, path in path_index.items():
+            bare_candidates.setdefault(path.stem, []).append(canonical_name)
+
+        # 相対パス形式を正規名とし、ファイル名のみの形式は一意な場合だけ正規名へ対応付ける
+        name_index: Dict[str, str] = {name: name for name in path_index}
+        ambiguous_names: Dict[str, List[str]] = {}
+        for bare_name, candidates in bare_candidates.items():
+            if bare_name in path_index:
+                continue
+            if len(candidates) == 1:
+                name_index[bare_name] = candidates[0]
+            else:
+                ambiguous_names[bare_name] = sorted(candidates)
+
+        # レンダリング中のスレッドから参照されるため、構築後にまとめて差し替える
+        self._name_index = name_index
+        self._ambiguous_names = ambiguous_names
+        self._path_index = path_index
+        apllog().debug(f"テンプレートインデックスを構築しました: {len(path_index)} ファイル")
+        for bare_name, candidates in ambiguous_names.items():
+            apllog().warning(f"テンプレート名 '{bare_name}' は複数のファイルに一致します: {candidates}")
+
+    def _resolve_template_name(self, template_name: str) -> Optional[str]:
+        """
+        テンプレート名を正規名（プロンプトディレクトリからの相対パス形式）に解決
+
+        引数:
+            template_name: 解決するテンプレート名
+
+        戻り値:
+            正規名、見つからなかった場合はNone
+        """
+        self._check_initialized()
+
+        name = template_name.replace("\\", "/")
+        if name.endswith(".yaml"):
+            name = name[:-len(".yaml")]
+
+        canonical_name = self._name_index.get(name)
+        if canonical_name is not None:
+            return canonical_name
+
+        if name in self._ambiguous_names:
+            candidates = self._ambiguous_names[name]
+            apllog().error(f"テンプレート名 '{template_name}' は曖昧です。候補: {candidates}")
+            raise TemplateAmbiguityError(
+                f"Template name '{template_name}' is ambiguous. Use one of: {', '.join(candidates)}"
+            )
+
+        apllog().warning(f"テンプレートファイル '{template_name}' が見つかりません")
+        return None
+
     def _find_template_file(self, template_name: str) -> Optional[Path]:
         """
-        サブディレクトリを検索してテンプレートファイルを検索
+        インデックスからテンプレートファイルを検索
         
         引数:
             template_name: 検索するテンプレート名
@@ -51,29 +242,10 @@ class PromptManager:
         戻り値:
             見つかった場合はテンプレートファイルのPath、見つからなかった場合はNone
         """
-        self._check_initialized()
-        
-        # まず直接テンプレート名を試す（完全なパスの可能性）
-        if "/" in template_name or "\\" in template_name:
-            path = self.prompt_dir / f"{template_name}.yaml"
-            if path.exists() and path.is_file():
-                return path
-        
-        # すべてのサブディレクトリを検索
-        for root, _, files in os.walk(self.prompt_dir):
-            for file in files:
-                if file == f"{template_name}.yaml":
-                    return Path(root) / file
-                
-                # "triage/triage_agent"のようなパスを処理
-                path_parts = template_name.split("/")
-                if len(path_parts) > 1 and file == f"{path_parts[-1]}.yaml":
-                    rel_path = Path(root).relative_to(self.prompt_dir)
-                    if str(rel_path) == "/".join(path_parts[:-1]):
-                        return Path(root) / file
-                    
-        apllog().warning(f"テンプレートファイル '{template_name}' が見つかりません")
-        return None
+        canonical_name = self._resolve_template_name(template_name)
+        if canonical_name is None:
+            return None
+        return self._path_index[canonical_name]
     
     # 残りのメソッドはほぼ同じですが、必要に応じて_check_initialized()を追加
     
@@ -81,7 +253,7 @@ class PromptManager:
         """YAMLファイルを辞書に読み込み"""
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+                return yaml.load(f, Loader=_YAML_LOADER)
         except Exception as e:
             apllog().error(f"YAMLファイル {file_path} の読み込みエラー: {e}")
             return {}
@@ -96,24 +268,31 @@ class PromptManager:
         戻り値:
             解決されたテンプレートデータを含む辞書
         """
-        self._check_initialized()
-        
-        # キャッシュから利用可能な場合は返す
-        if template_name in self.templates_cache:
-            return self.templates_cache[template_name]
-        
-        template_path = self._find_template_file(template_name)
-        if not template_path:
+        canonical_name = self._resolve_template_name(template_name)
+        if canonical_name is None:
             apllog().error(f"テンプレート '{template_name}' が見つかりません")
             return {}
-        
+
+        # キャッシュから利用可能な場合は返す
+        if canonical_name in self.templates_cache:
+            return self.templates_cache[canonical_name]
+
+        with self._lock:
+            return self._load_template_dict(canonical_name)
+
+    def _load_template_dict(self, canonical_name: str) -> Dict[str, Any]:
+        """YAMLを読み込んで継承関係を解決し、キャッシュに登録（ロック内で呼び出す）"""
+        if canonical_name in self.templates_cache:
+            return self.templates_cache[canonical_name]
+
+        template_name = canonical_name
+        template_path = self._path_index[canonical_name]
         yaml_data = self._load_yaml(template_path)
         if not yaml_data:
             return {}
         
         # テンプレートキーを見つける - 最初に完全一致を試す
-        parts = template_name.split("/")
-        template_key = parts[-1]  # パスの最後の部分
+        template_key = template_path.stem
         
         # 読み込まれたYAMLでキーを見つけようとする
         if template_key not in yaml_data:
@@ -130,6 +309,12 @@ class PromptManager:
         if "_extends" in template_data:
             parent_name = template_data["_extends"]
             parent_data = self._get_template_dict(parent_name)
+
+            # ホットリロード時に子孫だけを破棄できるよう継承関係を記録
+            parent_canonical = self._resolve_template_name(parent_name)
+            if parent_canonical is not None:
+                self._template_parent[canonical_name] = parent_canonical
+                self._template_children.setdefault(parent_canonical, set()).add(canonical_name)
             
             # 親データから始めて、現在のテンプレートで上書き
             resolved_data = self._merge_templates(parent_data, template_data)
@@ -137,7 +322,7 @@ class PromptManager:
             resolved_data = template_data
         
         # 結果をキャッシュ
-        self.templates_cache[template_name] = resolved_data
+        self.templates_cache[canonical_name] = resolved_data
         return resolved_data
     
     def _merge_templates(self, parent: Dict[str, Any], child: Dict[str, Any]) -> Dict[str, Any]:
@@ -176,34 +361,395 @@ class PromptManager:
             レンダリングされたプロンプト文字列
         """
         self._check_initialized()
-        
-        template_data = self._get_template_dict(template_name)
-        if not template_data:
+
+        started = time.perf_counter()
+        compiled = self._get_compiled_prompt(template_name)
+        if compiled is None:
             return ""
-        
+        looked_up = time.perf_counter()
+        metrics.observe('prompt_lookup', looked_up - started, template=template_name)
+
+        rendered = self._render_compiled(compiled, variables, kwargs)
+        metrics.observe('prompt_render', time.perf_counter() - looked_up, template=template_name)
+        return rendered
+
+    def _render_compiled(self, compiled: _CompiledPrompt, variables: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> str:
+        """コンパイル済みテンプレートを変数でレンダリング（静的テンプレートとLRUのキャッシュを使う）"""
+
+        overrides = dict(variables) if variables else {}
+        overrides.update(kwargs)
+
+        # テンプレートが参照しない変数しか渡されていなければ、出力はYAMLのフィールドだけで決まる
+        if not overrides or compiled.referenced_variables.isdisjoint(overrides):
+            rendered = compiled.rendered
+            if rendered is None:
+                self._static_render_stats.misses += 1
+                rendered = compiled.template.render(compiled.static_context)
+                compiled.rendered = rendered
+            else:
+                self._static_render_stats.hits += 1
+            return rendered
+
+        cache_key = None
+        if self._render_cache.max_size > 0 and compiled.fingerprint is not None:
+            variables_hash = self._hash_variables(overrides)
+            if variables_hash is not None:
+                cache_key = (compiled.fingerprint, variables_hash)
+                rendered = self._render_cache.get(cache_key)
+                if rendered is not None:
+                    return rendered
+
+        context = dict(compiled.static_context)
+        context.update(overrides)
+        rendered = compiled.template.render(context)
+
+        if cache_key is not None:
+            self._render_cache.put(cache_key, rendered)
+        return rendered
+
+    @staticmethod
+    def format_volatile_context(variables: Dict[str, Any], header: str = VOLATILE_CONTEXT_HEADER) -> str:
+        """
+        毎ターン変わる変数を、入力の末尾に置くテキストに整形する
+
+        時刻や直近の検索結果のような値をシステムプロンプトに埋め込むと、プロンプトの先頭が毎ターン変わり
+        プロバイダー側のプロンプトキャッシュが効かなくなる。これらはテンプレートに渡さず、
+        この関数で整形して入力の末尾に置く（キーの順に並べ、同じ値からは常に同じ文字列を生成する）。
+
+        引数:
+            variables: 毎ターン変わる変数の辞書
+            header: 先頭に付ける見出し
+
+        戻り値:
+            整形したテキスト（変数がなければ空文字列）
+        """
+        if not variables:
+            return ""
+        lines = [header]
+        for key in sorted(variables):
+            value = variables[key]
+            if not isinstance(value, str):
+                value = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+            lines.append(f"- {key}: {value}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _hash_variables(variables: Dict[str, Any]) -> Optional[str]:
+        """
+        呼び出し側の変数からレンダリングキャッシュ用のハッシュを生成
+
+        JSONの値だけからなる場合のみハッシュにする。それ以外の値（オブジェクトやタプル、日付など）は
+        repr が同じでもレンダリング結果が異なりうるため None を返し、キャッシュを使わない。
+        """
+        if not _is_json_value(variables):
+            return None
+        payload = json.dumps(variables, sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+    def get_cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        レンダリングキャッシュのヒット/ミス回数を取得
+
+        戻り値:
+            キャッシュ種別ごとの統計情報
+        """
+        return {
+            'static_render'  : self._static_render_stats.to_dict(),
+            'variable_render': {**self._render_cache.stats.to_dict(), 'size': len(self._render_cache)},
+        }
+
+    def is_static_template(self, template_name: str) -> bool:
+        """テンプレートの出力が自身のYAMLフィールドだけで決まるかを判定"""
+        self._check_initialized()
+        compiled = self._get_compiled_prompt(template_name)
+        return compiled is not None and compiled.is_static
+
+    def _get_compiled_prompt(self, template_name: str) -> Optional[_CompiledPrompt]:
+        """
+        テンプレート名に対応するコンパイル済みテンプレートを取得
+
+        引数:
+            template_name: テンプレート名
+
+        戻り値:
+            コンパイル済みテンプレート、テンプレートが無効な場合はNone
+        """
+        canonical_name = self._resolve_template_name(template_name)
+        if canonical_name is None:
+            apllog().error(f"テンプレート '{template_name}' が見つかりません")
+            return None
+
+        compiled = self._compiled_by_name.get(canonical_name)
+        if compiled is not None:
+            return compiled
+
+        with self._lock:
+            return self._build_compiled_prompt(canonical_name, template_name)
+
+    def _build_compiled_prompt(self, canonical_name: str, template_name: str) -> Optional[_CompiledPrompt]:
+        """テンプレートをコンパイルしてキャッシュに登録（ロック内で呼び出す）"""
+        compiled = self._compiled_by_name.get(canonical_name)
+        if compiled is not None:
+            return compiled
+
+        template_data = self._get_template_dict(canonical_name)
+        if not template_data:
+            return None
+
         # テンプレートがtemplateフィールドを持っているか確認
         if "template" not in template_data:
             apllog().error(f"テンプレート '{template_name}' には 'template' フィールドがありません")
-            return ""
-        
-        # すべてのテンプレート変数でコンテキストを作成
-        context = {k: v for k, v in template_data.items() if k != "template"}
-        
-        # 辞書とkwargsから提供された変数で上書き
-        if variables:
-            context.update(variables)
-        context.update(kwargs)
-        
-        # テンプレートをレンダリング
-        template_str = template_data["template"]
-        
+            return None
+
         # Jinja2スタイル {{ var }} と単純スタイル {var} の両方をサポート
         # {var} を Jinja2 用の {{ var }} に変換
-        template_str = re.sub(r'(?<!\{)\{([^{}]+)\}(?!\})', r'{{ \1 }}', template_str)
-        
-        template = Template(template_str)
-        return template.render(**context)
+        source = _SIMPLE_VAR_PATTERN.sub(r'{{ \1 }}', template_data["template"])
+        source_fingerprint = hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+        template = self._compiled_cache.get((canonical_name, source_fingerprint))
+        if template is None:
+            template = self._compile_template(canonical_name, source)
+            self._compiled_cache[(canonical_name, source_fingerprint)] = template
+            apllog().debug(f"テンプレート '{canonical_name}' をコンパイルしました")
+
+        # レンダリング結果はYAMLのフィールドにも依存するため、フィンガープリントに含める
+        static_context = {k: v for k, v in template_data.items() if k != "template"}
+        static_hash = self._hash_variables(static_context)
+        fingerprint = None if static_hash is None else hashlib.sha256(
+            (source_fingerprint + static_hash).encode('utf-8')
+        ).hexdigest()
+
+        referenced_variables = frozenset(meta.find_undeclared_variables(self._jinja_env.parse(source)))
+        compiled = _CompiledPrompt(
+            fingerprint          = fingerprint,
+            template             = template,
+            static_context       = static_context,
+            referenced_variables = referenced_variables,
+            is_static            = referenced_variables <= static_context.keys()
+        )
+        self._compiled_by_name[canonical_name] = compiled
+        return compiled
+
+    def _compile_template(self, canonical_name: str, source: str) -> Template:
+        """共有Jinja2環境でテンプレートをコンパイル（バイトコードキャッシュがあれば再利用）"""
+        self._source_loader.sources[canonical_name] = source
+        try:
+            return self._jinja_env.get_template(canonical_name)
+        finally:
+            del self._source_loader.sources[canonical_name]
     
+    def start_auto_reload(self, interval: float = 1.0) -> None:
+        """
+        YAMLファイルの更新時刻をポーリングし、変更されたテンプレートのキャッシュを破棄するスレッドを開始
+
+        引数:
+            interval: ポーリング間隔（秒）
+        """
+        self._check_initialized()
+        if self._reload_thread is not None and self._reload_thread.is_alive():
+            apllog().warning("プロンプトのホットリロードは既に開始されています")
+            return
+
+        self._reload_stop.clear()
+        self._reload_thread = threading.Thread(
+            target = self._auto_reload_loop,
+            args   = (interval,),
+            name   = "prompt-reloader",
+            daemon = True
+        )
+        self._reload_thread.start()
+        apllog().info(f"プロンプトのホットリロードを開始しました（間隔: {interval}秒）")
+
+    def stop_auto_reload(self) -> None:
+        """ホットリロードのスレッドを停止"""
+        if self._reload_thread is None:
+            return
+        self._reload_stop.set()
+        self._reload_thread.join()
+        self._reload_thread = None
+        apllog().info("プロンプトのホットリロードを停止しました")
+
+    def _auto_reload_loop(self, interval: float) -> None:
+        while not self._reload_stop.wait(interval):
+            try:
+                self.check_for_changes()
+            except Exception as e:
+                apllog().error(f"プロンプトの変更検出中にエラーが発生しました: {e}")
+
+    def check_for_changes(self) -> List[str]:
+        """
+        プロンプトディレクトリの変更を検出し、影響を受けるテンプレートのキャッシュを破棄
+
+        戻り値:
+            キャッシュを破棄したテンプレートの正規名のリスト
+        """
+        self._check_initialized()
+
+        with self._lock:
+            previous_mtimes = self._file_mtimes
+            previous_names = set(self._path_index)
+            self._build_template_index()
+
+            added_or_removed = previous_names.symmetric_difference(self._path_index)
+            if added_or_removed:
+                # ファイル名のみの参照先が変わる可能性があるため、すべて破棄する
+                apllog().info(f"テンプレートファイルの追加/削除を検出しました: {sorted(added_or_removed)}")
+                evicted = sorted(previous_names | set(self._path_index))
+                self._clear_caches()
+                return evicted
+
+            changed = [
+                name for name, mtime in self._file_mtimes.items()
+                if previous_mtimes.get(name) != mtime
+            ]
+            if not changed:
+                return []
+
+            apllog().info(f"テンプレートファイルの変更を検出しました: {changed}")
+            return self.invalidate(changed)
+
+    def invalidate(self, template_names: Iterable[str]) -> List[str]:
+        """
+        指定したテンプレートとそれを継承するテンプレートのキャッシュを破棄
+
+        引数:
+            template_names: 破棄するテンプレート名
+
+        戻り値:
+            キャッシュを破棄したテンプレートの正規名のリスト
+        """
+        self._check_initialized()
+
+        with self._lock:
+            # 継承グラフを辿って子孫をすべて集める
+            pending = [self._name_index.get(name, name) for name in template_names]
+            affected: Set[str] = set()
+            while pending:
+                name = pending.pop()
+                if name in affected:
+                    continue
+                affected.add(name)
+                pending.extend(self._template_children.get(name, ()))
+
+            stale_fingerprints = set()
+            for name in affected:
+                self.templates_cache.pop(name, None)
+                compiled = self._compiled_by_name.pop(name, None)
+                if compiled is not None:
+                    stale_fingerprints.add(compiled.fingerprint)
+                parent = self._template_parent.pop(name, None)
+                if parent is not None:
+                    self._template_children.get(parent, set()).discard(name)
+
+            self._compiled_cache = {
+                key: template for key, template in self._compiled_cache.items() if key[0] not in affected
+            }
+            self._render_cache.remove_where(lambda key: key[0] in stale_fingerprints)
+
+        apllog().debug(f"テンプレートのキャッシュを破棄しました: {sorted(affected)}")
+        return sorted(affected)
+
+    def _clear_caches(self) -> None:
+        """解決済み・コンパイル済み・レンダリング済みのキャッシュをすべて破棄（ロック内で呼び出す）"""
+        self.templates_cache = {}
+        self._compiled_cache = {}
+        self._compiled_by_name = {}
+        self._template_parent = {}
+        self._template_children = {}
+        self._render_cache.clear()
+
+    def _compute_content_hash(self) -> str:
+        """プロンプトディレクトリ内の全YAMLファイルの内容からハッシュを計算"""
+        digest = hashlib.sha256()
+        for canonical_name in sorted(self._path_index):
+            digest.update(canonical_name.encode('utf-8'))
+            digest.update(b'\0')
+            digest.update(self._path_index[canonical_name].read_bytes())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def build_bundle(self, bundle_path: Optional[Union[str, Path]] = None) -> Path:
+        """
+        すべてのテンプレートの継承関係を解決し、単一のバンドルファイルに書き出す
+
+        marshal で書き出せない値（YAMLの日付など）を含むテンプレートはバンドルに含めず、実行時にYAMLから読み込む。
+
+        引数:
+            bundle_path: 出力先のパス（省略時はプロンプトディレクトリ直下の既定ファイル）
+
+        戻り値:
+            書き出したバンドルファイルのパス
+        """
+        self._check_initialized()
+        bundle_path = Path(bundle_path) if bundle_path else self.prompt_dir / DEFAULT_BUNDLE_NAME
+
+        with self._lock:
+            templates = {}
+            skipped = []
+            for name in sorted(self._path_index):
+                template_data = self._get_template_dict(name)
+                try:
+                    marshal.dumps(template_data)
+                except ValueError:
+                    skipped.append(name)
+                    continue
+                templates[name] = template_data
+            bundle = {
+                "version"     : BUNDLE_FORMAT_VERSION,
+                "content_hash": self._compute_content_hash(),
+                "mtimes"      : dict(self._file_mtimes),
+                "templates"   : templates,
+                "parents"     : dict(self._template_parent),
+            }
+
+        # 一時ファイルに書き出してから置き換え、読み込み中のプロセスが壊れたファイルを見ないようにする
+        tmp_path = bundle_path.with_name(bundle_path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            marshal.dump(bundle, f)
+        os.replace(tmp_path, bundle_path)
+
+        if skipped:
+            apllog().warning(
+                f"バンドルに書き出せない値を含むため、YAMLから読み込むテンプレートがあります: {', '.join(skipped)}"
+            )
+        apllog().info(f"プロンプトバンドルを書き出しました: {bundle_path}（{len(templates)} テンプレート）")
+        return bundle_path
+
+    def _load_bundle(self, bundle_path: Path) -> bool:
+        """
+        バンドルが最新であれば解決済みテンプレートと継承関係をキャッシュに読み込む
+
+        引数:
+            bundle_path: バンドルファイルのパス
+
+        戻り値:
+            読み込んだ場合はTrue、古いか不正な場合はFalse（YAMLツリーから遅延読み込みする）
+        """
+        try:
+            with open(bundle_path, 'rb') as f:
+                bundle = marshal.load(f)
+        except Exception as e:
+            apllog().warning(f"プロンプトバンドル {bundle_path} の読み込みに失敗しました: {e}")
+            return False
+
+        if not isinstance(bundle, dict) or bundle.get("version") != BUNDLE_FORMAT_VERSION:
+            apllog().warning(f"プロンプトバンドル {bundle_path} の形式が異なるため使用しません")
+            return False
+
+        # 更新時刻が一致しない場合のみ内容のハッシュで比較する（チェックアウト直後など）
+        if bundle["mtimes"] != self._file_mtimes and bundle["content_hash"] != self._compute_content_hash():
+            apllog().info(f"プロンプトバンドル {bundle_path} が古いため、YAMLから読み込みます")
+            return False
+
+        with self._lock:
+            self.templates_cache.update(bundle["templates"])
+            for child, parent in bundle["parents"].items():
+                self._template_parent[child] = parent
+                self._template_children.setdefault(parent, set()).add(child)
+
+        apllog().info(f"プロンプトバンドルを読み込みました: {bundle_path}")
+        return True
+
     def list_available_templates(self) -> List[str]:
         """
         利用可能なすべてのテンプレートファイルを一覧表示
@@ -212,16 +758,7 @@ class PromptManager:
             テンプレート名のリスト
         """
         self._check_initialized()
-        
-        templates = []
-        for root, _, files in os.walk(self.prompt_dir):
-            for file in files:
-                if file.endswith('.yaml'):
-                    path = Path(root) / file
-                    relative_path = path.relative_to(self.prompt_dir)
-                    template_name = str(relative_path.with_suffix(''))
-                    templates.append(template_name)
-        return templates
+        return sorted(self._path_index.keys())
 
 # グローバルにアクセス可能なインスタンスを作成
 prompt_manager = PromptManager()
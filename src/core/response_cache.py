@@ -0,0 +1,236 @@
+import asyncio
+import dataclasses
+import hashlib
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional, Union
+
+from agents import FunctionTool, ModelResponse, ModelSettings, ModelTracing, Tool, TResponseInputItem
+from agents.agent_output import AgentOutputSchemaBase
+from agents.handoffs import Handoff
+from agents.items import TResponseStreamEvent
+from agents.models.interface import Model
+
+from src.core.cache import CacheStats, LRUCache
+from src.core.logger import apllog
+from src.core.metrics import metrics
+from src.core.settings import Settings
+
+
+class SqliteResponseStore:
+    """
+    SQLiteによるモデル応答のディスクキャッシュ
+
+    TTLを過ぎたエントリは参照時に破棄し、件数が上限を超えた場合は最終参照が古いものから削除する。
+    """
+
+    # 書き込みの度に件数を数えないよう、この回数ごとに上限の確認を行う
+    _EVICT_EVERY = 100
+
+    def __init__(self, path: Union[str, Path], ttl: float, max_entries: int):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            if self.ttl > 0 and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.stats.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._puts += 1
+            if self._puts % self._EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        """TTL切れと上限超過のエントリを削除（ロック内で呼び出す）"""
+        if self.ttl > 0:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """メモリ上のLRUと任意のSQLiteの2段構成のモデル応答キャッシュ"""
+
+    _shared: Optional['ResponseCache'] = None
+
+    def __init__(self, memory_size: int, disk_store: Optional[SqliteResponseStore] = None):
+        self.memory = LRUCache[ModelResponse](memory_size)
+        self.disk = disk_store
+
+    @classmethod
+    def shared(cls) -> 'ResponseCache':
+        """設定から生成したプロセス共有のキャッシュを取得"""
+        if cls._shared is None:
+            st = Settings().response_cache
+            disk_store = None
+            if st.db_path:
+                disk_store = SqliteResponseStore(st.db_path, ttl=st.ttl, max_entries=st.max_entries)
+            cls._shared = cls(st.memory_size, disk_store)
+            apllog().debug(f"モデル応答キャッシュを生成しました（ディスク: {st.db_path or 'なし'}）")
+        return cls._shared
+
+    async def get(self, key: str) -> Optional[ModelResponse]:
+        response = self.memory.get(key)
+        if response is not None or self.disk is None:
+            return response
+
+        payload = await asyncio.to_thread(self.disk.get, key)
+        if payload is None:
+            return None
+        response = pickle.loads(payload)
+        self.memory.put(key, response)
+        return response
+
+    async def put(self, key: str, response: ModelResponse) -> None:
+        self.memory.put(key, response)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.put, key, pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def stats(self) -> dict[str, Any]:
+        """キャッシュ層ごとのヒット率"""
+        stats = {'memory': {**self.memory.stats.to_dict(), 'size': len(self.memory)}}
+        if self.disk is not None:
+            stats['disk'] = self.disk.stats.to_dict()
+        return stats
+
+
+def _describe_tool(tool: Tool) -> dict[str, Any]:
+    if isinstance(tool, FunctionTool):
+        return {'name': tool.name, 'description': tool.description, 'parameters': tool.params_json_schema}
+    return {'type': type(tool).__name__, 'name': getattr(tool, 'name', None)}
+
+
+def response_cache_key(
+    model_name         : str,
+    system_instructions: Optional[str],
+    input              : str | list[TResponseInputItem],
+    model_settings     : ModelSettings,
+    tools              : list[Tool],
+    output_schema      : Optional[AgentOutputSchemaBase],
+    handoffs           : list[Handoff]
+) -> str:
+    """モデル呼び出しの内容から安定したキャッシュキーを生成"""
+    payload = {
+        'model'        : model_name,
+        'instructions' : system_instructions,
+        'input'        : input,
+        'settings'     : dataclasses.asdict(model_settings),
+        'tools'        : [_describe_tool(tool) for tool in tools],
+        'output_schema': output_schema.json_schema() if output_schema and not output_schema.is_plain_text() else None,
+        'handoffs'     : [{'name': handoff.tool_name, 'schema': handoff.input_json_schema} for handoff in handoffs],
+    }
+    serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+class CachedModel(Model):
+    """
+    temperature=0 の決定的な呼び出しの応答をキャッシュするモデルのラッパー
+
+    キャッシュにヒットした場合はネットワークに出ずに以前の応答を返す。
+    ストリーミングの呼び出し（対話モードのターンなど）はキャッシュせず、常にモデルを呼び出す。
+    ヒット/ミスの回数はメトリクスの response_cache カウンターに記録する。
+    """
+
+    def __init__(self, model: Model, model_name: str, cache: Optional[ResponseCache] = None):
+        self.model = model
+        self.model_name = model_name
+        self.cache = cache or ResponseCache.shared()
+
+    async def get_response(
+        self,
+        system_instructions: Optional[str],
+        input              : str | list[TResponseInputItem],
+        model_settings     : ModelSettings,
+        tools              : list[Tool],
+        output_schema      : Optional[AgentOutputSchemaBase],
+        handoffs           : list[Handoff],
+        tracing            : ModelTracing,
+        *,
+        previous_response_id: Optional[str] = None
+    ) -> ModelResponse:
+        cacheable = model_settings.temperature == 0 and previous_response_id is None
+        if not cacheable:
+            metrics.increment('response_cache', result='skipped', model=self.model_name)
+            return await self.model.get_response(
+                system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+                previous_response_id = previous_response_id
+            )
+
+        key = response_cache_key(
+            self.model_name, system_instructions, input, model_settings, tools, output_schema, handoffs
+        )
+        response = await self.cache.get(key)
+        if response is not None:
+            metrics.increment('response_cache', result='hit', model=self.model_name)
+            apllog().debug(f"モデル応答キャッシュにヒットしました: {self.model_name}")
+            return response
+        metrics.increment('response_cache', result='miss', model=self.model_name)
+
+        response = await self.model.get_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+            previous_response_id = previous_response_id
+        )
+        await self.cache.put(key, response)
+        return response
+
+    def stream_response(
+        self,
+        system_instructions: Optional[str],
+        input              : str | list[TResponseInputItem],
+        model_settings     : ModelSettings,
+        tools              : list[Tool],
+        output_schema      : Optional[AgentOutputSchemaBase],
+        handoffs           : list[Handoff],
+        tracing            : ModelTracing,
+        *,
+        previous_response_id: Optional[str] = None
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        metrics.increment('response_cache', result='skipped', model=self.model_name)
+        return self.model.stream_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+            previous_response_id = previous_response_id
+        )
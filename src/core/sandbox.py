@@ -0,0 +1,363 @@
+import asyncio
+import itertools
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from src.core.logger import apllog
+from src.core.metrics import metrics
+from src.core.settings import SandboxSettings, Settings
+
+# ワーカーはパッケージを読み込まずにファイルを直接実行する（呼び出し元の初期化処理を繰り返さないため）
+_WORKER_SCRIPT = Path(__file__).with_name("sandbox_worker.py")
+_HEADER = struct.Struct('!I')
+# ワーカーからの1メッセージの大きさの上限（これを超える長さは壊れたメッセージとして扱う）
+_MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+# ワーカーが pandas などを読み込み終えるまでの待ち時間の上限（秒）
+_STARTUP_TIMEOUT = 120.0
+# ワーカーの起動に失敗した場合の再試行の回数と、最初の待ち時間（秒、再試行のたびに倍にする）
+_SPAWN_ATTEMPTS = 3
+_SPAWN_BACKOFF = 0.5
+# ワーカーに引き継ぐ環境変数（API キーなどは渡さない。HOME と一時ディレクトリはワーカーごとの作業ディレクトリにする）
+_INHERITED_ENV = ('PATH', 'LANG', 'LC_ALL', 'SYSTEMROOT', 'PYTHONPATH', 'VIRTUAL_ENV')
+# 結果の項目と型（実行するコードも結果の送り先に書き込めるため、受け取った結果は必ず検証する）
+_RESULT_FIELDS: dict[str, tuple[type, ...]] = {
+    'ok'          : (bool,),
+    'stdout'      : (str,),
+    'value'       : (str, type(None)),
+    'error'       : (str, type(None)),
+    'elapsed'     : (int, float),
+    'cpu_time'    : (int, float),
+    'memory_error': (bool,),
+}
+
+
+class _ProtocolError(Exception):
+    """ワーカーからのメッセージが壊れているか、順番が合わない"""
+
+
+@dataclass
+class ExecutionResult:
+    """コードの実行結果"""
+    ok       : bool
+    stdout   : str = ''
+    # 最後の式の値（DataFrame などは先頭の行と形状のみ）
+    value    : Optional[str] = None
+    error    : Optional[str] = None
+    timed_out: bool = False
+    # ワーカー内での実行時間とCPU時間、受け渡しを含む全体から実行時間を除いた時間（秒）
+    elapsed  : float = 0.0
+    cpu_time : float = 0.0
+    overhead : float = 0.0
+
+    def to_json(self) -> str:
+        """モデルに返すための、空の項目を省いた JSON"""
+        compact = {key: value for key, value in asdict(self).items() if value not in (None, '', False) or key == 'ok'}
+        return json.dumps(compact, ensure_ascii=False)
+
+
+class _Worker:
+    """ワーカープロセスと、その標準入出力"""
+
+    def __init__(self, process: asyncio.subprocess.Process, workdir: str):
+        self.process = process
+        self.workdir = workdir
+        self.modules: list[str] = []
+        self.executions = 0
+
+    async def send(self, message: Any) -> None:
+        body = json.dumps(message, ensure_ascii=False).encode('utf-8')
+        self.process.stdin.write(_HEADER.pack(len(body)) + body)
+        await self.process.stdin.drain()
+
+    async def recv(self) -> dict[str, Any]:
+        """メッセージを1件受け取る（JSON のオブジェクトでなければ _ProtocolError）"""
+        header = await self.process.stdout.readexactly(_HEADER.size)
+        (length,) = _HEADER.unpack(header)
+        if length > _MAX_MESSAGE_BYTES:
+            raise _ProtocolError(f"メッセージが大きすぎます（{length} バイト）")
+        body = await self.process.stdout.readexactly(length)
+        try:
+            message = json.loads(body)
+        except ValueError as e:
+            raise _ProtocolError(f"メッセージを読み込めません: {e}") from e
+        if not isinstance(message, dict):
+            raise _ProtocolError("メッセージがオブジェクトではありません")
+        return message
+
+    async def recv_result(self, seq: int) -> tuple[dict[str, Any], bool]:
+        """
+        ジョブ seq の結果を受け取る
+
+        前のジョブの結果が残っていた場合は読み飛ばす（実行したコードが結果を偽装して書き込むと、本来の結果が後に残る）。
+
+        戻り値:
+            (検証した結果, 読み飛ばしたメッセージがあったか)
+        """
+        skipped = False
+        while True:
+            message = await self.recv()
+            message_seq = message.get('seq')
+            if message.get('type') != 'result' or not isinstance(message_seq, int) or message_seq > seq:
+                raise _ProtocolError(f"想定しないメッセージです（type={message.get('type')!r}, seq={message_seq!r}）")
+            if message_seq < seq:
+                skipped = True
+                continue
+            return _validate_result(message.get('result')), skipped
+
+    async def kill(self, grace: float = 0.0) -> None:
+        """プロセスを終了する（grace 秒は自分から終了するのを待つ）"""
+        if grace > 0:
+            try:
+                await asyncio.wait_for(self.process.wait(), grace)
+            except asyncio.TimeoutError:
+                pass
+        if self.process.returncode is None:
+            self.process.kill()
+        await self.process.wait()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def _validate_result(result: Any) -> dict[str, Any]:
+    """結果の項目と型を検証し、既知の項目だけを返す"""
+    if not isinstance(result, dict) or not isinstance(result.get('ok'), bool):
+        raise _ProtocolError("結果の形式が不正です")
+    validated: dict[str, Any] = {}
+    for key, types in _RESULT_FIELDS.items():
+        if key not in result:
+            continue
+        # bool は int のサブクラスのため、数値の項目に bool が来た場合も不正とする
+        if not isinstance(result[key], types) or (bool not in types and isinstance(result[key], bool)):
+            raise _ProtocolError(f"結果の項目 {key} の型が不正です")
+        validated[key] = result[key]
+    return validated
+
+
+class CodeSandbox:
+    """
+    生成されたコードを実行する、起動済みのワーカープロセスのプール
+
+    ワーカーは起動時に pandas / numpy などを読み込んでおくため、実行のたびにインタープリターの起動とライブラリの読み込みを待たずに済む。
+    ワーカーごとに仮想メモリの上限、実行ごとにCPU時間の上限とタイムアウトを設け、上限を超えたワーカーは終了して入れ替える。
+    実行はコードごとに新しい名前空間で行い、一定回数実行したワーカーも入れ替える（入れ替えはバックグラウンドで行う）。
+    """
+
+    def __init__(self, settings: Optional[SandboxSettings] = None):
+        self.st = settings or Settings().sandbox
+        self.preload = [name.strip() for name in self.st.preload.split(',') if name.strip()]
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: set[_Worker] = set()
+        self._replacing: set[asyncio.Task] = set()
+        self._start_lock: Optional[asyncio.Lock] = None
+        # ジョブの通し番号（結果との対応を確かめる）
+        self._seq = itertools.count(1)
+
+    def _worker_env(self, workdir: str) -> dict[str, str]:
+        env = {name: os.environ[name] for name in _INHERITED_ENV if name in os.environ}
+        env.update({'HOME': workdir, 'TMPDIR': workdir, 'TEMP': workdir, 'TMP': workdir})
+        # 数値計算ライブラリがワーカーごとにCPU数分のスレッドを立てないようにする
+        env.update({'OMP_NUM_THREADS': '1', 'OPENBLAS_NUM_THREADS': '1', 'MKL_NUM_THREADS': '1', 'PYTHONIOENCODING': 'utf-8'})
+        return env
+
+    async def _spawn(self) -> _Worker:
+        """
+        ワーカーを起動し、ライブラリの読み込みが終わるまで待つ
+
+        ワーカーは空の一時ディレクトリを作業ディレクトリとして起動する（.env などの呼び出し元のファイルを相対パスで読めないようにする）。
+        """
+        config = {
+            'preload'     : self.preload,
+            'memory_bytes': self.st.memory_mb * 1024 * 1024,
+            'cpu_seconds' : self.st.cpu_seconds,
+            'max_output'  : self.st.max_output,
+        }
+        workdir = tempfile.mkdtemp(prefix="sandbox-")
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, str(_WORKER_SCRIPT), json.dumps(config),
+                stdin  = asyncio.subprocess.PIPE,
+                stdout = asyncio.subprocess.PIPE,
+                stderr = asyncio.subprocess.DEVNULL,
+                cwd    = workdir,
+                env    = self._worker_env(workdir)
+            )
+        except OSError:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+        worker = _Worker(process, workdir)
+        try:
+            ready = await asyncio.wait_for(worker.recv(), _STARTUP_TIMEOUT)
+            if ready.get('type') != 'ready' or not isinstance(ready.get('modules'), list):
+                raise _ProtocolError("起動の通知の形式が不正です")
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, _ProtocolError) as e:
+            await worker.kill()
+            raise RuntimeError(f"サンドボックスのワーカーが起動しませんでした（終了コード {process.returncode}）") from e
+        worker.modules = [str(name) for name in ready['modules']]
+        self._workers.add(worker)
+        return worker
+
+    async def _spawn_with_retry(self) -> _Worker:
+        """ワーカーを起動する（失敗した場合は間隔を空けて再試行し、すべて失敗したら RuntimeError）"""
+        delay = _SPAWN_BACKOFF
+        for attempt in range(1, _SPAWN_ATTEMPTS + 1):
+            try:
+                return await self._spawn()
+            except (RuntimeError, OSError) as e:
+                if attempt == _SPAWN_ATTEMPTS:
+                    raise RuntimeError(f"サンドボックスのワーカーを起動できませんでした: {e}") from e
+                apllog().warning(f"サンドボックスのワーカーの起動に失敗しました（{attempt}/{_SPAWN_ATTEMPTS}）: {e}")
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None
+
+    async def start(self) -> None:
+        """ワーカーを起動する（最初の実行時にも呼ばれるが、起動時に呼んでおくと最初の実行も待たずに済む）"""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._idle is not None:
+                return
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *(self._spawn_with_retry() for _ in range(max(1, self.st.workers))), return_exceptions=True
+            )
+            workers = [result for result in results if isinstance(result, _Worker)]
+            if not workers:
+                raise next(result for result in results if isinstance(result, BaseException))
+            idle: asyncio.Queue = asyncio.Queue()
+            for worker in workers:
+                idle.put_nowait(worker)
+            self._idle = idle
+            apllog().info(
+                f"サンドボックスのワーカーを {len(workers)} 個起動しました（{time.perf_counter() - started:.2f}秒、"
+                f"読み込み済み: {', '.join(workers[0].modules) or 'なし'}）"
+            )
+
+    def _replace(self, worker: _Worker, reason: str) -> None:
+        """ワーカーを終了し、代わりのワーカーをバックグラウンドで起動する"""
+        apllog().debug(f"サンドボックスのワーカーを入れ替えます: {reason}")
+        self._workers.discard(worker)
+
+        async def replace() -> None:
+            await worker.kill()
+            try:
+                new_worker = await self._spawn_with_retry()
+            except RuntimeError as e:
+                apllog().error(str(e))
+                # ワーカーが1つも残っていなければ、待っている実行に知らせる（None を受け取った実行は自分で起動を試みる）
+                if not self._workers and self._idle is not None:
+                    self._idle.put_nowait(None)
+                return
+            if self._idle is not None:
+                self._idle.put_nowait(new_worker)
+
+        task = asyncio.create_task(replace())
+        self._replacing.add(task)
+        task.add_done_callback(self._replacing.discard)
+
+    async def _acquire(self) -> _Worker:
+        """空いているワーカーを取得する（ワーカーが1つもなく、起動もできない場合は RuntimeError）"""
+        worker = await self._idle.get()
+        if worker is not None:
+            return worker
+        try:
+            return await self._spawn()
+        except (RuntimeError, OSError):
+            # 他に待っている実行にも知らせる
+            self._idle.put_nowait(None)
+            raise
+
+    async def run(self, code: str, variables: Optional[dict[str, Any]] = None, timeout: Optional[float] = None) -> ExecutionResult:
+        """
+        コードをワーカーで実行する
+
+        引数:
+            code: 実行するコード（最後の文が式ならその値を返す）
+            variables: コードから参照できる変数（JSON にできる値のみ）
+            timeout: 経過時間の上限（秒、省略時は設定の値）
+
+        戻り値:
+            実行結果（エラーやタイムアウトも結果として返す）
+
+        例外:
+            RuntimeError: ワーカーを起動できない
+        """
+        try:
+            json.dumps(variables or {})
+        except (TypeError, ValueError) as e:
+            return ExecutionResult(ok=False, error=f"変数を渡せませんでした: {e}")
+
+        await self.start()
+        timeout = timeout if timeout is not None else self.st.timeout
+        worker = await self._acquire()
+        seq = next(self._seq)
+        started = time.perf_counter()
+        try:
+            await worker.send({'seq': seq, 'code': code, 'variables': variables or {}})
+            payload, skipped = await asyncio.wait_for(worker.recv_result(seq), timeout)
+        except asyncio.TimeoutError:
+            self._replace(worker, "タイムアウト")
+            metrics.observe('sandbox_execution', time.perf_counter() - started, status='timeout')
+            return ExecutionResult(ok=False, error=f"{timeout:g}秒以内に完了しませんでした", timed_out=True, elapsed=timeout)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # メモリやCPU時間の上限で強制終了された
+            returncode = await worker.process.wait()
+            self._replace(worker, f"終了コード {returncode}")
+            metrics.observe('sandbox_execution', time.perf_counter() - started, status='crashed')
+            return ExecutionResult(
+                ok    = False,
+                error = f"実行中にワーカーが終了しました（終了コード {returncode}、メモリまたはCPU時間の上限を超えた可能性があります）"
+            )
+        except _ProtocolError as e:
+            # 実行したコードが結果の送り先に書き込んだ。以降のメッセージも信用できないためワーカーを破棄する
+            self._replace(worker, str(e))
+            metrics.observe('sandbox_execution', time.perf_counter() - started, status='protocol_error')
+            return ExecutionResult(ok=False, error="ワーカーからの応答が不正なため、ワーカーを破棄しました")
+        except BaseException:
+            # 呼び出し元のキャンセルなど。実行中のワーカーは状態が分からないため入れ替える
+            self._replace(worker, "キャンセル")
+            raise
+
+        total = time.perf_counter() - started
+        worker.executions += 1
+        if skipped:
+            # 前の実行の結果が残っていた（前の実行が結果を偽装した）ワーカーは使い続けない
+            self._replace(worker, "応答の順番の不一致")
+        elif payload.pop('memory_error', False) or worker.executions >= self.st.max_executions:
+            self._replace(worker, f"{worker.executions} 回実行")
+        else:
+            self._idle.put_nowait(worker)
+        payload.pop('memory_error', None)
+
+        result = ExecutionResult(**payload)
+        result.overhead = round(max(0.0, total - result.elapsed), 6)
+        metrics.observe('sandbox_execution', total, status='ok' if result.ok else 'error')
+        return result
+
+    async def close(self) -> None:
+        """すべてのワーカーを終了する"""
+        for task in list(self._replacing):
+            task.cancel()
+        workers = list(self._workers)
+        self._workers.clear()
+        self._idle = None
+        for worker in workers:
+            try:
+                await worker.send(None)
+            except (ConnectionError, RuntimeError):
+                pass
+        await asyncio.gather(*(worker.kill(grace=1.0) for worker in workers))
+
+
+# 生成されたコードを実行するサンドボックス（ワーカーは最初の実行または start() で起動する）
+code_sandbox = CodeSandbox()
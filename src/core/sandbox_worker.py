@@ -0,0 +1,193 @@
+"""
+コード実行サンドボックスのワーカープロセス
+
+    python src/core/sandbox_worker.py '{"preload": ["numpy", "pandas"], "memory_bytes": 0, "cpu_seconds": 20, "max_output": 8000}'
+
+起動時にデータ分析ライブラリを読み込み、以降は標準入力から受け取ったコードを1件ずつ実行して結果を標準出力に返す。
+メッセージは 4 バイトの長さに続く UTF-8 の JSON で、呼び出し元の環境に依存しないよう標準ライブラリのみを使う。
+実行するコードも結果の送り先に書き込めるため、受け取った側でコードが実行されうる pickle は使わない。
+"""
+import ast
+import contextlib
+import importlib
+import io
+import json
+import os
+import signal
+import struct
+import sys
+import time
+import traceback
+from typing import Any, BinaryIO, Optional
+
+try:
+    import resource
+except ImportError:  # Windows では資源の制限を行わない
+    resource = None
+
+# 実行するコードから短い名前で使えるようにするモジュール
+_ALIASES = {'numpy': 'np', 'pandas': 'pd'}
+
+
+_HEADER = struct.Struct('!I')
+
+
+def send_message(stream: BinaryIO, message: Any) -> None:
+    body = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    stream.write(_HEADER.pack(len(body)) + body)
+    stream.flush()
+
+
+def recv_message(stream: BinaryIO) -> Any:
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        raise EOFError
+    (length,) = _HEADER.unpack(header)
+    body = stream.read(length)
+    if len(body) < length:
+        raise EOFError
+    return json.loads(body)
+
+
+class CpuTimeExceeded(Exception):
+    """CPU時間の上限に達した"""
+
+
+def _on_cpu_limit(signum, frame):
+    raise CpuTimeExceeded("CPU時間の上限に達しました")
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit] + f"\n...（{len(text) - limit} 文字省略）"
+
+
+def summarize_value(value: Any, limit: int) -> Optional[str]:
+    """実行結果の値を、モデルに返せる短い文字列にする（DataFrame などは先頭の行と形状のみ）"""
+    if value is None:
+        return None
+    shape = getattr(value, 'shape', None)
+    if hasattr(value, 'head') and shape is not None:
+        text = f"shape={shape}\n{value.head(20).to_string()}"
+    elif shape and hasattr(value, 'dtype'):
+        text = f"shape={shape} dtype={value.dtype}\n{value!r}"
+    else:
+        text = repr(value)
+    return _truncate(text, limit)
+
+
+class _LimitedWriter(io.StringIO):
+    """上限を超えた出力は捨てる（大量の print でメモリを使い切らないため）"""
+
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit = limit
+        self.dropped = 0
+
+    def write(self, text: str) -> int:
+        remaining = self.limit - self.tell()
+        if remaining > 0:
+            super().write(text[:remaining])
+        self.dropped += max(0, len(text) - max(remaining, 0))
+        return len(text)
+
+    def text(self) -> str:
+        value = self.getvalue()
+        return value + (f"\n...（{self.dropped} 文字省略）" if self.dropped else "")
+
+
+def execute(code: str, variables: dict[str, Any], modules: dict[str, Any], cpu_seconds: float, max_output: int) -> dict[str, Any]:
+    """
+    コードを新しい名前空間で実行し、標準出力と最後の式の値を返す
+
+    CPU時間の上限は、このプロセスのこれまでの使用時間に cpu_seconds を加えた値を RLIMIT_CPU に設定して課す。
+    """
+    namespace: dict[str, Any] = {'__name__': '__sandbox__', **modules, **variables}
+    stdout = _LimitedWriter(max_output)
+    result: dict[str, Any] = {'ok': True, 'stdout': '', 'value': None, 'error': None}
+
+    started = time.perf_counter()
+    cpu_started = _cpu_seconds() if resource is not None else 0.0
+    if resource is not None and cpu_seconds > 0:
+        # ソフトリミットを超えると SIGXCPU で中断する（ハードリミットは一度下げると戻せないため変えず、
+        # C の処理から戻らない場合は呼び出し元のタイムアウトでプロセスごと終了する）
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(resource.RLIMIT_CPU, (int(cpu_started + cpu_seconds) + 1, hard))
+    try:
+        tree = ast.parse(code, mode='exec')
+        # 最後の文が式ならその値を結果として返す（ノートブックと同じ）
+        last_expr = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stdout):
+            exec(compile(tree, '<sandbox>', 'exec'), namespace)
+            if last_expr is not None:
+                value = eval(compile(ast.Expression(last_expr.value), '<sandbox>', 'eval'), namespace)
+                result['value'] = summarize_value(value, max_output)
+    except KeyboardInterrupt:
+        raise
+    except BaseException as e:
+        # SystemExit（exit() の呼び出し）や MemoryError もコードのエラーとして返す
+        result['ok'] = False
+        result['memory_error'] = isinstance(e, MemoryError)
+        # トレースバックのうち、実行したコードの部分だけを返す
+        frames = [frame for frame in traceback.extract_tb(e.__traceback__) if frame.filename == '<sandbox>']
+        location = f"（{frames[-1].lineno} 行目）" if frames else ""
+        result['error'] = f"{type(e).__name__}: {e}{location}"
+    finally:
+        if resource is not None and cpu_seconds > 0:
+            resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+    result['stdout'] = stdout.text()
+    result['elapsed'] = round(time.perf_counter() - started, 6)
+    if resource is not None:
+        result['cpu_time'] = round(_cpu_seconds() - cpu_started, 6)
+    return result
+
+
+def main() -> None:
+    """
+    ワーカーの本体（準備ができたら {"type": "ready", "modules": [...]} を送り、以降はジョブを1件ずつ処理する）
+
+    ジョブ: {"seq": 通し番号, "code": "...", "variables": {...}}、終了の指示: null
+    結果: {"type": "result", "seq": ジョブの通し番号, "result": {...}}
+    """
+    config = json.loads(sys.argv[1])
+    # 通信には元の標準入出力を使い、実行するコードが fd に直接書いた出力は標準エラーに逃がす
+    reader = os.fdopen(os.dup(0), 'rb')
+    writer = os.fdopen(os.dup(1), 'wb')
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(2, 1)
+
+    modules = {}
+    for name in config.get('preload', []):
+        try:
+            modules[_ALIASES.get(name, name)] = importlib.import_module(name)
+        except ImportError:
+            pass
+
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+        memory_bytes = config.get('memory_bytes', 0)
+        if memory_bytes > 0:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+    send_message(writer, {'type': 'ready', 'modules': sorted(modules)})
+    while True:
+        try:
+            job = recv_message(reader)
+        except (EOFError, OSError, ValueError):
+            break
+        if job is None:
+            break
+        result = execute(job['code'], job['variables'], modules, config.get('cpu_seconds', 0), config.get('max_output', 8000))
+        send_message(writer, {'type': 'result', 'seq': job['seq'], 'result': result})
+
+
+if __name__ == "__main__":
+    main()
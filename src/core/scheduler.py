@@ -0,0 +1,414 @@
+import asyncio
+import heapq
+import itertools
+import json
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+import openai
+from agents import ModelResponse, ModelSettings, ModelTracing, Tool, TResponseInputItem
+from agents.agent_output import AgentOutputSchemaBase
+from agents.handoffs import Handoff
+from agents.items import TResponseStreamEvent
+from agents.models.interface import Model
+
+from src.core.logger import apllog
+from src.core.metrics import current_agent_name, metrics
+from src.core.settings import Settings
+from src.core.utils import count_tokens
+
+T = TypeVar('T')
+
+# レート制限と一時的なエラー（再試行の対象）
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+# 出力トークン数の上限が指定されていない呼び出しで見積もりに使う値
+_default_output_tokens = Settings().scheduler.default_output_tokens
+
+
+class RequestPriority(IntEnum):
+    """モデル呼び出しの優先度（値が小さいほど優先）"""
+    INTERACTIVE = 0
+    BACKGROUND  = 10
+
+
+_current_priority: ContextVar[RequestPriority] = ContextVar('request_priority', default=RequestPriority.INTERACTIVE)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """エラーの応答の Retry-After ヘッダー（秒、ない場合は None）"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if 'retry-after-ms' in headers:
+            return float(headers['retry-after-ms']) / 1000.0
+        if 'retry-after' in headers:
+            return float(headers['retry-after'])
+    except ValueError:
+        pass
+    return None
+
+
+@contextmanager
+def request_priority(priority: RequestPriority) -> Iterator[None]:
+    """ブロック内のモデル呼び出しの優先度を設定する"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class TokenBucket:
+    """1分あたりの上限から補充されるトークンバケット"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """amount を消費できるまでの待ち時間（秒）"""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            return 0.0
+        return (amount - self._tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        if self.capacity <= 0:
+            return
+        self._refill()
+        self._tokens -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        """見積もりと実際の消費量の差を反映する（正なら返却、負なら追加で消費）"""
+        if self.capacity <= 0:
+            return
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    tokens  : float = field(compare=False)
+    future  : asyncio.Future = field(compare=False)
+
+
+@dataclass
+class SchedulerStats:
+    """スケジューラーの統計情報"""
+    completed   : int = 0
+    retries     : int = 0
+    rate_limited: int = 0
+    failed      : int = 0
+    queued_time : float = 0.0
+
+
+class RequestScheduler:
+    """
+    デプロイメントごとのモデル呼び出しスケジューラー
+
+    同時実行数の上限、RPM/TPM のトークンバケット、優先度付きの待ち行列で呼び出しを制御し、
+    429 を受けた場合は Retry-After を尊重したジッター付きバックオフで再試行する。
+    """
+
+    _schedulers: dict[str, 'RequestScheduler'] = {}
+
+    def __init__(
+        self,
+        name               : str,
+        max_concurrency    : int,
+        requests_per_minute: int,
+        tokens_per_minute  : int,
+        max_retries        : int = 5,
+        base_backoff       : float = 0.5,
+        max_backoff        : float = 30.0
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.stats = SchedulerStats()
+
+        self._request_bucket = TokenBucket(requests_per_minute)
+        self._token_bucket = TokenBucket(tokens_per_minute)
+        self._waiters: list[_Waiter] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._wakeup_handle: Optional[asyncio.TimerHandle] = None
+
+    @classmethod
+    def for_deployment(cls, name: str, max_retries: Optional[int] = None) -> 'RequestScheduler':
+        """デプロイメント名に対応するスケジューラーを取得（なければ設定から生成し、max_retries を省略した場合は設定の値を使う）"""
+        scheduler = cls._schedulers.get(name)
+        if scheduler is None:
+            st = Settings().scheduler
+            scheduler = cls(
+                name                = name,
+                max_concurrency     = st.max_concurrency,
+                requests_per_minute = st.requests_per_minute,
+                tokens_per_minute   = st.tokens_per_minute,
+                max_retries         = st.max_retries if max_retries is None else max_retries
+            )
+            cls._schedulers[name] = scheduler
+            apllog().debug(f"デプロイメント {name} のスケジューラーを生成しました")
+        return scheduler
+
+    @property
+    def queue_length(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.future.done())
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _dispatch(self) -> None:
+        """待ち行列の先頭から、同時実行数とレート制限の範囲内で呼び出しを許可する"""
+        if self._wakeup_handle is not None:
+            self._wakeup_handle.cancel()
+            self._wakeup_handle = None
+
+        while self._waiters and self._in_flight < self.max_concurrency:
+            waiter = self._waiters[0]
+            if waiter.future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            wait = max(
+                self._blocked_until - time.monotonic(),
+                self._request_bucket.wait_time(1),
+                self._token_bucket.wait_time(waiter.tokens)
+            )
+            if wait > 0:
+                self._wakeup_handle = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+
+            heapq.heappop(self._waiters)
+            self._request_bucket.consume(1)
+            self._token_bucket.consume(waiter.tokens)
+            self._in_flight += 1
+            waiter.future.set_result(None)
+
+    async def _acquire(self, tokens: float, priority: RequestPriority) -> None:
+        waiter = _Waiter(
+            priority = int(priority),
+            sequence = next(self._sequence),
+            tokens   = tokens,
+            future   = asyncio.get_running_loop().create_future()
+        )
+        heapq.heappush(self._waiters, waiter)
+        self._dispatch()
+
+        queued_at = time.monotonic()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            # 許可された直後にキャンセルされた場合は枠を返す
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release()
+            raise
+        self.stats.queued_time += time.monotonic() - queued_at
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tokens: float, priority: Optional[RequestPriority] = None) -> AsyncIterator[None]:
+        """同時実行枠とレート制限の枠を確保して呼び出しを行う"""
+        await self._acquire(tokens, priority if priority is not None else _current_priority.get())
+        try:
+            yield
+        finally:
+            self._release()
+
+    def record_usage(self, estimated_tokens: float, actual_tokens: int) -> None:
+        """見積もりトークン数と実際の消費量の差をバケットに反映"""
+        if actual_tokens:
+            self._token_bucket.adjust(estimated_tokens - actual_tokens)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Retry-After ヘッダーを優先し、なければ指数バックオフ（フルジッター）で待ち時間を決める"""
+        delay = retry_after(error)
+        if delay is not None:
+            return delay
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    async def run(
+        self,
+        call            : Callable[[], Awaitable[T]],
+        estimated_tokens: float,
+        priority        : Optional[RequestPriority] = None
+    ) -> T:
+        """
+        スケジューラーの制御下で呼び出しを実行し、レート制限や一時的なエラーは再試行する
+
+        引数:
+            call: 実行する呼び出し
+            estimated_tokens: 呼び出しが消費する見積もりトークン数
+            priority: 優先度（省略時は request_priority で設定された値）
+
+        戻り値:
+            呼び出しの結果
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self.slot(estimated_tokens, priority):
+                    result = await call()
+                self.stats.completed += 1
+                return result
+            except RETRYABLE_ERRORS as e:
+                delay = self.next_retry(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def next_retry(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        再試行できるエラーを受けた後の待ち時間を決める
+
+        引数:
+            error: 呼び出しで発生したエラー（RETRYABLE_ERRORS のいずれか）
+            attempt: これまでの再試行回数
+
+        戻り値:
+            再試行までの待ち時間（秒）、再試行回数の上限に達した場合は None
+        """
+        if attempt >= self.max_retries:
+            self.stats.failed += 1
+            return None
+
+        delay = self._retry_delay(error, attempt)
+        if isinstance(error, openai.RateLimitError):
+            # 429 の場合は後続の呼び出しもまとめて待たせ、再試行の連鎖を防ぐ
+            self.stats.rate_limited += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+
+        self.stats.retries += 1
+        apllog().warning(
+            f"デプロイメント {self.name} の呼び出しに失敗しました（{type(error).__name__}）。"
+            f"{delay:.2f}秒後に再試行します（{attempt + 1}/{self.max_retries}）"
+        )
+        return delay
+
+
+def estimate_request_tokens(
+    system_instructions: Optional[str],
+    input              : Any,
+    max_output_tokens  : Optional[int],
+    model_name         : str
+) -> int:
+    """リクエストが消費するトークン数を見積もる（入力 + 出力の上限）"""
+    tokens = count_tokens(system_instructions or '', model_name)
+    if isinstance(input, str):
+        tokens += count_tokens(input, model_name)
+    else:
+        for item in input:
+            content = item.get('content') if isinstance(item, dict) else None
+            if isinstance(content, str):
+                tokens += count_tokens(content, model_name)
+            else:
+                tokens += len(json.dumps(item, ensure_ascii=False, default=str)) // 4
+    return tokens + (max_output_tokens or _default_output_tokens)
+
+
+class ScheduledModel(Model):
+    """RequestScheduler を経由して呼び出しを行うモデルのラッパー"""
+
+    def __init__(self, model: Model, scheduler: RequestScheduler, model_name: str):
+        self.model = model
+        self.scheduler = scheduler
+        self.model_name = model_name
+
+    async def get_response(
+        self,
+        system_instructions: Optional[str],
+        input              : str | list[TResponseInputItem],
+        model_settings     : ModelSettings,
+        tools              : list[Tool],
+        output_schema      : Optional[AgentOutputSchemaBase],
+        handoffs           : list[Handoff],
+        tracing            : ModelTracing,
+        *,
+        previous_response_id: Optional[str] = None
+    ) -> ModelResponse:
+        estimated = estimate_request_tokens(system_instructions, input, model_settings.max_tokens, self.model_name)
+        started = time.perf_counter()
+        response = await self.scheduler.run(
+            lambda: self.model.get_response(
+                system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+                previous_response_id = previous_response_id
+            ),
+            estimated
+        )
+        # 待ち行列と再試行の待ち時間を含む、呼び出し元から見た所要時間
+        metrics.observe('model_call', time.perf_counter() - started, agent=current_agent_name(), model=self.model_name)
+        self.scheduler.record_usage(estimated, response.usage.total_tokens)
+        return response
+
+    async def stream_response(
+        self,
+        system_instructions: Optional[str],
+        input              : str | list[TResponseInputItem],
+        model_settings     : ModelSettings,
+        tools              : list[Tool],
+        output_schema      : Optional[AgentOutputSchemaBase],
+        handoffs           : list[Handoff],
+        tracing            : ModelTracing,
+        *,
+        previous_response_id: Optional[str] = None
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        # イベントを返し始めた後は呼び出し元に途中までの出力が渡っているため、再試行は最初のイベントより前のエラーに限る
+        estimated = estimate_request_tokens(system_instructions, input, model_settings.max_tokens, self.model_name)
+        labels = {'agent': current_agent_name(), 'model': self.model_name}
+        started = time.perf_counter()
+        attempt = 0
+        # 最後の response.completed イベントの usage（見積もりとの差をバケットに反映する）
+        actual_tokens = 0
+        while True:
+            first_event = True
+            try:
+                async with self.scheduler.slot(estimated):
+                    async for event in self.model.stream_response(
+                        system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+                        previous_response_id = previous_response_id
+                    ):
+                        if first_event:
+                            metrics.observe('model_ttfb', time.perf_counter() - started, **labels)
+                            first_event = False
+                        if event.type == "response.completed" and event.response.usage is not None:
+                            actual_tokens = event.response.usage.total_tokens
+                        yield event
+                self.scheduler.stats.completed += 1
+                break
+            except RETRYABLE_ERRORS as e:
+                if not first_event:
+                    self.scheduler.stats.failed += 1
+                    raise
+                delay = self.scheduler.next_retry(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+        metrics.observe('model_call', time.perf_counter() - started, **labels)
+        self.scheduler.record_usage(estimated, actual_tokens)
@@ -1,6 +1,6 @@
 import os
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,6 +11,143 @@ class AzureOpenAISettings:
     api_key    : str = os.getenv('AZURE_OPENAI_API_KEY')
     api_version: str = os.getenv('AZURE_OPENAI_API_VERSION')
 
+@dataclass
+class HttpClientSettings:
+    max_connections          : int   = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+    max_keepalive_connections: int   = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+    keepalive_expiry         : float = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30'))
+    timeout                  : float = float(os.getenv('HTTP_TIMEOUT', '600'))
+    http2                    : bool  = os.getenv('HTTP_HTTP2', 'true').lower() == 'true'
+
+@dataclass
+class SchedulerSettings:
+    max_concurrency      : int = int(os.getenv('SCHEDULER_MAX_CONCURRENCY', '16'))
+    requests_per_minute  : int = int(os.getenv('AZURE_OPENAI_RPM', '0'))
+    tokens_per_minute    : int = int(os.getenv('AZURE_OPENAI_TPM', '0'))
+    max_retries          : int = int(os.getenv('SCHEDULER_MAX_RETRIES', '5'))
+    default_output_tokens: int = int(os.getenv('SCHEDULER_DEFAULT_OUTPUT_TOKENS', '1000'))
+
+@dataclass
+class HistorySettings:
+    # ウィンドウ外に出た会話をバックグラウンドで要約するか
+    summarization       : bool = os.getenv('HISTORY_SUMMARIZATION', 'false').lower() == 'true'
+    # 未要約のメッセージがこの件数以上ウィンドウ外に出たら要約する
+    summary_min_messages: int  = int(os.getenv('HISTORY_SUMMARY_MIN_MESSAGES', '4'))
+
+@dataclass
+class ResponseCacheSettings:
+    # temperature=0 の呼び出し（トリアージなど）の応答をキャッシュするか（ストリーミングの呼び出しは対象外）
+    enabled    : bool  = os.getenv('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+    memory_size: int   = int(os.getenv('RESPONSE_CACHE_MEMORY_SIZE', '1024'))
+    db_path    : str   = os.getenv('RESPONSE_CACHE_DB_PATH', '')
+    ttl        : float = float(os.getenv('RESPONSE_CACHE_TTL', '86400'))
+    max_entries: int   = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '100000'))
+
+@dataclass
+class ServerSettings:
+    host                : str   = os.getenv('SERVER_HOST', '127.0.0.1')
+    port                : int   = int(os.getenv('SERVER_PORT', '8765'))
+    session_idle_timeout: float = float(os.getenv('SERVER_SESSION_IDLE_TIMEOUT', '1800'))
+    max_sessions        : int   = int(os.getenv('SERVER_MAX_SESSIONS', '10000'))
+
+@dataclass
+class LoggingSettings:
+    level       : str = os.getenv('LOG_LEVEL', 'DEBUG')
+    # text: 従来の1行形式、json: 1行1JSONの構造化ログ
+    format      : str = os.getenv('LOG_FORMAT', 'text')
+    max_bytes   : int = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+    backup_count: int = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+
+@dataclass
+class MetricsSettings:
+    enabled: bool = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    # 終了時に集計結果を書き出すファイル（.prom ならPrometheus形式、それ以外はJSON。空なら書き出さない）
+    file   : str  = os.getenv('METRICS_FILE', '')
+    # Prometheus形式のテキストを返すHTTPエンドポイントのポート（0なら起動しない）
+    port   : int  = int(os.getenv('METRICS_PORT', '0'))
+
+@dataclass
+class KaggleSettings:
+    username  : str = os.getenv('KAGGLE_USERNAME', '')
+    key       : str = os.getenv('KAGGLE_KEY', '')
+    # file:// で始まる場合はローカルのディレクトリを Kaggle の代わりに使う
+    api_base  : str = os.getenv('KAGGLE_API_BASE', 'https://www.kaggle.com/api/v1')
+    cache_dir : str = os.getenv('KAGGLE_CACHE_DIR', './data/kaggle')
+    chunk_size: int = int(os.getenv('KAGGLE_CHUNK_SIZE', str(8 * 1024 * 1024)))
+
+@dataclass
+class DeploymentPoolSettings:
+    # 論理モデル名ごとのデプロイメントの一覧（YAML、空なら AZURE_OPENAI_* の単一のデプロイメントを使う）
+    config_file      : str   = os.getenv('DEPLOYMENT_POOL_FILE', '')
+    # least_outstanding（処理中の呼び出し数が最小）または ewma（レイテンシーの指数移動平均 × 処理中の呼び出し数）
+    routing          : str   = os.getenv('DEPLOYMENT_POOL_ROUTING', 'least_outstanding')
+    ewma_alpha       : float = float(os.getenv('DEPLOYMENT_POOL_EWMA_ALPHA', '0.3'))
+    # 連続してこの回数失敗したデプロイメントを一時的に外す（外す時間は繰り返すたびに倍、上限あり）
+    eject_failures   : int   = int(os.getenv('DEPLOYMENT_POOL_EJECT_FAILURES', '3'))
+    eject_seconds    : float = float(os.getenv('DEPLOYMENT_POOL_EJECT_SECONDS', '10'))
+    max_eject_seconds: float = float(os.getenv('DEPLOYMENT_POOL_MAX_EJECT_SECONDS', '300'))
+    # 応答がこのパーセンタイル（0〜1）の所要時間を超えたら別のデプロイメントにも同じ呼び出しを送る（0なら無効）
+    hedge_percentile : float = float(os.getenv('DEPLOYMENT_POOL_HEDGE_PERCENTILE', '0'))
+    hedge_min_delay  : float = float(os.getenv('DEPLOYMENT_POOL_HEDGE_MIN_DELAY', '0.5'))
+    # パーセンタイルを信頼できるまでの観測数（これより少ない間はヘッジしない）
+    hedge_min_samples: int   = int(os.getenv('DEPLOYMENT_POOL_HEDGE_MIN_SAMPLES', '20'))
+
+@dataclass
+class BatchSettings:
+    # 同時に処理するレコード数（モデル呼び出しの同時実行数はスケジューラーで別に制限される）
+    concurrency   : int   = int(os.getenv('BATCH_CONCURRENCY', '32'))
+    # 1レコードの処理のタイムアウト（秒、0なら無制限）
+    timeout       : float = float(os.getenv('BATCH_TIMEOUT', '300'))
+    # 出力ファイルを fsync する間隔（レコード数）
+    fsync_interval: int   = int(os.getenv('BATCH_FSYNC_INTERVAL', '100'))
+
+@dataclass
+class SandboxSettings:
+    # 待機させておくワーカープロセスの数
+    workers       : int   = int(os.getenv('SANDBOX_WORKERS', '2'))
+    # ワーカーが起動時に読み込んでおくモジュール（カンマ区切り、インストールされていないものは無視する）
+    preload       : str   = os.getenv('SANDBOX_PRELOAD', 'numpy,pandas')
+    # 1回の実行の上限（経過時間とCPU時間は秒、メモリはワーカー全体の仮想メモリ）
+    timeout       : float = float(os.getenv('SANDBOX_TIMEOUT', '30'))
+    cpu_seconds   : float = float(os.getenv('SANDBOX_CPU_SECONDS', '20'))
+    memory_mb     : int   = int(os.getenv('SANDBOX_MEMORY_MB', '2048'))
+    # 標準出力と結果の値として返す最大文字数
+    max_output    : int   = int(os.getenv('SANDBOX_MAX_OUTPUT', '8000'))
+    # この回数実行したワーカーは入れ替える（実行したコードの影響を残さないため）
+    max_executions: int   = int(os.getenv('SANDBOX_MAX_EXECUTIONS', '100'))
+
+@dataclass
+class SemanticCacheSettings:
+    enabled      : bool  = os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() == 'true'
+    # ベクトルと転送先を保存するディレクトリ（空ならメモリ上のみ）
+    directory    : str   = os.getenv('SEMANTIC_CACHE_DIR', '')
+    # 登録した転送先をこの秒数ごとにまとめてファイルに書き出す（0以下なら登録のたびに書き出す）
+    save_interval: float = float(os.getenv('SEMANTIC_CACHE_SAVE_INTERVAL', '5.0'))
+    capacity     : int   = int(os.getenv('SEMANTIC_CACHE_CAPACITY', '4096'))
+    dim          : int   = int(os.getenv('SEMANTIC_CACHE_DIM', '1024'))
+    # この値以上のコサイン類似度の質問があれば、その転送先を再利用する
+    threshold    : float = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.8'))
+
+@dataclass
+class SessionStoreSettings:
+    # 会話履歴を保存するディレクトリ（空なら保存しない）
+    directory     : str   = os.getenv('SESSION_STORE_DIR', '')
+    # 書き込んだログをまとめて fsync する間隔（秒、0 なら書き込みのたびに fsync する）
+    fsync_interval: float = float(os.getenv('SESSION_STORE_FSYNC_INTERVAL', '1.0'))
+
 @dataclass
 class Settings:
-    azure_openai: AzureOpenAISettings = AzureOpenAISettings()
\ No newline at end of file
+    azure_openai   : AzureOpenAISettings    = field(default_factory=AzureOpenAISettings)
+    http           : HttpClientSettings     = field(default_factory=HttpClientSettings)
+    scheduler      : SchedulerSettings      = field(default_factory=SchedulerSettings)
+    history        : HistorySettings        = field(default_factory=HistorySettings)
+    response_cache : ResponseCacheSettings  = field(default_factory=ResponseCacheSettings)
+    server         : ServerSettings         = field(default_factory=ServerSettings)
+    logging        : LoggingSettings        = field(default_factory=LoggingSettings)
+    metrics        : MetricsSettings        = field(default_factory=MetricsSettings)
+    kaggle         : KaggleSettings         = field(default_factory=KaggleSettings)
+    batch          : BatchSettings          = field(default_factory=BatchSettings)
+    deployment_pool: DeploymentPoolSettings = field(default_factory=DeploymentPoolSettings)
+    sandbox        : SandboxSettings        = field(default_factory=SandboxSettings)
+    semantic_cache : SemanticCacheSettings  = field(default_factory=SemanticCacheSettings)
+    session_store  : SessionStoreSettings   = field(default_factory=SessionStoreSettings)
\ No newline at end of file
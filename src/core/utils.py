@@ -0,0 +1,66 @@
+import asyncio
+import threading
+from functools import lru_cache
+from typing import Any, Optional
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model_name: str) -> Optional[Any]:
+    """tiktokenのエンコーディングを取得（未インストールの場合はNone）"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding('o200k_base')
+
+
+def count_tokens(text: str, model_name: str = 'gpt-4o-mini') -> int:
+    """
+    テキストのトークン数を数える
+
+    tiktokenがインストールされていればモデルのエンコーディングで正確に数え、
+    なければ英数字は4文字、それ以外（日本語など）は1文字を1トークンとして概算する。
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding(model_name)
+    if encoding is not None:
+        return len(encoding.encode(text))
+
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+async def ainput(prompt: str = '') -> str:
+    """
+    イベントループを止めずに標準入力から1行読み込む
+
+    入力待ちはデーモンスレッドで行うため、待機中もバックグラウンドのタスクが進み、
+    終了時に入力待ちのスレッドがプロセスの終了を妨げることもない。
+    """
+    loop = asyncio.get_running_loop()
+    future: asyncio.Future[str] = loop.create_future()
+
+    def _resolve(result: Optional[str], error: Optional[BaseException]) -> None:
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _read() -> None:
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(_resolve, None, e)
+        else:
+            loop.call_soon_threadsafe(_resolve, line, None)
+
+    threading.Thread(target=_read, name='stdin-reader', daemon=True).start()
+    return await future
@@ -1,26 +1,163 @@
+import hashlib
+import importlib.util
+import threading
+from typing import Any, Optional
+
+import httpx
 from openai import AzureOpenAI
 from openai import AsyncAzureOpenAI
+from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
 
+from src.core.logger import apllog
 from src.core.settings import Settings
 
 class AzureClient:
+    """
+    プロセス全体で共有するAzure OpenAIクライアントのレジストリー
+
+    エンドポイントとAPIバージョン、APIキーごとにクライアントを1つだけ生成し、
+    接続数を明示的に設定したhttpxのコネクションプールを使い回す。
+    """
 
     st = Settings()
 
+    _async_clients: dict[tuple[str, str, str], AsyncAzureOpenAI] = {}
+    _sync_clients : dict[tuple[str, str, str], AzureOpenAI] = {}
+    _client_stats : dict[tuple[str, str, str, str], dict[str, int]] = {}
+    _lock = threading.Lock()
+
     @classmethod
-    def openai_client(cls) -> AzureOpenAI:
-        """Azure OpenAI Client"""
-        return AzureOpenAI(
-            azure_endpoint = str(cls.st.azure_openai.endpoint),
-            api_key        = cls.st.azure_openai.api_key,
-            api_version    = cls.st.azure_openai.api_version
+    def _http_options(cls) -> dict[str, Any]:
+        """httpxクライアントの接続プール設定"""
+        http = cls.st.http
+        # HTTP/2 は h2 パッケージがインストールされている場合のみ有効にする
+        http2 = http.http2 and importlib.util.find_spec('h2') is not None
+        return {
+            'limits' : httpx.Limits(
+                max_connections           = http.max_connections,
+                max_keepalive_connections = http.max_keepalive_connections,
+                keepalive_expiry          = http.keepalive_expiry
+            ),
+            'timeout': httpx.Timeout(http.timeout, connect=10.0),
+            'http2'  : http2,
+        }
+
+    @classmethod
+    def _client_key(
+        cls, endpoint: Optional[str], api_key: Optional[str], api_version: Optional[str]
+    ) -> tuple[str, str, str]:
+        # APIキーはそのまま保持せず、ハッシュの先頭を識別子として使う（ログや統計にも出力されるため）
+        key_id = hashlib.sha256(str(api_key or cls.st.azure_openai.api_key).encode('utf-8')).hexdigest()[:16]
+        return (
+            str(endpoint or cls.st.azure_openai.endpoint),
+            str(api_version or cls.st.azure_openai.api_version),
+            key_id
         )
-    
+
+    @classmethod
+    def _count(cls, kind: str, key: tuple[str, str, str], event: str) -> None:
+        stats = cls._client_stats.setdefault((kind, *key), {'created': 0, 'reused': 0})
+        stats[event] += 1
+
     @classmethod
-    def async_openai_client(cls) -> AsyncAzureOpenAI:
+    def openai_client(
+        cls,
+        endpoint   : Optional[str] = None,
+        api_key    : Optional[str] = None,
+        api_version: Optional[str] = None
+    ) -> AzureOpenAI:
+        """Azure OpenAI Client"""
+        key = cls._client_key(endpoint, api_key, api_version)
+        with cls._lock:
+            client = cls._sync_clients.get(key)
+            if client is not None:
+                cls._count('sync', key, 'reused')
+                return client
+
+            client = AzureOpenAI(
+                azure_endpoint = key[0],
+                api_key        = api_key or cls.st.azure_openai.api_key,
+                api_version    = key[1],
+                http_client    = DefaultHttpxClient(**cls._http_options())
+            )
+            cls._sync_clients[key] = client
+            cls._count('sync', key, 'created')
+            apllog().debug(f"Azure OpenAI クライアントを生成しました: {key}")
+            return client
+
+    @classmethod
+    def async_openai_client(
+        cls,
+        endpoint   : Optional[str] = None,
+        api_key    : Optional[str] = None,
+        api_version: Optional[str] = None
+    ) -> AsyncAzureOpenAI:
         """Async Azure OpenAI Client"""
-        return AsyncAzureOpenAI(
-            azure_endpoint = cls.st.azure_openai.endpoint,
-            api_key        = cls.st.azure_openai.api_key,
-            api_version    = cls.st.azure_openai.api_version
-        )
\ No newline at end of file
+        key = cls._client_key(endpoint, api_key, api_version)
+        with cls._lock:
+            client = cls._async_clients.get(key)
+            if client is not None:
+                cls._count('async', key, 'reused')
+                return client
+
+            client = AsyncAzureOpenAI(
+                azure_endpoint = key[0],
+                api_key        = api_key or cls.st.azure_openai.api_key,
+                api_version    = key[1],
+                http_client    = DefaultAsyncHttpxClient(**cls._http_options())
+            )
+            cls._async_clients[key] = client
+            cls._count('async', key, 'created')
+            apllog().debug(f"Azure OpenAI 非同期クライアントを生成しました: {key}")
+            return client
+
+    @staticmethod
+    def _connection_stats(http_client: Any) -> dict[str, int]:
+        """httpxのコネクションプールの接続数（取得できない場合は空）"""
+        pool = getattr(getattr(http_client, '_transport', None), '_pool', None)
+        connections = getattr(pool, 'connections', None)
+        if connections is None:
+            return {}
+        return {
+            'connections': len(connections),
+            'idle'       : sum(1 for connection in connections if connection.is_idle()),
+        }
+
+    @classmethod
+    def pool_stats(cls) -> list[dict[str, Any]]:
+        """クライアントごとの生成/再利用回数とコネクションプールの状態を取得"""
+        stats = []
+        with cls._lock:
+            clients = [('async', key, client) for key, client in cls._async_clients.items()]
+            clients += [('sync', key, client) for key, client in cls._sync_clients.items()]
+            for kind, key, client in clients:
+                stats.append({
+                    'kind'       : kind,
+                    'endpoint'   : key[0],
+                    'api_version': key[1],
+                    'key_id'     : key[2],
+                    **cls._client_stats.get((kind, *key), {}),
+                    **cls._connection_stats(getattr(client, '_client', None)),
+                })
+        return stats
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """共有クライアントをすべて閉じる（シャットダウン時に呼び出す）"""
+        with cls._lock:
+            async_clients = list(cls._async_clients.values())
+            cls._async_clients.clear()
+        for client in async_clients:
+            await client.close()
+        cls.close()
+
+    @classmethod
+    def close(cls) -> None:
+        """同期クライアントをすべて閉じる"""
+        with cls._lock:
+            sync_clients = list(cls._sync_clients.values())
+            cls._sync_clients.clear()
+        for client in sync_clients:
+            client.close()
+        if sync_clients:
+            apllog().debug("Azure OpenAI クライアントを閉じました")
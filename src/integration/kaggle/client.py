@@ -0,0 +1,310 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator, Optional
+from urllib.parse import quote, unquote, urlparse
+
+import httpx
+
+from src.core.logger import apllog
+from src.core.settings import KaggleSettings, Settings
+from src.integration.kaggle.reader import iter_batches
+
+class KaggleDownloadError(Exception):
+    """データセットのダウンロードに失敗した場合のエラー"""
+
+@dataclass
+class CachedFile:
+    """キャッシュ済みのデータセットのファイル"""
+    dataset  : str
+    file_name: str
+    path     : Path
+    sha256   : str
+    size     : int
+
+    @property
+    def format(self) -> str:
+        """ファイル名の拡張子から判定した形式（csv / parquet など）"""
+        return Path(self.file_name).suffix.lstrip('.').lower()
+
+class DatasetCache:
+    """
+    内容のハッシュで管理するデータセットのローカルキャッシュ
+
+    blobs/<sha256の先頭2文字>/<sha256> に内容を1つだけ保存し、refs/<owner>/<dataset>/<ファイル名>.json から参照する。
+    同じ内容のファイルは別のデータセットやバージョンからも共有され、ダウンロード途中のファイルは tmp/ に置く。
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.blobs_dir = self.root / "blobs"
+        self.refs_dir = self.root / "refs"
+        self.tmp_dir = self.root / "tmp"
+        for directory in (self.blobs_dir, self.refs_dir, self.tmp_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.blobs_dir / sha256[:2] / sha256
+
+    def _ref_path(self, dataset: str, file_name: str) -> Path:
+        return self.refs_dir / dataset / f"{quote(file_name, safe='')}.json"
+
+    def partial_path(self, dataset: str, file_name: str) -> Path:
+        """ダウンロード途中のファイルのパス（再開時も同じパスになる）"""
+        key = hashlib.sha256(f"{dataset}/{file_name}".encode('utf-8')).hexdigest()
+        return self.tmp_dir / f"{key}.partial"
+
+    def lookup(self, dataset: str, file_name: str) -> Optional[dict[str, Any]]:
+        """参照と内容がそろっていれば参照情報を返す"""
+        ref_path = self._ref_path(dataset, file_name)
+        try:
+            ref = json.loads(ref_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+        if not self.blob_path(ref['sha256']).exists():
+            return None
+        return ref
+
+    def commit(self, dataset: str, file_name: str, source: Path, sha256: str, size: int, etag: Optional[str]) -> CachedFile:
+        """ダウンロードしたファイルを内容のハッシュの位置に移し、参照を更新する"""
+        blob = self.blob_path(sha256)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        if blob.exists():
+            # 同じ内容がすでにあれば共有する
+            source.unlink(missing_ok=True)
+        else:
+            os.replace(source, blob)
+
+        ref_path = self._ref_path(dataset, file_name)
+        ref_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_ref = ref_path.with_suffix('.json.tmp')
+        tmp_ref.write_text(json.dumps({'sha256': sha256, 'size': size, 'etag': etag}), encoding='utf-8')
+        os.replace(tmp_ref, ref_path)
+        return CachedFile(dataset=dataset, file_name=file_name, path=blob, sha256=sha256, size=size)
+
+    def to_cached_file(self, dataset: str, file_name: str, ref: dict[str, Any]) -> CachedFile:
+        return CachedFile(
+            dataset   = dataset,
+            file_name = file_name,
+            path      = self.blob_path(ref['sha256']),
+            sha256    = ref['sha256'],
+            size      = ref['size']
+        )
+
+class KaggleClient:
+    """
+    Kaggle のデータセットのファイルをダウンロードし、ローカルのキャッシュから読み込むクライアント
+
+    ファイルは一度ダウンロードすればセッションをまたいで再利用し、ダウンロードが中断した場合は
+    Range リクエストで続きから再開する。読み込みは全体をメモリに載せず、バッチ単位で行う。
+    KAGGLE_API_BASE に file:// のディレクトリを指定すると、<dir>/<owner>/<dataset>/<ファイル名> を Kaggle の代わりに使う。
+    """
+
+    def __init__(self, settings: Optional[KaggleSettings] = None, cache: Optional[DatasetCache] = None):
+        self.st = settings or Settings().kaggle
+        self.cache = cache or DatasetCache(self.st.cache_dir)
+        self._http: Optional[httpx.Client] = None
+        # 同じファイルを同時にダウンロードしないためのロック
+        self._locks: dict[tuple[str, str], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _client(self) -> httpx.Client:
+        if self._http is None:
+            auth = (self.st.username, self.st.key) if self.st.username else None
+            self._http = httpx.Client(
+                auth            = auth,
+                follow_redirects = True,
+                timeout         = httpx.Timeout(60.0, connect=10.0)
+            )
+        return self._http
+
+    def _lock_for(self, dataset: str, file_name: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault((dataset, file_name), threading.Lock())
+
+    def get_file(self, dataset: str, file_name: str, refresh: bool = False) -> CachedFile:
+        """
+        データセットのファイルをキャッシュから取得する（なければダウンロードする）
+
+        引数:
+            dataset: データセット（owner/dataset-name）
+            file_name: データセット内のファイル名
+            refresh: キャッシュがあっても更新を確認する（ETag が同じなら再ダウンロードしない）
+
+        戻り値:
+            キャッシュ済みのファイル
+        """
+        with self._lock_for(dataset, file_name):
+            ref = self.cache.lookup(dataset, file_name)
+            if ref is not None and not refresh:
+                apllog().debug(f"データセットのキャッシュを使用します: {dataset}/{file_name}")
+                return self.cache.to_cached_file(dataset, file_name, ref)
+
+            if self.st.api_base.startswith('file://'):
+                return self._copy_local(dataset, file_name, ref)
+            return self._download(dataset, file_name, ref)
+
+    async def aget_file(self, dataset: str, file_name: str, refresh: bool = False) -> CachedFile:
+        """get_file をイベントループを止めずに実行する"""
+        return await asyncio.to_thread(self.get_file, dataset, file_name, refresh)
+
+    def iter_batches(
+        self,
+        dataset   : str,
+        file_name : str,
+        batch_size: int = 65536,
+        columns   : Optional[list[str]] = None
+    ) -> Iterator[Any]:
+        """ファイルをバッチ単位で読み込む（pyarrow があれば RecordBatch、なければ dict のリスト）"""
+        cached = self.get_file(dataset, file_name)
+        return iter_batches(cached.path, cached.format, batch_size=batch_size, columns=columns)
+
+    def _file_url(self, dataset: str, file_name: str) -> str:
+        return f"{self.st.api_base.rstrip('/')}/datasets/download/{dataset}/{quote(file_name)}"
+
+    def _download(self, dataset: str, file_name: str, ref: Optional[dict[str, Any]]) -> CachedFile:
+        url = self._file_url(dataset, file_name)
+        partial = self.cache.partial_path(dataset, file_name)
+        meta_path = partial.with_suffix('.json')
+        meta = self._read_meta(meta_path)
+
+        headers = {}
+        offset = partial.stat().st_size if partial.exists() else 0
+        if offset and meta.get('url') == url:
+            headers['Range'] = f"bytes={offset}-"
+            if meta.get('etag'):
+                headers['If-Range'] = meta['etag']
+        else:
+            offset = 0
+        if ref is not None and ref.get('etag') and not offset:
+            headers['If-None-Match'] = ref['etag']
+
+        try:
+            with self._client().stream('GET', url, headers=headers) as response:
+                if response.status_code == 304 and ref is not None:
+                    apllog().debug(f"データセットは更新されていません: {dataset}/{file_name}")
+                    return self.cache.to_cached_file(dataset, file_name, ref)
+                if response.status_code == 416 and offset:
+                    if offset == meta.get('size') and self._total_size(response, offset) in (None, offset):
+                        # 前回のダウンロードは完了していた
+                        return self._finish(dataset, file_name, partial, meta_path, meta.get('etag'), response.headers)
+                    # 途中のファイルがサーバー上のファイルと合わないため、破棄して最初からダウンロードし直す
+                    apllog().warning(
+                        f"ダウンロード途中のファイルのサイズが一致しないため最初からやり直します: "
+                        f"{dataset}/{file_name}（{offset} バイト、前回の全体 {meta.get('size')} バイト）"
+                    )
+                    response.close()
+                    partial.unlink(missing_ok=True)
+                    meta_path.unlink(missing_ok=True)
+                    return self._download(dataset, file_name, ref)
+                if response.status_code not in (200, 206):
+                    raise KaggleDownloadError(f"{dataset}/{file_name} のダウンロードに失敗しました: HTTP {response.status_code}")
+
+                resumed = response.status_code == 206
+                if not resumed:
+                    offset = 0
+                etag = response.headers.get('etag')
+                total = self._total_size(response, offset)
+                self._write_meta(meta_path, {'url': url, 'etag': etag, 'size': total})
+
+                apllog().info(
+                    f"データセットをダウンロードします: {dataset}/{file_name}"
+                    f"（{'再開 ' + str(offset) + ' バイト目から' if resumed else '最初から'}、全体 {total} バイト）"
+                )
+                with open(partial, 'ab' if resumed else 'wb') as f:
+                    for chunk in response.iter_bytes(self.st.chunk_size):
+                        f.write(chunk)
+        except httpx.HTTPError as e:
+            # 途中まで書いたファイルは残し、次回はその続きから再開する
+            raise KaggleDownloadError(f"{dataset}/{file_name} のダウンロードが中断しました: {e}") from e
+
+        return self._finish(dataset, file_name, partial, meta_path, etag, response.headers)
+
+    def _copy_local(self, dataset: str, file_name: str, ref: Optional[dict[str, Any]]) -> CachedFile:
+        """ローカルのディレクトリをダウンロード元として、チャンク単位でキャッシュにコピーする"""
+        source = Path(unquote(urlparse(self.st.api_base).path)) / dataset / file_name
+        if not source.exists():
+            raise KaggleDownloadError(f"{source} が見つかりません")
+
+        stat = source.stat()
+        etag = f"{stat.st_size}-{stat.st_mtime_ns}"
+        if ref is not None and ref.get('etag') == etag:
+            return self.cache.to_cached_file(dataset, file_name, ref)
+
+        partial = self.cache.partial_path(dataset, file_name)
+        with open(source, 'rb') as src, open(partial, 'wb') as dst:
+            shutil.copyfileobj(src, dst, self.st.chunk_size)
+        return self._finish(dataset, file_name, partial, partial.with_suffix('.json'), etag, {})
+
+    def _finish(self, dataset: str, file_name: str, partial: Path, meta_path: Path, etag: Optional[str], headers: Any) -> CachedFile:
+        """ダウンロードしたファイルを検証してキャッシュに登録する（zip で届いた場合は目的のファイルを取り出す）"""
+        expected = self._read_meta(meta_path).get('size')
+        size = partial.stat().st_size
+        if expected is not None and size != expected:
+            raise KaggleDownloadError(f"{dataset}/{file_name} のサイズが一致しません: {size} != {expected}")
+
+        if not file_name.lower().endswith('.zip') and zipfile.is_zipfile(partial):
+            partial = self._extract_member(partial, file_name)
+            size = partial.stat().st_size
+
+        sha256 = self._hash_file(partial)
+        cached = self.cache.commit(dataset, file_name, partial, sha256, size, etag)
+        meta_path.unlink(missing_ok=True)
+        apllog().info(f"データセットをキャッシュしました: {dataset}/{file_name}（{size} バイト、sha256 {sha256[:12]}）")
+        return cached
+
+    def _extract_member(self, archive: Path, file_name: str) -> Path:
+        """zip から目的のファイルをチャンク単位で取り出す"""
+        extracted = archive.with_suffix('.extracted')
+        with zipfile.ZipFile(archive) as zf:
+            names = zf.namelist()
+            member = file_name if file_name in names else next(
+                (name for name in names if Path(name).name == Path(file_name).name), None
+            )
+            if member is None and len(names) == 1:
+                # 単一ファイルのデータセットは zip で届くことがある
+                member = names[0]
+            if member is None:
+                raise KaggleDownloadError(f"zip に {file_name} が含まれていません: {names[:10]}")
+            with zf.open(member) as src, open(extracted, 'wb') as dst:
+                shutil.copyfileobj(src, dst, self.st.chunk_size)
+        archive.unlink()
+        return extracted
+
+    def _hash_file(self, path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(self.st.chunk_size):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _total_size(response: httpx.Response, offset: int) -> Optional[int]:
+        content_range = response.headers.get('content-range')
+        if content_range and '/' in content_range:
+            total = content_range.rsplit('/', 1)[1]
+            return int(total) if total.isdigit() else None
+        length = response.headers.get('content-length')
+        return offset + int(length) if length and length.isdigit() else None
+
+    @staticmethod
+    def _read_meta(meta_path: Path) -> dict[str, Any]:
+        try:
+            return json.loads(meta_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_meta(meta_path: Path, meta: dict[str, Any]) -> None:
+        meta_path.write_text(json.dumps(meta), encoding='utf-8')
+
+    def close(self) -> None:
+        if self._http is not None:
+            self._http.close()
+            self._http = None
@@ -0,0 +1,89 @@
+import csv
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+
+def _import_pyarrow():
+    """pyarrow は任意の依存関係のため、使う時点で読み込む"""
+    try:
+        import pyarrow  # noqa: F401
+        return pyarrow
+    except ImportError:
+        return None
+
+
+def iter_batches(
+    path      : str | Path,
+    format    : str,
+    batch_size: int = 65536,
+    columns   : Optional[list[str]] = None
+) -> Iterator[Any]:
+    """
+    データセットのファイルを全体をメモリに載せずにバッチ単位で読み込む
+
+    引数:
+        path: ファイルのパス
+        format: ファイルの形式（csv / tsv / parquet）
+        batch_size: 1バッチの行数
+        columns: 読み込む列（省略時はすべての列）
+
+    戻り値:
+        バッチのイテレーター（pyarrow があれば RecordBatch、なければ dict のリスト）
+    """
+    format = format.lower()
+    if format in ('parquet', 'pq'):
+        return _iter_parquet(Path(path), batch_size, columns)
+    if format in ('csv', 'tsv'):
+        delimiter = '\t' if format == 'tsv' else ','
+        if _import_pyarrow() is not None:
+            return _iter_csv_arrow(Path(path), batch_size, columns, delimiter)
+        return _iter_csv(Path(path), batch_size, columns, delimiter)
+    raise ValueError(f"バッチ読み込みに対応していない形式です: {format}")
+
+
+def _iter_parquet(path: Path, batch_size: int, columns: Optional[list[str]]) -> Iterator[Any]:
+    if _import_pyarrow() is None:
+        raise ImportError("Parquet の読み込みには pyarrow が必要です（pip install pyarrow）")
+    import pyarrow.parquet as pq
+
+    # メモリマップで開き、必要な行グループだけを読み込む
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    yield from parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+
+
+def _iter_csv_arrow(path: Path, batch_size: int, columns: Optional[list[str]], delimiter: str) -> Iterator[Any]:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    reader = pacsv.open_csv(
+        path,
+        parse_options   = pacsv.ParseOptions(delimiter=delimiter),
+        convert_options = pacsv.ConvertOptions(include_columns=columns) if columns else None
+    )
+    # open_csv のバッチはブロック単位のため、指定の行数にそろえ直す
+    pending = []
+    pending_rows = 0
+    for batch in reader:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= batch_size:
+            table = pa.Table.from_batches(pending)
+            yield from table.slice(0, batch_size).combine_chunks().to_batches()
+            rest = table.slice(batch_size)
+            pending = rest.to_batches()
+            pending_rows = rest.num_rows
+    if pending_rows:
+        yield from pa.Table.from_batches(pending).combine_chunks().to_batches()
+
+
+def _iter_csv(path: Path, batch_size: int, columns: Optional[list[str]], delimiter: str) -> Iterator[list[dict[str, str]]]:
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f, delimiter=delimiter)
+        batch = []
+        for row in reader:
+            batch.append({name: row[name] for name in columns} if columns else row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
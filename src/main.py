@@ -1,11 +1,19 @@
+import argparse
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
 import asyncio
-from agents import Runner
-from agents import set_tracing_disabled
+import openai
+from agents import AgentsException, set_tracing_disabled
 
 from src.core.prompt_manager import prompt_manager
+from src.core.model_factory import ModelConfiguration
 from src.core.logger import apllog, init_apl_logger
+from src.core.metrics import metrics
+from src.core.sandbox import code_sandbox
+from src.core.settings import Settings
+from src.core.utils import ainput
+from src.integration.azure.client import AzureClient
 
 # 初期化
 ## traceを無効化
@@ -19,45 +27,169 @@ root_dir = Path(__file__).parent.parent
 prompt_dir = root_dir / "config" / "prompt"
 prompt_manager.initialize(prompt_dir)
 
+## LLMを使わないルーティングのルール
+routing_config = root_dir / "config" / "routing" / "triage.yaml"
+
 ## Agentのインスタンス化/レジストリに登録
 import src.ai_agents
-from ai_agents.registry import agent_registry
-from ai_agents.context import AgentContext
-
-
-async def main() -> None:
-
-    context = AgentContext()
-    context.history = []  
+from src.ai_agents.registry import agent_registry
+from src.ai_agents.context import AgentContext
+from src.ai_agents.conversation import stream_turn
+from src.ai_agents.session_store import SessionStore
+from src.ai_agents.summary.summarizer import HistorySummarizer
+from src.ai_agents.triage.fast_router import FastPathRouter
+
+# サーバーやバッチ、メトリクスのエンドポイントのモジュールは、そのモードで起動したときに初めて読み込む
+if TYPE_CHECKING:
+    from src.server.metrics_endpoint import MetricsEndpoint
+
+
+async def start_metrics() -> Optional['MetricsEndpoint']:
+    """設定されていればメトリクスのエンドポイントを起動する（ポートが未設定なら None）"""
+    st = Settings()
+    if st.metrics.port <= 0:
+        return None
+    from src.server.metrics_endpoint import MetricsEndpoint
+
+    endpoint = MetricsEndpoint()
+    await endpoint.start(st.server.host, st.metrics.port)
+    return endpoint
+
+async def stop_metrics(endpoint: Optional['MetricsEndpoint']) -> None:
+    """エンドポイントを閉じ、設定されていれば集計結果をファイルに書き出す"""
+    if endpoint is not None:
+        await endpoint.close()
+    metrics_file = Settings().metrics.file
+    if metrics_file:
+        apllog().info(f"メトリクスを書き出しました: {metrics.write(metrics_file)}")
+
+async def main(session_id: str) -> None:
+
+    # 保存先が設定されていれば、前回の会話の続きから再開する
+    store = SessionStore.from_settings()
+    context = AgentContext(history=store.load(session_id)) if store is not None else AgentContext()
     first_agent = agent_registry.get_agent("triage_agent")
+    router = FastPathRouter.from_config(routing_config)
+
+    # ウィンドウ外に出た会話の要約（有効な場合のみ）
+    summarizer = HistorySummarizer() if ModelConfiguration.default().history_summarization else None
+    metrics_endpoint = await start_metrics()
 
     try:
         while True:
-            # 1️⃣ ユーザー入力を取得
-            user_input = input("👤> ").strip()
+            # 1️⃣ ユーザー入力を取得（入力待ちの間もバックグラウンドの要約が進むようイベントループは止めない）
+            user_input = (await ainput("👤> ")).strip()
             if user_input == "":
                 continue  # 空行ならスキップ
 
-            # 2️⃣ history に追加（ユーザー側）
-            context.history.append({"role": "user", "content": user_input})
+            # 2️⃣ Runner で推論し、生成されたトークンを届いた順に表示（ユーザー入力と応答は history に追加される）
+            print("🤖>", end=" ", flush=True)
+            try:
+                await stream_turn(
+                    context, first_agent, user_input,
+                    on_delta = lambda delta: print(delta, end="", flush=True),
+                    router   = router
+                )
+            except (openai.APIError, AgentsException) as e:
+                # 再試行しても失敗したターンはエラーを表示し、チャットは続ける
+                apllog().error(f"応答の生成に失敗しました: {type(e).__name__}: {e}")
+                print(f"\n⚠️ 応答を生成できませんでした（{type(e).__name__}）。もう一度入力してください。")
+                continue
+
+            # 3️⃣ 応答の表示を終える
+            print()
+
+            # 4️⃣ ウィンドウ外に出たターンを次の入力待ちの間に要約
+            if summarizer is not None:
+                summarizer.schedule(context.history)
+
+    except (KeyboardInterrupt, EOFError, asyncio.CancelledError):
+        # Ctrl+C を受け取ったら優雅に終了
+        if store is not None:
+            print(f"\n🛑 チャットを終了しました。履歴は {store.path_for(session_id)} に保存されています。")
+        else:
+            print("\n🛑 チャットを終了しました。")
+    finally:
+        if summarizer is not None:
+            await summarizer.aclose()
+        if store is not None:
+            await store.close()
+        await router.close()
+        await stop_metrics(metrics_endpoint)
+        await code_sandbox.close()
+        # 共有しているHTTPコネクションプールを閉じる
+        await AzureClient.aclose()
+
+async def serve(mode: str, host: str, port: int) -> None:
+    """複数セッションを1プロセスで処理するサーバーモード"""
+    from src.server.jsonl_server import JsonlServer
+    from src.server.session_manager import SessionManager
+
+    st = Settings().server
+    sessions = SessionManager(
+        idle_timeout = st.session_idle_timeout,
+        max_sessions = st.max_sessions,
+        summarizer   = HistorySummarizer() if ModelConfiguration.default().history_summarization else None,
+        store        = SessionStore.from_settings()
+    )
+    router = FastPathRouter.from_config(routing_config)
+    server = JsonlServer(sessions, agent_registry.get_agent("triage_agent"), router)
+    metrics_endpoint = await start_metrics()
 
-            # 3️⃣ Runner で推論（同期版なので普通の関数呼び出し）
-            result = await Runner.run(
-                starting_agent=first_agent,
-                input=context.history,   # ← 過去ログごと渡す
-                context=context,
-            )
+    try:
+        if mode == "tcp":
+            await server.serve_tcp(host, port)
+        else:
+            await server.serve_stdio()
+    finally:
+        await router.close()
+        await stop_metrics(metrics_endpoint)
+        await code_sandbox.close()
+        await AzureClient.aclose()
+
+async def batch(input_path: str, output_path: str, concurrency: int) -> None:
+    """JSONL ファイルの質問をまとめて処理するバッチモード"""
+    from src.server.batch_runner import BatchRunner
+
+    st = Settings().batch
+    router = FastPathRouter.from_config(routing_config)
+    runner = BatchRunner(
+        agent_registry.get_agent("triage_agent"),
+        router         = router,
+        concurrency    = concurrency,
+        timeout        = st.timeout,
+        fsync_interval = st.fsync_interval
+    )
+    metrics_endpoint = await start_metrics()
 
-            # 4️⃣ 最終出力を取り出して表示
-            ai_reply: str = result.final_output  # type: ignore
-            print("🤖>", ai_reply)
+    try:
+        await runner.run(input_path, output_path)
+    finally:
+        await router.close()
+        await stop_metrics(metrics_endpoint)
+        await code_sandbox.close()
+        await AzureClient.aclose()
 
-            # 5️⃣ history に追加（アシスタント側）
-            context.history.append({"role": "assistant", "content": ai_reply})
+if __name__ == "__main__":
+    st = Settings().server
+    parser = argparse.ArgumentParser(description="proactive-analyst-operator")
+    parser.add_argument("--serve", choices=["tcp", "stdio"], help="サーバーモードで起動（省略時は対話モード）")
+    parser.add_argument("--host", default=st.host, help="TCPサーバーの待ち受けアドレス")
+    parser.add_argument("--port", type=int, default=st.port, help="TCPサーバーの待ち受けポート")
+    parser.add_argument("--session", default="default", help="対話モードのセッションID（SESSION_STORE_DIR を設定すると同じIDで再開できる）")
+    parser.add_argument("--batch", metavar="INPUT", help="JSONL ファイルの質問をまとめて処理するバッチモードで起動")
+    parser.add_argument("--output", help="バッチモードの出力ファイル（既存のファイルがあれば続きから処理する）")
+    parser.add_argument("--concurrency", type=int, default=Settings().batch.concurrency, help="バッチモードで同時に処理するレコード数")
+    args = parser.parse_args()
+    if args.batch and not args.output:
+        parser.error("--batch には --output が必要です")
 
+    try:
+        if args.batch:
+            asyncio.run(batch(args.batch, args.output, args.concurrency))
+        elif args.serve:
+            asyncio.run(serve(args.serve, args.host, args.port))
+        else:
+            asyncio.run(main(args.session))
     except KeyboardInterrupt:
-        # Ctrl+C を受け取ったら優雅に終了
-        print("\n🛑 チャットを終了しました。履歴は ctx.history に残っています。")
-
-if __name__ == "__main__":
-    asyncio.run(main())
+        pass
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from agents import Agent
+
+from src.ai_agents.context import AgentContext
+from src.ai_agents.conversation import run_turn
+from src.ai_agents.triage.fast_router import FastPathRouter
+from src.core.logger import apllog
+from src.core.metrics import metrics
+
+
+@dataclass
+class BatchStats:
+    """バッチ処理の集計"""
+    total    : int = 0
+    succeeded: int = 0
+    failed   : int = 0
+    # 前回までの実行で完了済みのため処理しなかったレコード数
+    skipped  : int = 0
+    elapsed  : float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """1秒あたりに処理したレコード数"""
+        return (self.succeeded + self.failed) / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class BatchRunner:
+    """
+    1行1JSONの入力ファイルの質問を並行してエージェントで処理し、結果を1行1JSONで出力ファイルに書き出す
+
+    入力: {"id": 任意, "input": "..."}（id を省略した場合は行番号を使う）
+    出力: {"id": ..., "input": "...", "output": "...", "elapsed": 秒} または {"id": ..., "input": "...", "error": "..."}
+
+    入力ファイルは少しずつ読み込み、同時に処理するレコード数は concurrency までに抑える。
+    結果は完了した順に追記するため、出力ファイルがそのままチェックポイントになる。
+    中断後に同じ出力ファイルで再実行すると、output のあるレコードは処理せず、エラーになったレコードだけを再実行する。
+    """
+
+    def __init__(
+        self,
+        starting_agent: Agent,
+        router        : Optional[FastPathRouter] = None,
+        concurrency   : int = 32,
+        timeout       : float = 300.0,
+        fsync_interval: int = 100
+    ):
+        self.starting_agent = starting_agent
+        self.router = router
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.fsync_interval = max(1, fsync_interval)
+
+    @staticmethod
+    def _iter_records(input_path: Path) -> Iterator[tuple[Any, dict[str, Any]]]:
+        """入力ファイルを1行ずつ読み込み、(id, レコード) を返す"""
+        with open(input_path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    record = {'error': f"invalid record: {e}"}
+                if not isinstance(record, dict):
+                    record = {'error': "record must be a JSON object"}
+                yield record.get('id', line_number), record
+
+    @staticmethod
+    def load_checkpoint(output_path: Path) -> set[str]:
+        """出力ファイルから処理が完了したレコードの id を読み込む（書きかけの最終行は無視する）"""
+        completed: set[str] = set()
+        if not output_path.exists():
+            return completed
+        with open(output_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(result, dict) and 'output' in result:
+                    completed.add(json.dumps(result.get('id')))
+        return completed
+
+    async def _process(self, record_id: Any, record: dict[str, Any]) -> dict[str, Any]:
+        user_input = str(record.get('input', '')).strip()
+        result: dict[str, Any] = {'id': record_id, 'input': user_input}
+        if 'error' in record:
+            result['error'] = record['error']
+            return result
+        if not user_input:
+            result['error'] = "input is required"
+            return result
+
+        started = time.perf_counter()
+        try:
+            # レコードごとに独立した会話として処理する
+            turn = run_turn(AgentContext(), self.starting_agent, user_input, router=self.router)
+            result['output'] = await (asyncio.wait_for(turn, self.timeout) if self.timeout > 0 else turn)
+        except asyncio.TimeoutError:
+            result['error'] = f"{self.timeout:g}秒以内に完了しませんでした"
+        except Exception as e:
+            result['error'] = str(e) or type(e).__name__
+        result['elapsed'] = round(time.perf_counter() - started, 3)
+        metrics.observe('batch_record', result['elapsed'], status='ok' if 'output' in result else 'error')
+        return result
+
+    async def run(self, input_path: str | Path, output_path: str | Path) -> BatchStats:
+        """
+        入力ファイルのレコードを処理し、結果を出力ファイルに追記する
+
+        引数:
+            input_path: 入力の JSONL ファイル
+            output_path: 出力の JSONL ファイル（既存のファイルがあればチェックポイントとして続きから処理する）
+
+        戻り値:
+            処理の集計
+        """
+        input_path, output_path = Path(input_path), Path(output_path)
+        completed = self.load_checkpoint(output_path)
+        if completed:
+            apllog().info(f"チェックポイントから再開します: 完了済み {len(completed)} 件")
+
+        stats = BatchStats()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        started = time.perf_counter()
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'a+b') as out:
+            # 中断時に書きかけだった最終行と、追記する行が混ざらないようにする
+            if out.tell() > 0:
+                out.seek(-1, os.SEEK_END)
+                if out.read(1) != b"\n":
+                    out.write(b"\n")
+            unsynced = 0
+
+            def write(result: dict[str, Any]) -> None:
+                nonlocal unsynced
+                out.write(json.dumps(result, ensure_ascii=False).encode('utf-8') + b"\n")
+                out.flush()
+                unsynced += 1
+                if unsynced >= self.fsync_interval:
+                    os.fsync(out.fileno())
+                    unsynced = 0
+
+            async def worker() -> None:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    result = await self._process(*item)
+                    # 書き込みはイベントループ上で1件ずつ行うため、行が混ざることはない
+                    write(result)
+                    if 'output' in result:
+                        stats.succeeded += 1
+                    else:
+                        stats.failed += 1
+                    done = stats.succeeded + stats.failed
+                    if done % 100 == 0:
+                        apllog().info(
+                            f"バッチ処理: {done} 件完了（成功 {stats.succeeded}、失敗 {stats.failed}、"
+                            f"{done / (time.perf_counter() - started):.1f} 件/秒）"
+                        )
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            try:
+                for record_id, record in self._iter_records(input_path):
+                    stats.total += 1
+                    if json.dumps(record_id) in completed:
+                        stats.skipped += 1
+                        continue
+                    await queue.put((record_id, record))
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for task in workers:
+                    task.cancel()
+                out.flush()
+                os.fsync(out.fileno())
+
+        stats.elapsed = time.perf_counter() - started
+        apllog().info(
+            f"バッチ処理が完了しました: 全 {stats.total} 件（成功 {stats.succeeded}、失敗 {stats.failed}、"
+            f"スキップ {stats.skipped}）{stats.elapsed:.1f}秒、{stats.throughput:.1f} 件/秒"
+        )
+        return stats
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import sys
+from typing import Any, Awaitable, Callable, Optional
+
+from agents import Agent
+
+from src.ai_agents.conversation import run_turn, stream_turn
+from src.ai_agents.triage.fast_router import FastPathRouter
+from src.core.logger import apllog
+from src.core.metrics import metrics
+from src.core.utils import ainput
+from src.server.session_manager import SessionManager
+
+# 1リクエスト（1行）の最大サイズ
+MAX_LINE_BYTES = 1024 * 1024
+
+
+class JsonlServer:
+    """
+    1行1JSONのリクエストを受け付け、複数セッションを並行して処理するサーバー
+
+    リクエスト: {"session_id": "...", "input": "...", "id": 任意, "stream": 任意}
+                {"session_id": "...", "type": "close"} でセッションを終了
+                {"type": "metrics"} でスパンごとの p50/p95/p99 とトークン数などのカウンターを取得
+    レスポンス: {"id": ..., "session_id": "...", "output": "..."} または {"id": ..., "session_id": "...", "error": "..."}
+                "stream": true の場合は、最終レスポンスの前に {"id": ..., "session_id": "...", "delta": "..."} を逐次返す
+    """
+
+    def __init__(self, sessions: SessionManager, starting_agent: Agent, router: Optional[FastPathRouter] = None):
+        self.sessions = sessions
+        self.starting_agent = starting_agent
+        self.router = router
+
+    async def handle_request(
+        self,
+        request: dict[str, Any],
+        write  : Optional[Callable[[dict[str, Any]], Awaitable[None]]] = None
+    ) -> dict[str, Any]:
+        """1件のリクエストを処理してレスポンスを返す（ストリーミング時は途中経過を write で送る）"""
+        if request.get("type") == "metrics":
+            return {"id": request.get("id"), "metrics": metrics.summary(), "counters": metrics.counters()}
+
+        session_id = request.get("session_id")
+        response: dict[str, Any] = {"id": request.get("id"), "session_id": session_id}
+
+        if not isinstance(session_id, str) or not session_id:
+            response["error"] = "session_id is required"
+            return response
+
+        if request.get("type") == "close":
+            await self.sessions.close_session(session_id)
+            response["closed"] = True
+            return response
+
+        user_input = str(request.get("input", "")).strip()
+        if not user_input:
+            response["error"] = "input is required"
+            return response
+
+        while True:
+            try:
+                session = self.sessions.get_or_create(session_id)
+            except Exception as e:
+                # 保存したログを読み込めない場合など
+                apllog().error(f"セッション {session_id} を開けませんでした: {e}")
+                response["error"] = f"failed to open session: {type(e).__name__}"
+                return response
+
+            async with session.lock:
+                if session.closed:
+                    # ロックを待つ間に閉じられたセッションは、ログから開き直して処理する
+                    continue
+                try:
+                    if request.get("stream") and write is not None:
+                        async def on_delta(delta: str) -> None:
+                            await write({"id": response["id"], "session_id": session_id, "delta": delta})
+
+                        response["output"] = await stream_turn(
+                            session.context, self.starting_agent, user_input, on_delta, router=self.router
+                        )
+                    else:
+                        response["output"] = await run_turn(
+                            session.context, self.starting_agent, user_input, router=self.router
+                        )
+                except Exception as e:
+                    apllog().error(f"セッション {session_id} のターン処理でエラーが発生しました: {e}")
+                    response["error"] = str(e)
+                session.touch()
+            break
+
+        if self.sessions.summarizer is not None:
+            self.sessions.summarizer.schedule(session.context.history)
+        return response
+
+    async def _handle_line(self, line: str, write: Callable[[dict[str, Any]], Awaitable[None]]) -> None:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            await write({"error": f"invalid request: {e}"})
+            return
+        await write(await self.handle_request(request, write))
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername")
+        apllog().debug(f"クライアント {peer} が接続しました")
+
+        write_lock = asyncio.Lock()
+        pending: set[asyncio.Task] = set()
+
+        async def write(message: dict[str, Any]) -> None:
+            async with write_lock:
+                writer.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                # 同じ接続からのリクエストも並行して処理する（同一セッション内はセッションのロックで順番に処理）
+                task = asyncio.create_task(self._handle_line(line.decode("utf-8"), write))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending, return_exceptions=True)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+            apllog().warning(f"クライアント {peer} との通信でエラーが発生しました: {e}")
+        finally:
+            for task in pending:
+                task.cancel()
+            writer.close()
+            apllog().debug(f"クライアント {peer} が切断しました")
+
+    async def serve_tcp(self, host: str, port: int) -> None:
+        """TCPで待ち受ける"""
+        server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_LINE_BYTES)
+        self.sessions.start()
+        apllog().info(f"JSONLサーバーを起動しました: {host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.sessions.close()
+
+    async def serve_stdio(self) -> None:
+        """標準入力からリクエストを読み込み、標準出力にレスポンスを書き出す"""
+        write_lock = asyncio.Lock()
+        pending: set[asyncio.Task] = set()
+
+        async def write(message: dict[str, Any]) -> None:
+            async with write_lock:
+                sys.stdout.write(json.dumps(message, ensure_ascii=False) + "\n")
+                sys.stdout.flush()
+
+        self.sessions.start()
+        apllog().info("JSONLサーバーを標準入出力で起動しました")
+        try:
+            while True:
+                try:
+                    line = await ainput()
+                except EOFError:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(self._handle_line(line, write))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            await self.sessions.close()
@@ -0,0 +1,51 @@
+import asyncio
+
+from src.core.logger import apllog
+from src.core.metrics import MetricsRegistry, metrics
+
+
+class MetricsEndpoint:
+    """
+    GET /metrics に Prometheus 形式のテキストを返す最小限のHTTPエンドポイント
+
+    ローカルのスクレイピング用で、HTTPはリクエスト行のみ解釈し、1リクエストごとに接続を閉じる。
+    """
+
+    def __init__(self, registry: MetricsRegistry = metrics):
+        self.registry = registry
+        self._server: asyncio.AbstractServer | None = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # ヘッダーは読み捨てる
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.registry.to_prometheus().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"not found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            apllog().debug(f"メトリクスのリクエストの処理を中断しました: {e}")
+        finally:
+            writer.close()
+
+    async def start(self, host: str, port: int) -> None:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        apllog().info(f"メトリクスのエンドポイントを起動しました: http://{host}:{port}/metrics")
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,123 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from src.ai_agents.context import AgentContext
+from src.ai_agents.session_store import SessionStore
+from src.ai_agents.summary.summarizer import HistorySummarizer
+from src.core.logger import apllog
+
+
+@dataclass
+class Session:
+    """1つの会話セッション（同一セッション内のターンは順番に処理する）"""
+    session_id : str
+    context    : AgentContext = field(default_factory=AgentContext)
+    lock       : asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_active: float = field(default_factory=time.monotonic)
+    # 破棄済みか（ロックを待つ間に破棄されたセッションではターンを処理しない）
+    closed     : bool = False
+
+    def touch(self) -> None:
+        self.last_active = time.monotonic()
+
+
+class SessionManager:
+    """
+    サーバーモードの会話セッションを管理するクラス
+
+    セッションごとに AgentContext を持ち、一定時間操作のないセッションは破棄する。
+    エージェント、プロンプトのキャッシュ、モデルのクライアントはすべてのセッションで共有される。
+    ストアを指定すると会話履歴をセッションごとに保存し、破棄したセッションや再起動前のセッションも同じIDで再開できる。
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float,
+        max_sessions: int,
+        summarizer  : Optional[HistorySummarizer] = None,
+        store       : Optional[SessionStore] = None
+    ):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.summarizer = summarizer
+        self.store = store
+        self._sessions: dict[str, Session] = {}
+        self._evict_task: Optional[asyncio.Task] = None
+
+    def get_or_create(self, session_id: str) -> Session:
+        """セッションを取得し、存在しなければ作成する"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            if len(self._sessions) >= self.max_sessions:
+                self._evict_oldest()
+            context = AgentContext(history=self.store.load(session_id)) if self.store is not None else AgentContext()
+            session = Session(session_id, context=context)
+            self._sessions[session_id] = session
+            apllog().debug(f"セッション {session_id} を作成しました（{len(self._sessions)} セッション）")
+        session.touch()
+        return session
+
+    def _evict_oldest(self) -> None:
+        """セッション数の上限に達した場合、処理中でない最も古いセッションを破棄する"""
+        idle = [session for session in self._sessions.values() if not session.lock.locked()]
+        if idle:
+            oldest = min(idle, key=lambda session: session.last_active)
+            self.remove(oldest.session_id)
+
+    async def close_session(self, session_id: str) -> None:
+        """処理中のターンが終わるのを待ってからセッションを破棄する"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return
+        async with session.lock:
+            if self._sessions.get(session_id) is session:
+                self.remove(session_id)
+
+    def remove(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.closed = True
+            # ログは保存済みのため、追記用のファイルを閉じる（次のリクエストでログから再開する）
+            if session.context.history.log is not None:
+                session.context.history.log.close()
+            apllog().debug(f"セッション {session_id} を破棄しました")
+
+    def evict_idle(self) -> int:
+        """一定時間操作のないセッションを破棄し、破棄した件数を返す"""
+        deadline = time.monotonic() - self.idle_timeout
+        expired = [
+            session_id for session_id, session in self._sessions.items()
+            if session.last_active < deadline and not session.lock.locked()
+        ]
+        for session_id in expired:
+            self.remove(session_id)
+        if expired:
+            apllog().info(f"アイドル状態のセッションを {len(expired)} 件破棄しました")
+        return len(expired)
+
+    async def _evict_loop(self) -> None:
+        interval = max(1.0, min(60.0, self.idle_timeout / 4))
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    def start(self) -> None:
+        """アイドルセッションの定期破棄を開始"""
+        if self._evict_task is None:
+            self._evict_task = asyncio.create_task(self._evict_loop(), name="session-evictor")
+
+    async def close(self) -> None:
+        """定期破棄と実行中の要約を停止"""
+        if self._evict_task is not None:
+            self._evict_task.cancel()
+            await asyncio.gather(self._evict_task, return_exceptions=True)
+            self._evict_task = None
+        if self.summarizer is not None:
+            await self.summarizer.aclose()
+        if self.store is not None:
+            await self.store.close()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
@@ -0,0 +1,189 @@
+import asyncio
+import socket
+import time
+from dataclasses import replace
+
+from agents import ModelSettings, ModelTracing
+
+from src.core.deployment_pool import Deployment, PooledModel, PoolMember
+from src.core.metrics import metrics
+from src.core.settings import DeploymentPoolSettings
+from src.integration.azure.client import AzureClient
+from tools.benchmark.mock_azure_server import MockAzureOpenAIServer, MockConfig
+
+FAST = MockConfig(latency_ms=10, jitter_ms=0, tokens_per_second=0, output_tokens=5)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def start_mock(config: MockConfig, port: int = 0) -> tuple[MockAzureOpenAIServer, asyncio.Server]:
+    mock = MockAzureOpenAIServer(config)
+    server = await asyncio.start_server(mock._handle, '127.0.0.1', port)
+    return mock, server
+
+
+def make_pool(name: str, ports: list[int], **settings) -> PooledModel:
+    deployments = [
+        Deployment(
+            name        = f"{name}{index}",
+            endpoint    = f"http://127.0.0.1:{port}",
+            api_key     = "test",
+            api_version = "2024-10-21",
+            model_name  = "gpt-4o-mini"
+        )
+        for index, port in enumerate(ports)
+    ]
+    pool = PooledModel.from_deployments("gpt-4o-mini", deployments)
+    pool.st = replace(DeploymentPoolSettings(), **settings)
+    return pool
+
+
+async def ask(pool: PooledModel) -> str:
+    response = await pool.get_response(
+        "system", "hello", ModelSettings(), [], None, [], ModelTracing.DISABLED
+    )
+    return response.output[0].content[0].text
+
+
+def run(coroutine) -> None:
+    async def main():
+        try:
+            await coroutine
+        finally:
+            await AzureClient.aclose()
+    asyncio.run(main())
+
+
+def test_routing_spreads_calls_across_deployments():
+    async def scenario():
+        mocks = [await start_mock(FAST) for _ in range(2)]
+        pool = make_pool("routing", [server.sockets[0].getsockname()[1] for _, server in mocks])
+        try:
+            await asyncio.gather(*(ask(pool) for _ in range(20)))
+            assert all(mock.requests > 0 for mock, _ in mocks)
+            assert sum(mock.requests for mock, _ in mocks) == 20
+        finally:
+            for _, server in mocks:
+                server.close()
+
+    run(scenario())
+
+
+def test_failed_deployment_is_ejected_and_readmitted():
+    async def scenario():
+        healthy, healthy_server = await start_mock(FAST)
+        down_port = free_port()
+        pool = make_pool(
+            "eject", [healthy_server.sockets[0].getsockname()[1], down_port],
+            eject_failures=1, eject_seconds=0.3
+        )
+        down = pool.members[1]
+        recovered_server = None
+        try:
+            # 接続できないデプロイメントの呼び出しは別のデプロイメントで再試行され、外される
+            for _ in range(10):
+                await ask(pool)
+                if down.ejections:
+                    break
+            assert down.ejections == 1
+            assert not down.available(time.monotonic())
+
+            # 外している間は呼び出しを送らない
+            before = healthy.requests
+            await asyncio.gather(*(ask(pool) for _ in range(5)))
+            assert healthy.requests == before + 5
+
+            # 時間が経てば確認のための呼び出しを受け、成功すれば元に戻る
+            recovered, recovered_server = await start_mock(FAST, down_port)
+            await asyncio.sleep(0.35)
+            for _ in range(20):
+                await ask(pool)
+                if not down.ejections:
+                    break
+            assert down.ejections == 0
+            assert recovered.requests > 0
+        finally:
+            healthy_server.close()
+            if recovered_server is not None:
+                recovered_server.close()
+
+    run(scenario())
+
+
+def test_choose_waits_for_probe_in_flight():
+    async def scenario():
+        member = PoolMember(
+            Deployment(name="probe", endpoint="", api_key="", api_version="", model_name="gpt-4o-mini"), model=None
+        )
+        # 再び受け入れた直後で、確認のための呼び出しを処理中
+        member.ejections = 1
+        member.ejected_until = time.monotonic() - 1
+        member.outstanding = 1
+        pool = PooledModel("gpt-4o-mini", [member], DeploymentPoolSettings(), max_attempts=1)
+
+        choice = asyncio.ensure_future(pool._choose(set()))
+        await asyncio.sleep(0.2)
+        assert not choice.done()
+
+        member.outstanding = 0
+        assert await asyncio.wait_for(choice, timeout=1) is member
+
+    asyncio.run(scenario())
+
+
+def test_slow_call_is_hedged_to_another_deployment():
+    async def scenario():
+        slow, slow_server = await start_mock(replace(FAST, latency_ms=1500))
+        fast, fast_server = await start_mock(FAST)
+        pool = make_pool(
+            "hedge", [slow_server.sockets[0].getsockname()[1], fast_server.sockets[0].getsockname()[1]],
+            hedge_percentile=0.5, hedge_min_samples=1, hedge_min_delay=0.05
+        )
+        slow_member, fast_member = pool.members
+        for _ in range(5):
+            pool.latency.observe(0.05)
+        wins = metrics.counter('hedge_wins', model="gpt-4o-mini")
+        try:
+            # 処理中の呼び出しがあるように見せ、最初の呼び出しを遅いデプロイメントに送る
+            fast_member.outstanding += 1
+            started = time.perf_counter()
+            task = asyncio.ensure_future(ask(pool))
+            await asyncio.sleep(0)
+            fast_member.outstanding -= 1
+            assert await task
+            assert time.perf_counter() - started < 1.0
+            assert slow.requests == 1 and fast.requests == 1
+            assert metrics.counter('hedge_wins', model="gpt-4o-mini") == wins + 1
+        finally:
+            slow_server.close()
+            fast_server.close()
+
+    run(scenario())
+
+
+def test_streamed_latency_is_kept_out_of_hedging():
+    async def scenario():
+        mock, server = await start_mock(FAST)
+        pool = make_pool("stream", [server.sockets[0].getsockname()[1]] * 2)
+        try:
+            events = [
+                event async for event in pool.stream_response(
+                    "system", "hello", ModelSettings(), [], None, [], ModelTracing.DISABLED
+                )
+            ]
+            assert events and mock.requests == 1
+            # 最初のイベントまでの所要時間はヘッジの待ち時間の計算に使わない
+            assert pool.latency.count == 0 and pool.stream_latency.count == 1
+            assert sum(member.stream_ewma is not None for member in pool.members) == 1
+            assert all(member.ewma is None for member in pool.members)
+
+            await ask(pool)
+            assert pool.latency.count == 1 and pool.stream_latency.count == 1
+        finally:
+            server.close()
+
+    run(scenario())
@@ -0,0 +1,196 @@
+import hashlib
+import io
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from src.core.settings import KaggleSettings
+from src.integration.kaggle.client import DatasetCache, KaggleClient, KaggleDownloadError
+
+DATASET = "owner/dataset"
+CONTENT = b"id,value\n" + b"".join(f"{i},{i * i}\n".encode() for i in range(2000))
+
+
+class FakeKaggle:
+    """Range / If-Range / If-None-Match に対応した Kaggle のダウンロード API の代わり"""
+
+    def __init__(self):
+        self.files: dict[str, bytes] = {}
+        self.etags: dict[str, str] = {}
+        # 次の応答で本文をこのバイト数だけ送って接続を切る
+        self.cut_after: int | None = None
+        self.requests: list[dict[str, str]] = []
+
+    def publish(self, file_name: str, body: bytes, etag: str) -> None:
+        self.files[file_name] = body
+        self.etags[file_name] = etag
+
+    def handler(self) -> type[BaseHTTPRequestHandler]:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                file_name = self.path.rsplit('/', 1)[1]
+                fake.requests.append({key.lower(): value for key, value in self.headers.items()})
+                body, etag = fake.files[file_name], fake.etags[file_name]
+
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+
+                start = 0
+                range_header = self.headers.get('Range')
+                if range_header and self.headers.get('If-Range', etag) == etag:
+                    start = int(range_header.removeprefix('bytes=').rstrip('-'))
+                    if start >= len(body):
+                        self.send_response(416)
+                        self.send_header('Content-Range', f"bytes */{len(body)}")
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f"bytes {start}-{len(body) - 1}/{len(body)}")
+                else:
+                    self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body) - start))
+                self.end_headers()
+
+                cut, fake.cut_after = fake.cut_after, None
+                self.wfile.write(body[start:start + cut] if cut is not None else body[start:])
+                if cut is not None:
+                    self.wfile.flush()
+                    self.close_connection = True
+
+        return Handler
+
+
+@pytest.fixture
+def server():
+    fake = FakeKaggle()
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), fake.handler())
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    fake.api_base = f"http://127.0.0.1:{httpd.server_address[1]}/api/v1"
+    yield fake
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_client(api_base: str, cache_dir: Path) -> KaggleClient:
+    settings = KaggleSettings(username='', key='', api_base=api_base, cache_dir=str(cache_dir), chunk_size=1024)
+    return KaggleClient(settings, DatasetCache(cache_dir))
+
+
+def test_resume_after_interrupted_download(server, tmp_path):
+    server.publish("train.csv", CONTENT, '"v1"')
+    server.cut_after = 5000
+    client = make_client(server.api_base, tmp_path)
+
+    with pytest.raises(KaggleDownloadError):
+        client.get_file(DATASET, "train.csv")
+    # 受け取ったチャンクまでは途中のファイルに残る
+    partial = client.cache.partial_path(DATASET, "train.csv")
+    offset = partial.stat().st_size
+    assert 0 < offset <= 5000
+
+    cached = client.get_file(DATASET, "train.csv")
+    assert server.requests[-1]['range'] == f"bytes={offset}-"
+    assert server.requests[-1]['if-range'] == '"v1"'
+    assert cached.path.read_bytes() == CONTENT
+    assert cached.sha256 == hashlib.sha256(CONTENT).hexdigest()
+    assert not partial.exists()
+    client.close()
+
+
+def test_refresh_uses_etag_and_304(server, tmp_path):
+    server.publish("train.csv", CONTENT, '"v1"')
+    client = make_client(server.api_base, tmp_path)
+    first = client.get_file(DATASET, "train.csv")
+
+    # キャッシュがあれば問い合わせない
+    assert client.get_file(DATASET, "train.csv") == first
+    assert len(server.requests) == 1
+
+    # 更新の確認は ETag を送り、304 ならキャッシュを使う
+    assert client.get_file(DATASET, "train.csv", refresh=True) == first
+    assert server.requests[-1]['if-none-match'] == '"v1"'
+
+    # 更新されていればダウンロードし直す
+    updated = CONTENT + b"2000,4000000\n"
+    server.publish("train.csv", updated, '"v2"')
+    second = client.get_file(DATASET, "train.csv", refresh=True)
+    assert second.path.read_bytes() == updated
+    assert second.sha256 != first.sha256
+    client.close()
+
+
+@pytest.mark.parametrize("expected_size", [len(CONTENT) + 10, len(CONTENT) + 20])
+def test_restart_when_partial_does_not_match(server, tmp_path, expected_size):
+    server.publish("train.csv", CONTENT, '"v1"')
+    client = make_client(server.api_base, tmp_path)
+
+    # サーバー上のファイルより長い途中のファイルが残っている（前回の全体のサイズと一致する場合もしない場合も 416 になる）
+    partial = client.cache.partial_path(DATASET, "train.csv")
+    partial.write_bytes(b"x" * (len(CONTENT) + 10))
+    client._write_meta(
+        partial.with_suffix('.json'),
+        {'url': client._file_url(DATASET, "train.csv"), 'etag': '"v1"', 'size': expected_size}
+    )
+
+    cached = client.get_file(DATASET, "train.csv")
+    assert [request.get('range') for request in server.requests] == [f"bytes={len(CONTENT) + 10}-", None]
+    assert cached.path.read_bytes() == CONTENT
+    client.close()
+
+
+def test_completed_partial_is_committed_on_416(server, tmp_path):
+    server.publish("train.csv", CONTENT, '"v1"')
+    client = make_client(server.api_base, tmp_path)
+
+    # 前回は最後まで受け取ったが、キャッシュに登録する前に中断した
+    partial = client.cache.partial_path(DATASET, "train.csv")
+    partial.write_bytes(CONTENT)
+    client._write_meta(
+        partial.with_suffix('.json'),
+        {'url': client._file_url(DATASET, "train.csv"), 'etag': '"v1"', 'size': len(CONTENT)}
+    )
+
+    cached = client.get_file(DATASET, "train.csv")
+    assert len(server.requests) == 1
+    assert cached.path.read_bytes() == CONTENT
+
+
+def test_zip_download_is_extracted(server, tmp_path):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("data/train.csv", CONTENT)
+    server.publish("train.csv", archive.getvalue(), '"zip"')
+    client = make_client(server.api_base, tmp_path)
+
+    cached = client.get_file(DATASET, "train.csv")
+    assert cached.path.read_bytes() == CONTENT
+    assert cached.size == len(CONTENT)
+    assert [batch for batch in client.iter_batches(DATASET, "train.csv", batch_size=500)]
+    client.close()
+
+
+def test_file_url_stand_in(tmp_path):
+    source = tmp_path / "source" / DATASET
+    source.mkdir(parents=True)
+    (source / "train.csv").write_bytes(CONTENT)
+    client = make_client((tmp_path / "source").as_uri(), tmp_path / "cache")
+
+    cached = client.get_file(DATASET, "train.csv")
+    assert cached.path.read_bytes() == CONTENT
+    assert client.get_file(DATASET, "train.csv", refresh=True) == cached
+
+    with pytest.raises(KaggleDownloadError):
+        client.get_file(DATASET, "missing.csv")
@@ -0,0 +1,205 @@
+"""
+ベンチマーク用の Azure OpenAI chat completions API のローカルの代替サーバー。
+応答までの遅延、トークンの生成速度、429 の発生率を指定でき、ストリーミングにも対応します。
+
+    python tools/benchmark/mock_azure_server.py --port 18080 --latency-ms 200 --tokens-per-second 80
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass
+class MockConfig:
+    """代替サーバーの応答の設定"""
+    latency_ms       : float = 200.0
+    jitter_ms        : float = 50.0
+    tokens_per_second: float = 80.0
+    output_tokens    : int   = 40
+    rate_limit_ratio : float = 0.0
+    retry_after_ms   : int   = 100
+    # slow_ratio の割合で遅延に slow_ms を加える（テールレイテンシーの再現）
+    slow_ratio       : float = 0.0
+    slow_ms          : float = 0.0
+
+class MockAzureOpenAIServer:
+    """
+    chat completions の POST に固定の文章を返す最小限のHTTP/1.1サーバー
+
+    キープアライブに対応し、応答時間は「遅延 + 出力トークン数 / 生成速度」になる。
+    rate_limit_ratio の割合で Retry-After 付きの 429 を返し、slow_ratio の割合で応答を slow_ms だけ遅らせる。
+    usage には、以前のリクエストと先頭が一致した部分をキャッシュ済みの入力トークンとして返す。
+    """
+
+    # プロンプトキャッシュは先頭 1024 トークン以上が一致した場合に 128 トークン単位で効く
+    CACHE_MIN_TOKENS = 1024
+    CACHE_BLOCK_TOKENS = 128
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.requests = 0
+        self.rate_limited = 0
+        self._seen_prefixes: set[int] = set()
+
+    def _first_byte_delay(self) -> float:
+        delay = self.config.latency_ms + random.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        if random.random() < self.config.slow_ratio:
+            delay += self.config.slow_ms
+        return max(0.0, delay) / 1000.0
+
+    def _tokens(self) -> list[str]:
+        return [f"token{i} " for i in range(self.config.output_tokens)]
+
+    def _prompt_usage(self, request: dict) -> tuple[int, int]:
+        """
+        入力トークン数（文字数からの概算）と、以前のリクエストと先頭のメッセージ列が一致した部分のトークン数
+
+        Azure OpenAI の自動プロンプトキャッシュを真似て、メッセージ単位で先頭から一致した長さを返す。
+        """
+        prefix_chars = 0
+        cached_chars = 0
+        prefix_hash = 0
+        for message in request.get('messages', []):
+            serialized = json.dumps(message, ensure_ascii=False, sort_keys=True)
+            prefix_hash = hash((prefix_hash, serialized))
+            prefix_chars += len(serialized)
+            if prefix_hash in self._seen_prefixes:
+                cached_chars = prefix_chars
+            else:
+                self._seen_prefixes.add(prefix_hash)
+        prompt_tokens = max(1, prefix_chars // 4)
+        cached_tokens = cached_chars // 4
+        if cached_tokens < self.CACHE_MIN_TOKENS:
+            cached_tokens = 0
+        return prompt_tokens, cached_tokens - cached_tokens % self.CACHE_BLOCK_TOKENS
+
+    @staticmethod
+    def _usage(prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> dict:
+        return {
+            'prompt_tokens'        : prompt_tokens,
+            'completion_tokens'    : completion_tokens,
+            'total_tokens'         : prompt_tokens + completion_tokens,
+            'prompt_tokens_details': {'cached_tokens': cached_tokens},
+        }
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: str, body: bytes, headers: Optional[dict] = None) -> None:
+        header_lines = [f"HTTP/1.1 {status}", "Content-Type: application/json", f"Content-Length: {len(body)}"]
+        header_lines += [f"{key}: {value}" for key, value in (headers or {}).items()]
+        writer.write(("\r\n".join(header_lines) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    async def _write_chunk(self, writer: asyncio.StreamWriter, payload: dict | str) -> None:
+        data = f"data: {payload if isinstance(payload, str) else json.dumps(payload)}\n\n".encode('utf-8')
+        writer.write(b"%x\r\n" % len(data) + data + b"\r\n")
+        await writer.drain()
+
+    async def _complete(self, writer: asyncio.StreamWriter, request: dict) -> None:
+        model = request.get('model', 'mock')
+        tokens = self._tokens()
+        prompt_tokens, cached_tokens = self._prompt_usage(request)
+        token_interval = 1.0 / self.config.tokens_per_second if self.config.tokens_per_second > 0 else 0.0
+
+        await asyncio.sleep(self._first_byte_delay())
+
+        if not request.get('stream'):
+            await asyncio.sleep(token_interval * len(tokens))
+            body = {
+                'id': f"chatcmpl-{self.requests}", 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(tokens)}, 'finish_reason': 'stop'}],
+                'usage': self._usage(prompt_tokens, cached_tokens, len(tokens)),
+            }
+            await self._write_response(writer, "200 OK", json.dumps(body).encode('utf-8'))
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n"
+        )
+        base = {'id': f"chatcmpl-{self.requests}", 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model}
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(token_interval)
+            delta = {'role': 'assistant', 'content': token} if index == 0 else {'content': token}
+            await self._write_chunk(writer, {**base, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})
+        await self._write_chunk(
+            writer, {**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'usage': self._usage(prompt_tokens, cached_tokens, len(tokens))}
+        )
+        await self._write_chunk(writer, "[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', '0')))
+
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                self.requests += 1
+                if method != 'POST' or not path.split('?')[0].endswith('/chat/completions'):
+                    await self._write_response(writer, "404 Not Found", b'{"error": {"message": "not found"}}')
+                elif random.random() < self.config.rate_limit_ratio:
+                    self.rate_limited += 1
+                    await self._write_response(
+                        writer, "429 Too Many Requests",
+                        b'{"error": {"code": "429", "message": "Rate limit is exceeded."}}',
+                        {'retry-after-ms': self.config.retry_after_ms, 'retry-after': max(1, self.config.retry_after_ms // 1000)}
+                    )
+                else:
+                    await self._complete(writer, json.loads(body or b'{}'))
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self._handle, host, port, backlog=1024)
+        print(f"mock azure openai listening on http://{host}:{port}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+def main():
+    """メイン実行関数"""
+    defaults = MockConfig()
+    parser = argparse.ArgumentParser(description="Azure OpenAI の代替サーバー")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けアドレス")
+    parser.add_argument("--port", type=int, default=18080, help="待ち受けポート")
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms, help="最初のバイトまでの遅延（ミリ秒）")
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms, help="遅延のばらつき（ミリ秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second, help="出力トークンの生成速度")
+    parser.add_argument("--output-tokens", type=int, default=defaults.output_tokens, help="1応答の出力トークン数")
+    parser.add_argument("--rate-limit-ratio", type=float, default=defaults.rate_limit_ratio, help="429 を返す割合（0〜1）")
+    parser.add_argument("--retry-after-ms", type=int, default=defaults.retry_after_ms, help="429 の Retry-After（ミリ秒）")
+    parser.add_argument("--slow-ratio", type=float, default=defaults.slow_ratio, help="応答を遅らせる割合（0〜1）")
+    parser.add_argument("--slow-ms", type=float, default=defaults.slow_ms, help="遅らせる応答に加える遅延（ミリ秒）")
+
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency_ms        = args.latency_ms,
+        jitter_ms         = args.jitter_ms,
+        tokens_per_second = args.tokens_per_second,
+        output_tokens     = args.output_tokens,
+        rate_limit_ratio  = args.rate_limit_ratio,
+        retry_after_ms    = args.retry_after_ms,
+        slow_ratio        = args.slow_ratio,
+        slow_ms           = args.slow_ms
+    )
+    try:
+        asyncio.run(MockAzureOpenAIServer(config).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+ネットワークに接続せずに性能の回帰を確認するベンチマークツール。
+Azure OpenAI の代替サーバーを起動して Settings の接続先をそこに向け、実際の Runner / TriageAgent の処理を
+指定した同時実行数で流して、スループット、レイテンシーのパーセンタイル、メモリ、起動時間を計測します。
+PromptManager.get_prompt のマイクロベンチマークも行います。
+
+    PYTHONPATH=. python tools/benchmark/run_benchmark.py --requests 200 --concurrency 20 --rate-limit-ratio 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from pathlib import Path
+from typing import Any
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+BENCHMARK_DIR = Path(__file__).resolve().parent
+
+# プロジェクトのルートディレクトリをPythonパスに追加
+sys.path.append(str(ROOT_DIR))
+
+# 起動時間の計測で実行する処理（main.py の初期化と同じ手順）
+STARTUP_SNIPPET = """
+import time
+started = time.perf_counter()
+from agents import set_tracing_disabled
+set_tracing_disabled(True)
+from src.core.logger import init_apl_logger
+init_apl_logger({log_path!r})
+from src.core.prompt_manager import prompt_manager
+prompt_manager.initialize({prompt_dir!r})
+import src.ai_agents
+from src.ai_agents.registry import agent_registry
+agent_registry.get_agent("triage_agent")
+print(time.perf_counter() - started)
+"""
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    """値のリストから p50/p95/p99 などを計算する（ミリ秒）"""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean' : statistics.fmean(ordered) * 1000,
+        'p50'  : pick(0.50),
+        'p95'  : pick(0.95),
+        'p99'  : pick(0.99),
+        'max'  : ordered[-1] * 1000,
+    }
+
+def current_rss_mb() -> float:
+    """現在の常駐メモリ（MB）"""
+    try:
+        with open('/proc/self/status', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def start_mock_server(args: argparse.Namespace, port: int) -> subprocess.Popen:
+    """代替サーバーを別プロセスで起動し、待ち受けを開始するまで待つ"""
+    process = subprocess.Popen(
+        [
+            sys.executable, str(BENCHMARK_DIR / "mock_azure_server.py"),
+            "--port", str(port),
+            "--latency-ms", str(args.latency_ms),
+            "--jitter-ms", str(args.jitter_ms),
+            "--tokens-per-second", str(args.tokens_per_second),
+            "--output-tokens", str(args.output_tokens),
+            "--rate-limit-ratio", str(args.rate_limit_ratio),
+            "--retry-after-ms", str(args.retry_after_ms),
+            "--slow-ratio", str(args.slow_ratio),
+            "--slow-ms", str(args.slow_ms),
+        ],
+        stdout=subprocess.PIPE, text=True
+    )
+    line = process.stdout.readline()
+    if "listening" not in line:
+        process.kill()
+        raise RuntimeError("代替サーバーを起動できませんでした")
+    return process
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """Settings が代替サーバーを参照するよう環境変数を設定する（src のモジュールを読み込む前に呼ぶ）"""
+    os.environ.update({
+        'AZURE_OPENAI_ENDPOINT'   : f"http://127.0.0.1:{args.mock_port}",
+        'AZURE_OPENAI_API_KEY'    : "benchmark",
+        'AZURE_OPENAI_API_VERSION': "2024-10-21",
+        'HTTP_HTTP2'              : "false",
+        'SCHEDULER_MAX_CONCURRENCY': str(args.scheduler_concurrency),
+        'METRICS_ENABLED'         : "true",
+        'LOG_LEVEL'               : args.log_level,
+    })
+    # 応答キャッシュは計測を歪めるため使わない
+    os.environ['RESPONSE_CACHE_ENABLED'] = "false"
+    os.environ.pop('RESPONSE_CACHE_DB_PATH', None)
+
+    if args.deployments > 1:
+        # 代替サーバーごとに1つのデプロイメントとしてプールを構成する
+        pool_file = ROOT_DIR / "logs" / "benchmark_deployments.yaml"
+        pool_file.parent.mkdir(parents=True, exist_ok=True)
+        deployments = [
+            {'name': f"mock{index}", 'endpoint': f"http://127.0.0.1:{args.mock_port + index}"}
+            for index in range(args.deployments)
+        ]
+        pool_file.write_text(json.dumps({'deployments': {'gpt-4o-mini': deployments}}), encoding='utf-8')
+        os.environ.update({
+            'DEPLOYMENT_POOL_FILE'            : str(pool_file),
+            'DEPLOYMENT_POOL_ROUTING'         : args.routing,
+            'DEPLOYMENT_POOL_HEDGE_PERCENTILE': str(args.hedge_percentile),
+        })
+
+def measure_startup(runs: int, log_path: str) -> dict[str, float]:
+    """新しいプロセスで初期化からエージェントの生成までの時間を計測する（ミリ秒）"""
+    snippet = STARTUP_SNIPPET.format(log_path=log_path, prompt_dir=str(ROOT_DIR / "config" / "prompt"))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(ROOT_DIR), str(ROOT_DIR / "src")]))
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", snippet], cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True
+        )
+        process_total = time.perf_counter() - started
+        samples.append((float(result.stdout.strip().splitlines()[-1]), process_total))
+    return {
+        'init_ms'   : statistics.median(sample[0] for sample in samples) * 1000,
+        'process_ms': statistics.median(sample[1] for sample in samples) * 1000,
+    }
+
+def benchmark_prompts(iterations: int) -> dict[str, float]:
+    """PromptManager.get_prompt の1回あたりの時間（マイクロ秒）"""
+    from src.core.prompt_manager import prompt_manager
+
+    name = "triage/triage_agent"
+    results = {}
+    cases = {
+        'static'   : lambda: prompt_manager.get_prompt(name),
+        'variables': lambda: prompt_manager.get_prompt(name, {'role': f"role {time.perf_counter()}"}),
+    }
+    for case, call in cases.items():
+        call()
+        best = min(timeit.repeat(call, number=iterations, repeat=3))
+        results[f"get_prompt_{case}_us"] = best / iterations * 1e6
+    return results
+
+async def benchmark_runner(args: argparse.Namespace) -> dict[str, Any]:
+    """Runner / TriageAgent の1ターンを指定した同時実行数で実行する"""
+    from src.ai_agents.context import AgentContext
+    from src.ai_agents.conversation import run_turn, stream_turn
+    from src.ai_agents.registry import agent_registry
+    from src.core.metrics import metrics
+    from src.core.prompt_cache import cached_token_ratio
+    from src.core.scheduler import RequestScheduler
+    from src.integration.azure.client import AzureClient
+
+    agent = agent_registry.get_agent("triage_agent")
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    first_tokens: list[float] = []
+    errors: list[str] = []
+
+    async def one_session(index: int, record: bool) -> None:
+        """1セッションで --turns 回のターンを順に実行する"""
+        async with semaphore:
+            context = AgentContext()
+            for turn in range(args.turns):
+                started = time.perf_counter()
+                first: list[float] = []
+
+                def on_delta(_: str) -> None:
+                    if not first:
+                        first.append(time.perf_counter() - started)
+
+                user_input = f"benchmark session {index} turn {turn}"
+                try:
+                    if args.stream:
+                        await stream_turn(context, agent, user_input, on_delta)
+                    else:
+                        await run_turn(context, agent, user_input)
+                except Exception as e:
+                    if record:
+                        errors.append(type(e).__name__)
+                    return
+                if record:
+                    latencies.append(time.perf_counter() - started)
+                    first_tokens.extend(first)
+
+    await asyncio.gather(*(one_session(i, record=False) for i in range(min(args.warmup, args.requests))))
+    metrics.reset()
+
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    await asyncio.gather(*(one_session(i, record=True) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    # プールを使う場合はデプロイメントごとのスケジューラーを合計する
+    schedulers = list(RequestScheduler._schedulers.values())
+    await AzureClient.aclose()
+
+    # ストリーミングの呼び出しは最初のイベントまでの所要時間として別に記録される
+    deployments: dict[str, int] = {}
+    for span in metrics.summary():
+        if span['name'] in ('deployment_call', 'deployment_first_event'):
+            deployment = span['labels']['deployment']
+            deployments[deployment] = deployments.get(deployment, 0) + span['count']
+
+    return {
+        'requests'       : args.requests,
+        'turns'          : args.turns,
+        'concurrency'    : args.concurrency,
+        'stream'         : args.stream,
+        'elapsed_s'      : elapsed,
+        'throughput_rps' : len(latencies) / elapsed if elapsed else 0.0,
+        'errors'         : len(errors),
+        'error_types'    : sorted(set(errors)),
+        'latency_ms'     : percentiles(latencies),
+        'first_token_ms' : percentiles(first_tokens) if args.stream else None,
+        'retries'        : sum(scheduler.stats.retries for scheduler in schedulers),
+        'rate_limited'   : sum(scheduler.stats.rate_limited for scheduler in schedulers),
+        'deployments'    : deployments,
+        'hedged'         : metrics.counter('hedged_requests'),
+        'hedge_wins'     : metrics.counter('hedge_wins'),
+        'ejections'      : metrics.counter('deployment_ejections'),
+        'input_tokens'   : metrics.counter('input_tokens'),
+        'cached_ratio'   : cached_token_ratio(),
+        'rss_before_mb'  : rss_before,
+        'rss_after_mb'   : current_rss_mb(),
+        'max_rss_mb'     : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def print_report(report: dict[str, Any]) -> None:
+    startup = report['startup']
+    print(f"起動時間           : 初期化 {startup['init_ms']:.1f} ms / プロセス全体 {startup['process_ms']:.1f} ms")
+    for key, value in report['prompt'].items():
+        print(f"{key.removesuffix('_us'):<19}: {value:.2f} µs")
+
+    runner = report['runner']
+    latency = runner['latency_ms']
+    print(f"セッション         : {runner['requests']} × {runner['turns']} ターン（同時実行 {runner['concurrency']}、ストリーミング {runner['stream']}）")
+    print(f"スループット       : {runner['throughput_rps']:.1f} req/s（{runner['elapsed_s']:.2f} 秒）")
+    if latency['count']:
+        print(f"レイテンシー       : p50 {latency['p50']:.1f} / p95 {latency['p95']:.1f} / p99 {latency['p99']:.1f} / max {latency['max']:.1f} ms")
+    if runner['first_token_ms'] and runner['first_token_ms']['count']:
+        ttft = runner['first_token_ms']
+        print(f"最初のトークン     : p50 {ttft['p50']:.1f} / p95 {ttft['p95']:.1f} / p99 {ttft['p99']:.1f} ms")
+    print(f"エラー / 再試行    : {runner['errors']} {runner['error_types']} / {runner['retries']}（429: {runner['rate_limited']}）")
+    if runner['deployments']:
+        calls = ' / '.join(f"{name} {count}" for name, count in sorted(runner['deployments'].items()))
+        print(f"デプロイメント     : {calls}（ヘッジ {runner['hedged']:.0f}、うち勝ち {runner['hedge_wins']:.0f}、切り離し {runner['ejections']:.0f}）")
+    print(f"入力トークン       : {runner['input_tokens']:.0f}（キャッシュ済み {runner['cached_ratio']:.1%}）")
+    print(f"メモリ             : {runner['rss_before_mb']:.1f} → {runner['rss_after_mb']:.1f} MB（最大 {runner['max_rss_mb']:.1f} MB）")
+
+def main():
+    """メイン実行関数"""
+    parser = argparse.ArgumentParser(description="オフラインベンチマーク")
+    parser.add_argument("--requests", type=int, default=200, help="計測するセッション数")
+    parser.add_argument("--turns", type=int, default=1, help="1セッションで順に実行するターン数")
+    parser.add_argument("--concurrency", type=int, default=20, help="同時に実行するセッション数")
+    parser.add_argument("--warmup", type=int, default=10, help="計測前に実行するセッション数")
+    parser.add_argument("--stream", action="store_true", help="ストリーミングで実行する")
+    parser.add_argument("--scheduler-concurrency", type=int, default=64, help="スケジューラーの同時実行数の上限")
+    parser.add_argument("--mock-port", type=int, default=18080, help="代替サーバーのポート")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="代替サーバーの最初のバイトまでの遅延")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="代替サーバーの遅延のばらつき")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="代替サーバーのトークン生成速度")
+    parser.add_argument("--output-tokens", type=int, default=40, help="代替サーバーの1応答の出力トークン数")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="代替サーバーが 429 を返す割合")
+    parser.add_argument("--retry-after-ms", type=int, default=100, help="429 の Retry-After（ミリ秒）")
+    parser.add_argument("--slow-ratio", type=float, default=0.0, help="代替サーバーが応答を遅らせる割合")
+    parser.add_argument("--slow-ms", type=float, default=0.0, help="遅らせる応答に加える遅延（ミリ秒）")
+    parser.add_argument("--deployments", type=int, default=1, help="代替サーバーの数（2以上ならデプロイメントのプールとして振り分ける）")
+    parser.add_argument("--routing", default="least_outstanding", choices=["least_outstanding", "ewma"], help="プールの振り分け方")
+    parser.add_argument("--hedge-percentile", type=float, default=0.0, help="ヘッジを送る所要時間のパーセンタイル（0〜1、0なら無効）")
+    parser.add_argument("--prompt-iterations", type=int, default=20000, help="get_prompt のマイクロベンチマークの回数")
+    parser.add_argument("--startup-runs", type=int, default=3, help="起動時間の計測回数")
+    parser.add_argument("--log-level", default="WARNING", help="計測中のログレベル")
+    parser.add_argument("--output", help="結果をJSONで書き出すファイル")
+
+    args = parser.parse_args()
+
+    configure_environment(args)
+    log_path = str(ROOT_DIR / "logs" / "benchmark.log")
+    mocks = [start_mock_server(args, args.mock_port + index) for index in range(max(1, args.deployments))]
+    try:
+        report: dict[str, Any] = {'startup': measure_startup(args.startup_runs, log_path)}
+
+        from agents import set_tracing_disabled
+        from src.core.logger import init_apl_logger
+        from src.core.metrics import metrics
+        from src.core.prompt_manager import prompt_manager
+
+        set_tracing_disabled(True)
+        init_apl_logger(log_path)
+        prompt_manager.initialize(ROOT_DIR / "config" / "prompt")
+        import src.ai_agents  # noqa: F401  エージェントをレジストリに登録
+
+        report['prompt'] = benchmark_prompts(args.prompt_iterations)
+        report['runner'] = asyncio.run(benchmark_runner(args))
+        report['spans'] = metrics.summary()
+        report['counters'] = metrics.counters()
+    finally:
+        for mock in mocks:
+            mock.terminate()
+            mock.wait()
+
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"結果を書き出しました: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+起動時のインポート時間を計測するコマンドラインツール。
+新しいプロセスで `python -X importtime` を実行してモジュールの読み込み時間を集計し、
+予算を超えた場合や遅延読み込みすべき重いモジュールが読み込まれた場合に失敗します。
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+# 起動時には読み込まず、最初に使うときまで遅延させるモジュール
+HEAVY_MODULES = ("agents", "openai", "httpx", "jinja2", "tiktoken")
+
+_IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+def measure(module: str, root_dir: Path) -> tuple[float, dict[str, float]]:
+    """
+    新しいプロセスでモジュールをインポートし、インポート時間を計測する
+
+    引数:
+        module: インポートするモジュール名
+        root_dir: プロジェクトのルートディレクトリ
+
+    戻り値:
+        (対象モジュールの累積時間[ms], 読み込まれたトップレベルモジュールごとの累積時間[ms])
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([str(root_dir), str(root_dir / "src"), env.get("PYTHONPATH", "")])
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root_dir, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+
+    total_ms = 0.0
+    top_level: dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_PATTERN.match(line)
+        if not match:
+            continue
+        cumulative_ms = int(match.group(2)) / 1000.0
+        name = match.group(4)
+        if name == module:
+            total_ms = cumulative_ms
+        root_name = name.split(".")[0]
+        top_level[root_name] = max(top_level.get(root_name, 0.0), cumulative_ms)
+    return total_ms, top_level
+
+def main():
+    """メイン実行関数"""
+    root_dir = Path(__file__).parent.parent
+
+    # コマンドライン引数の設定
+    parser = argparse.ArgumentParser(description="インポート時間計測ツール")
+    parser.add_argument("--module", default="src.ai_agents", help="計測するモジュール")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "200")), help="インポート時間の予算（ミリ秒）")
+    parser.add_argument("--runs", type=int, default=3, help="計測回数（最小値を採用）")
+    parser.add_argument("--top", type=int, default=10, help="表示する遅いモジュールの数")
+
+    args = parser.parse_args()
+
+    try:
+        runs = [measure(args.module, root_dir) for _ in range(max(1, args.runs))]
+    except RuntimeError as e:
+        print(f"エラー: {args.module} をインポートできませんでした: {e}")
+        sys.exit(1)
+
+    total_ms, top_level = min(runs, key=lambda run: run[0])
+    print(f"{args.module} のインポート時間: {total_ms:.1f} ms（予算: {args.budget_ms:.1f} ms）")
+    print("遅いモジュール:")
+    for name, cumulative_ms in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {name:<30} {cumulative_ms:8.1f} ms")
+
+    failed = False
+    loaded_heavy = [name for name in HEAVY_MODULES if name in top_level]
+    if loaded_heavy:
+        print(f"エラー: 遅延読み込みすべきモジュールが読み込まれています: {', '.join(loaded_heavy)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"エラー: インポート時間が予算を超えています（{total_ms:.1f} ms > {args.budget_ms:.1f} ms）")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+プロンプトテンプレートのバンドルを作成するコマンドラインツール。
+すべてのテンプレートの継承関係を解決し、起動時にYAMLを解析せずに読み込めるバンドルファイルを書き出します。
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# プロジェクトのルートディレクトリをPythonパスに追加
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.prompt_manager import prompt_manager
+from src.core.logger import init_apl_logger, apllog
+
+def main():
+    """メイン実行関数"""
+    root_dir = Path(__file__).parent.parent
+
+    # コマンドライン引数の設定
+    parser = argparse.ArgumentParser(description="プロンプトバンドル作成ツール")
+    parser.add_argument("--prompt-dir", default=str(root_dir / "config" / "prompt"), help="プロンプトテンプレートのディレクトリ")
+    parser.add_argument("--output", help="バンドルの出力先（省略時はプロンプトディレクトリ直下）")
+
+    args = parser.parse_args()
+
+    # ロガー初期化
+    init_apl_logger('./logs/apl.log')
+
+    # バンドルは常にYAMLツリーから作り直すため、既存のバンドルは読み込まない
+    prompt_manager.initialize(args.prompt_dir, use_bundle=False)
+
+    try:
+        bundle_path = prompt_manager.build_bundle(args.output)
+        print(f"バンドルを作成しました: {bundle_path}")
+        print(f"テンプレート数: {len(prompt_manager.list_available_templates())}")
+    except Exception as e:
+        apllog().error(f"バンドル作成エラー: {e}")
+        print(f"エラー: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()